@@ -0,0 +1,192 @@
+"""
+Compatibility shim for the benchmarks.
+
+Lets the benchmarks run unchanged on the MicroPython unix port and on
+CPython: on CPython the MicroPython-only modules used by the rover code
+(uasyncio, ujson, utime, micropython) are mapped onto their standard
+library counterparts. Run the benchmarks from the project root, e.g.
+
+    micropython bench/bench_http_response.py
+    python3 bench/bench_http_response.py
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import sys
+
+if "." not in sys.path:
+    sys.path.insert(0, ".")
+
+IS_MICROPYTHON = sys.implementation.name == "micropython"
+
+if not IS_MICROPYTHON:
+    import asyncio
+    import json
+    import time
+
+    _PERIOD = 1 << 30
+
+    def _ticks_ms():
+        return int(time.perf_counter() * 1000) % _PERIOD
+
+    def _ticks_us():
+        return int(time.perf_counter() * 1000000) % _PERIOD
+
+    def _ticks_add(ticks, delta):
+        return (ticks + delta) % _PERIOD
+
+    def _ticks_diff(new, old):
+        diff = (new - old) % _PERIOD
+        if diff >= _PERIOD // 2:
+            diff -= _PERIOD
+        return diff
+
+    # utime with wrapping ticks like on MicroPython
+    _utime = type(sys)("utime")
+    _utime.ticks_ms = _ticks_ms
+    _utime.ticks_us = _ticks_us
+    _utime.ticks_add = _ticks_add
+    _utime.ticks_diff = _ticks_diff
+    _utime.sleep = time.sleep
+    _utime.time = time.time
+    _utime.localtime = time.localtime
+    _utime.gmtime = time.gmtime
+
+    _micropython = type(sys)("micropython")
+    _micropython.const = lambda value: value
+    _micropython.mem_info = lambda *args: None
+
+    if not hasattr(asyncio, "sleep_ms"):
+        async def _sleep_ms(ms):
+            await asyncio.sleep(ms / 1000)
+        asyncio.sleep_ms = _sleep_ms
+
+    # CPython has no heap figures, HeapTelemetry then never sees a low heap
+    import gc
+    if not hasattr(gc, "mem_free"):
+        gc.mem_free = lambda: 1 << 20
+        gc.mem_alloc = lambda: 0
+        gc.threshold = lambda *args: -1
+
+    sys.modules.setdefault("uasyncio", asyncio)
+    sys.modules.setdefault("ujson", json)
+    sys.modules.setdefault("utime", _utime)
+    sys.modules.setdefault("micropython", _micropython)
+
+import utime  # noqa: E402
+
+
+class _IntCheck(type):
+    def __instancecheck__(cls, obj):
+        return isinstance(obj, int)
+
+
+class _int(int, metaclass=_IntCheck):
+    """
+    int with the positional signed flag of MicroPython's from_bytes and to_bytes,
+    which CPython only accepts as keyword. isinstance() checks against it behave
+    as against int.
+    """
+
+    @staticmethod
+    def from_bytes(data, byteorder, signed=False):
+        return int.from_bytes(data, byteorder, signed=signed)
+
+    def to_bytes(self, length, byteorder, signed=False):
+        return int.to_bytes(self, length, byteorder, signed=signed)
+
+
+def patch_int(*modules):
+    """
+    Let modules written for MicroPython (pyubx2.ubxhelpers, pyubx2.ubxmessage,
+    gnss.uart_reader) call
+    int.from_bytes(data, "little", False) on CPython. Only the given modules see
+    the replacement, and only where the MicroPython signature is missing.
+    """
+    try:
+        int.from_bytes(b"\x01", "little", False)
+    except TypeError:
+        for module in modules:
+            module.int = _int
+
+ticks_us = utime.ticks_us
+ticks_diff = utime.ticks_diff
+
+
+class CountingStream:
+    """
+    Stream stand-in for uasyncio.StreamReader/StreamWriter.
+
+    Serves reads from a fixed input buffer and counts every write and
+    drain, each drain standing for at least one TCP segment on the wire.
+    """
+
+    def __init__(self, data: bytes = b""):
+        self._data = data
+        self._pos = 0
+        self.writes = 0
+        self.drains = 0
+        self.written = 0
+
+    def rewind(self):
+        self._pos = 0
+
+    async def read(self, n: int = -1) -> bytes:
+        if n < 0:
+            n = len(self._data) - self._pos
+        data = self._data[self._pos:self._pos + n]
+        self._pos += len(data)
+        return data
+
+    async def readexactly(self, n: int) -> bytes:
+        data = await self.read(n)
+        if len(data) < n:
+            raise EOFError()
+        return data
+
+    async def readinto(self, buf) -> int:
+        data = await self.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+    async def readline(self) -> bytes:
+        end = self._data.find(b"\n", self._pos)
+        end = len(self._data) if end < 0 else end + 1
+        data = self._data[self._pos:end]
+        self._pos = end
+        return data
+
+    def write(self, buf):
+        self.writes += 1
+        self.written += len(buf)
+
+    async def drain(self):
+        self.drains += 1
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", 50000)
+
+    async def wait_closed(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def run(coro):
+    """
+    Run a coroutine to completion on either runtime.
+    """
+    import uasyncio
+    return uasyncio.run(coro)
+
+
+def report(name: str, results: dict):
+    """
+    Print one JSON result line, the format compared across commits.
+    """
+    import ujson
+    results["bench"] = name
+    results["impl"] = sys.implementation.name
+    print(ujson.dumps(results))
@@ -0,0 +1,73 @@
+"""
+Garbage collection policy benchmark.
+
+Runs the per-sentence work of the position path (NMEA checksum, GGA
+parsing, JSON encoding of the realtime message) ITERATIONS times, once
+with a forced gc.collect() per sentence as UBXMessage and UartWriter did,
+once with the adaptive policy of HeapTelemetry, and reports the loop
+time and the collections of both.
+
+Only MicroPython (the board or the unix port) has a heap that fills up
+with garbage until it is collected. CPython frees objects by reference
+counting and _compat fakes a constant free heap, so there the adaptive
+policy never collects and its figures are not comparable; the results
+carry a note saying so.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import gc
+import _compat
+import ujson
+from gnss.message_types import PositionData, Accuracy, RealTimeMessage
+from gnss.uart_reader import UartReader
+from utils.heap_telemetry import HeapTelemetry
+
+ITERATIONS = 1000
+
+_GGA = b"$GNGGA,101530.00,4908.10521,N,00912.96434,E,4,12,0.58,193.1,M,47.9,M,1.0,0000*64\r\n"
+
+
+def _work(accuracy: Accuracy):
+    UartReader._isvalid_cksum(_GGA)
+    UartReader._get_position_dict(_GGA)
+    ujson.dumps(RealTimeMessage(UartReader._posision, accuracy, True).__dict__)
+
+
+def _bench(policy: str) -> dict:
+    accuracy = Accuracy(14, 20)
+    HeapTelemetry.collections = 0
+    HeapTelemetry.gc_total_ms = 0
+    HeapTelemetry._gc_total_us = 0
+    HeapTelemetry.gc_max_us = 0
+    if policy == "adaptive":
+        HeapTelemetry.configure()
+    gc.collect()
+    start = _compat.ticks_us()
+    for i in range(ITERATIONS):
+        _work(accuracy)
+        if policy == "forced":
+            HeapTelemetry.collect()
+        elif i % 10 == 9:
+            HeapTelemetry.checkpoint("bench")
+    elapsed = _compat.ticks_diff(_compat.ticks_us(), start)
+    result = {
+        "policy": policy,
+        "us_per_loop": round(elapsed / ITERATIONS, 1),
+        "loops_per_s": int(ITERATIONS * 1000000 / elapsed) if elapsed else 0,
+        "collections": HeapTelemetry.collections,
+        "gc_max_us": HeapTelemetry.gc_max_us,
+    }
+    if not _compat.IS_MICROPYTHON:
+        result["note"] = "no MicroPython heap, the adaptive policy never collects, only meaningful on MicroPython"
+    return result
+
+
+def main():
+    UartReader._posision = PositionData("", 0, "", "", "")
+    for policy in ("forced", "adaptive"):
+        _compat.report("gc", _bench(policy))
+
+
+main()
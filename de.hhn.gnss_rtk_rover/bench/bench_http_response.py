@@ -0,0 +1,48 @@
+"""
+Benchmark for small JSON responses of MicroWebSrv.
+
+Renders /position and /ntrip style responses into a counting stream and
+reports the time per response and the number of write and drain calls
+per response, the latter being the upper bound of TCP segments sent.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import _compat
+from webapi.microWebSrv import MicroWebSrv
+
+ITERATIONS = 500
+
+PAYLOADS = {
+    "/position": {"time": "101530.00", "fixType": 4, "lat": "4908.10521",
+                  "lon": "00912.96434", "elev": "193.1"},
+    "/ntrip": {"enabled": True},
+}
+
+
+async def _bench(path: str, payload: dict) -> dict:
+    srv = MicroWebSrv(routeHandlers=[], webPath="webapi/www")
+    stream = _compat.CountingStream()
+    client = MicroWebSrv._client(srv, stream, stream, stream.get_extra_info("peername"))
+    client._keepAlive = True
+    start = _compat.ticks_us()
+    for _ in range(ITERATIONS):
+        response = MicroWebSrv._response(client)
+        await response.WriteResponseJSONOk(payload)
+    elapsed = _compat.ticks_diff(_compat.ticks_us(), start)
+    return {
+        "path": path,
+        "us_per_response": round(elapsed / ITERATIONS, 1),
+        "writes_per_response": stream.writes / ITERATIONS,
+        "drains_per_response": stream.drains / ITERATIONS,
+        "bytes_per_response": stream.written // ITERATIONS,
+    }
+
+
+async def main():
+    for path, payload in PAYLOADS.items():
+        _compat.report("http_response", await _bench(path, payload))
+
+
+_compat.run(main())
@@ -0,0 +1,216 @@
+"""
+Parser throughput benchmark.
+
+Reports messages per second and, on MicroPython only, heap bytes allocated
+per message for the receive paths:
+
+- UartReader.parse (UBXMessage construction) of NAV-PVT, NAV-SAT,
+  CFG-VALGET and ACK-ACK
+- UBXMessage.serialize of a parsed NAV-PVT
+- calc_checksum of a NAV-PVT
+- the NMEA checksum, position dict and fixed point helpers of a GGA
+- UBXReader.read over a recorded NTRIP stream, replayed as fast as
+  possible by ReplayStream, with the CRC check and message filter every
+  frame passes in the NTRIP client, reporting the bytes forwarded
+
+The stream is generated RTCM3 frames with valid CRC-24Q unless a capture
+file of utils.capture is given:
+
+    micropython bench/bench_parser.py [ntrip.cap]
+    python3 bench/bench_parser.py [ntrip.cap]
+
+pyubx2 uses the MicroPython signature of int.from_bytes, on CPython the
+modules calling it get the replacement of _compat.patch_int().
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import gc
+import os
+import sys
+from struct import pack
+import _compat
+from gnss import realtime_binary
+from gnss.message_types import PositionData
+from gnss import uart_reader
+from gnss.uart_reader import UartReader
+from gnss.rtcm_stats import RtcmStats, crc24q, msg_type
+from gnss.rtcm_filter import RtcmFilter
+from pyubx2 import ubxhelpers, ubxmessage
+from pyubx2.ubxhelpers import calc_checksum
+from pyubx2.ubxreader import UBXReader
+from utils.capture import CaptureWriter, ReplayStream, CHANNEL_NTRIP
+
+_compat.patch_int(ubxhelpers, ubxmessage, uart_reader)
+
+ITERATIONS = 2000
+ALLOC_ITERATIONS = 50  # with the collector disabled, keep the heap small
+STREAM_FRAMES = 300
+STREAM_PASSES = 5
+
+_ALLOC_NOTE = "allocation is only measured on MicroPython"
+_GGA = b"$GNGGA,101530.00,4908.10521,N,00912.96434,E,4,12,0.58,193.1,M,47.9,M,1.0,0000*64\r\n"
+_CAPTURE = "bench_parser.cap"
+_forwarded = [0]  # bytes forwarded per pass by the last _read_stream
+
+
+def _ubx(msg_cls: int, msg_id: int, payload: bytes) -> bytes:
+    body = bytes((msg_cls, msg_id)) + pack("<H", len(payload)) + payload
+    return b"\xb5\x62" + body + calc_checksum(body)
+
+
+def _nav_pvt() -> bytes:
+    payload = bytearray(92)
+    payload[20] = 3  # fixType
+    payload[23] = 12  # numSV
+    payload[24:40] = pack("<iiii", 91616072, 491350868, 241000, 193100)
+    payload[40:48] = pack("<II", 14, 20)
+    return _ubx(0x01, 0x07, bytes(payload))
+
+
+def _nav_sat(sats: int = 24) -> bytes:
+    payload = bytearray(8 + 12 * sats)
+    payload[4] = 1  # version
+    payload[5] = sats
+    for i in range(sats):
+        payload[8 + 12 * i:8 + 12 * i + 8] = pack("<BBBbhh", i % 7, i + 1, 40, 45, 180, 0)
+    return _ubx(0x01, 0x35, bytes(payload))
+
+
+def _cfg_valget() -> bytes:
+    # response to the poll of GnssHandler.get_satellite_systems, CFG_SIGNAL_GPS/GAL/GLO/BDS_ENA
+    payload = bytes((1, 0, 0, 0))
+    for key in (0x1031001F, 0x10310021, 0x10310025, 0x10310022):
+        payload += pack("<IB", key, 1)
+    return _ubx(0x06, 0x8B, payload)
+
+
+def _ack_ack() -> bytes:
+    return _ubx(0x05, 0x01, bytes((0x06, 0x8A)))
+
+
+def _gga_fixed(gga: bytes):
+    fields = gga.decode("utf-8").split(",")
+    realtime_binary.time2ms(fields[1])
+    realtime_binary.nmea2deg7(fields[2], fields[3])
+    realtime_binary.nmea2deg7(fields[4], fields[5])
+    realtime_binary.str2fixed(fields[9], 3)
+
+
+def _repeat(fn, arg):
+    def body(iterations: int) -> int:
+        for _ in range(iterations):
+            fn(arg)
+        return iterations
+    return body
+
+
+def _write_stream(path: str):
+    """
+    Record STREAM_FRAMES RTCM3 frames with the types and sizes of a station and MSM7 messages.
+    """
+    capture = CaptureWriter(path, CHANNEL_NTRIP)
+    messages = ((1005, 19), (1077, 226), (1087, 184), (1097, 121), (1127, 97))
+    for i in range(STREAM_FRAMES):
+        mtype, size = messages[i % len(messages)]
+        frame = bytearray(3 + size + 3)
+        frame[0:3] = bytes((0xD3, size >> 8, size & 0xFF))
+        for j in range(size):
+            frame[3 + j] = (i + j) & 0xFF
+        frame[3] = mtype >> 4
+        frame[4] = ((mtype & 0x0F) << 4) | (frame[4] & 0x0F)
+        crc = crc24q(frame, 3 + size)
+        frame[3 + size:] = bytes((crc >> 16, (crc >> 8) & 0xFF, crc & 0xFF))
+        capture.write(frame)
+    capture.close()
+
+
+async def _read_stream(path: str, passes: int) -> int:
+    frames = 0
+    forwarded = 0
+    for _ in range(passes):
+        stream = ReplayStream(path, speed=0, channel=CHANNEL_NTRIP)
+        reader = UBXReader(stream)
+        while True:
+            raw = await reader.read()
+            if raw is None:
+                break
+            # per frame work of GNSSNTRIPClient._do_data besides forwarding
+            if RtcmStats.record(raw) and RtcmFilter.accept(msg_type(raw)):
+                forwarded += len(raw)
+            frames += 1
+        stream.close()
+    _forwarded[0] = forwarded // passes
+    return frames
+
+
+def _measure(name: str, body, iterations: int, alloc_iterations: int, size: int) -> dict:
+    """
+    :param body: function running the benchmark iterations times and returning the number of messages
+    :param int size: message size in bytes, 0 if it varies
+    """
+    gc.collect()
+    start = _compat.ticks_us()
+    messages = body(iterations)
+    elapsed = _compat.ticks_diff(_compat.ticks_us(), start)
+    alloc = None
+    if _compat.IS_MICROPYTHON:
+        gc.collect()
+        gc.disable()
+        before = gc.mem_alloc()
+        allocated = body(alloc_iterations)
+        alloc = (gc.mem_alloc() - before) // allocated if allocated else 0
+        gc.enable()
+    result = {
+        "case": name,
+        "bytes": size,
+        "messages": messages,
+        "us_per_msg": round(elapsed / messages, 2) if messages else None,
+        "msgs_per_s": int(messages * 1000000 / elapsed) if elapsed else 0,
+        "alloc_bytes_per_msg": alloc,
+    }
+    if alloc is None:
+        result["note"] = _ALLOC_NOTE
+    return result
+
+
+def main():
+    UartReader._posision = PositionData("", 0, "", "", "")
+    ubx = {"NAV-PVT": _nav_pvt(), "NAV-SAT": _nav_sat(), "CFG-VALGET": _cfg_valget(), "ACK-ACK": _ack_ack()}
+    cases = []
+    for identity, raw in ubx.items():
+        cases.append(("parse_" + identity, _repeat(UartReader.parse, raw), len(raw)))
+    cases.append(("serialize_NAV-PVT", None, len(ubx["NAV-PVT"])))
+    cases.append(("calc_checksum_NAV-PVT", _repeat(calc_checksum, ubx["NAV-PVT"][2:-2]), len(ubx["NAV-PVT"])))
+    cases.append(("nmea_checksum_GGA", _repeat(UartReader._isvalid_cksum, _GGA), len(_GGA)))
+    cases.append(("position_dict_GGA", _repeat(UartReader._get_position_dict, _GGA), len(_GGA)))
+    cases.append(("fixed_point_GGA", _repeat(_gga_fixed, _GGA), len(_GGA)))
+
+    for name, body, size in cases:
+        if body is None:  # serialize, needs a parsed message
+            body = _repeat(lambda msg: msg.serialize(), UartReader.parse(ubx["NAV-PVT"]))
+        try:
+            _compat.report("parser", _measure(name, body, ITERATIONS, ALLOC_ITERATIONS, size))
+        except Exception as err:
+            _compat.report("parser", {"case": name, "error": repr(err)})
+
+    path = sys.argv[1] if len(sys.argv) > 1 else _CAPTURE
+    if path == _CAPTURE:
+        _write_stream(path)
+    try:
+        RtcmStats.reset()
+        result = _measure("ubxreader_read_NTRIP", lambda passes: _compat.run(_read_stream(path, passes)),
+                          STREAM_PASSES, 1, 0)
+        # bytes forwarded in the timed passes instead of a message size
+        result["bytes"] = _forwarded[0] * STREAM_PASSES
+        result["bytes_per_s"] = int(result["bytes"] * result["msgs_per_s"] / result["messages"]) \
+            if result["messages"] else 0
+        result["crc_errors"] = RtcmStats.crc_errors
+        _compat.report("parser", result)
+    finally:
+        if path == _CAPTURE:
+            os.remove(path)
+
+
+main()
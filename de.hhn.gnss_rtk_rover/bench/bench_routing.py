@@ -0,0 +1,66 @@
+"""
+Routing microbenchmark for MicroWebSrv.
+
+Registers the routes of RequestHandler plus generated static and
+parameterized routes (ROUTES in total) and reports route lookups per
+second for hits on the first and last static route, parameterized
+routes and misses.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import _compat
+from webapi.microWebSrv import MicroWebSrv
+
+ROUTES = 128
+ITERATIONS = 2000
+
+_DASHBOARD = ["/rate", "/precision", "/satellites", "/position", "/ntrip", "/satsystems",
+              "/event-stream/position", "/event-stream/precision", "/event-stream/time",
+              "/event-stream/lat", "/event-stream/lon", "/event-stream/elev", "/event-stream/fix"]
+
+
+async def _handler(http_client, http_response):
+    pass
+
+
+def _routes() -> list:
+    routes = [(path, "GET", _handler) for path in _DASHBOARD]
+    routes += [("/rate", "POST", _handler), ("/ntrip", "POST", _handler), ("/satsystems", "POST", _handler)]
+    i = 0
+    while len(routes) < ROUTES:
+        if i % 4 == 3:
+            routes.append(("/api/v1/item%d/<id>" % i, "GET", _handler))
+        else:
+            routes.append(("/api/v1/static%d" % i, "GET" if i % 2 else "POST", _handler))
+        i += 1
+    return routes
+
+
+def _bench(srv: MicroWebSrv, name: str, path: str, method: str = "GET") -> dict:
+    start = _compat.ticks_us()
+    for _ in range(ITERATIONS):
+        srv.GetRouteHandler(path, method)
+    elapsed = _compat.ticks_diff(_compat.ticks_us(), start)
+    return {
+        "case": name,
+        "routes": ROUTES,
+        "us_per_lookup": round(elapsed / ITERATIONS, 2),
+        "lookups_per_s": int(ITERATIONS * 1000000 / elapsed) if elapsed else 0,
+    }
+
+
+def main():
+    routes = _routes()
+    last_static = [r for r in routes if "<" not in r[0]][-1]
+    last_param = [r for r in routes if "<" in r[0]][-1]
+    srv = MicroWebSrv(routeHandlers=routes, webPath="webapi/www")
+    for case in (("static_first", "/rate", "GET"),
+                 ("static_last", last_static[0], last_static[1]),
+                 ("param_last", last_param[0].replace("<id>", "42"), last_param[1]),
+                 ("miss", "/does/not/exist", "GET")):
+        _compat.report("routing", _bench(srv, *case))
+
+
+main()
@@ -0,0 +1,123 @@
+"""
+HTTP load generator for the rover web api.
+
+Runs on the host (CPython) against a rover or a local server and
+reports requests/second and latency percentiles, e.g.:
+
+    python3 http_load.py 192.168.1.50 --path /rate --path /ntrip -c 4 -n 200
+    python3 http_load.py 192.168.1.50 --path /rate --close
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import argparse
+import asyncio
+import json
+import time
+
+
+async def _read_response(reader: asyncio.StreamReader) -> tuple:
+    """
+    Read one HTTP response.
+    The body is delimited by Content-Length, or by EOF if it is missing.
+
+    :param asyncio.StreamReader reader: connection to the server
+    :return: tuple of (HTTP status code, True if the server closes the connection)
+    :rtype: tuple
+    """
+    status = await reader.readline()
+    if not status:
+        raise ConnectionError("connection closed by server")
+    code = int(status.split()[1])
+    length = None
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value.strip())
+        elif name == "connection":
+            close = value.strip().lower() == "close"
+    if length is None:
+        await reader.read()
+        close = True
+    elif length > 0:
+        await reader.readexactly(length)
+    return code, close
+
+
+async def _worker(args, paths: list, latencies: list, errors: list):
+    """
+    Send args.requests requests, reusing the connection unless args.close is set.
+    """
+    reader = writer = None
+    conn = "close" if args.close else "keep-alive"
+    for i in range(args.requests):
+        path = paths[i % len(paths)]
+        req = "GET %s HTTP/1.1\r\nHost: %s\r\nConnection: %s\r\n\r\n" % (path, args.host, conn)
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(args.host, args.port)
+            writer.write(req.encode())
+            await writer.drain()
+            _, close = await _read_response(reader)
+        except (OSError, ConnectionError, ValueError, IndexError) as ex:
+            errors.append(str(ex))
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        latencies.append(time.perf_counter() - start)
+        if close:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def _percentile(values: list, pct: float) -> float:
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1)
+    return values[max(idx, 0)]
+
+
+async def main(args):
+    latencies = []
+    errors = []
+    paths = args.path or ["/"]
+    start = time.perf_counter()
+    await asyncio.gather(*[_worker(args, paths, latencies, errors) for _ in range(args.connections)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    result = {
+        "mode": "close" if args.close else "keep-alive",
+        "connections": args.connections,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0,
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP load generator for the rover web api")
+    parser.add_argument("host")
+    parser.add_argument("--port", type=int, default=80)
+    parser.add_argument("--path", action="append", help="request path, may be repeated")
+    parser.add_argument("-c", "--connections", type=int, default=4, help="concurrent clients")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="requests per client")
+    parser.add_argument("--close", action="store_true", help="open a new connection per request")
+    asyncio.run(main(parser.parse_args()))
@@ -14,7 +14,8 @@ import gc
 
 import uasyncio
 from gnss.message_types import PositionData, Accuracy
-from utils.mem_debug import debug_gc
+from gnss.rtcm_filter import RtcmFilter
+from utils.heap_telemetry import HeapTelemetry
 import utime
 from primitives.queue import Queue
 from pyubx2.ubxmessage import UBXMessage
@@ -28,7 +29,6 @@ class GnssHandler:
     GnssHandler class.
     """
     _app = None
-    _gga_q = None
     _cfg_response_q = None
     _nav_msg_q = None
     _ack_nack_q = None
@@ -66,7 +66,6 @@ class GnssHandler:
     @classmethod
     def initialize(cls,
                    app: object,
-                   gga_q: Queue,
                    cfg_resp_q: Queue,
                    nav_pvt_q: Queue,
                    ack_nack_q: Queue,
@@ -76,7 +75,6 @@ class GnssHandler:
                    stop_event: uasyncio.Event):
         """Initialization method.
         :param object app: The calling app
-        :param primitives.queue.Queue gga_q: queue for incoming gga messages
         :param primitives.queue.Queue cfg_resp_q: queue for ubx responses to configuration messages
         :param primitives.queue.Queue nav_pvt_q: queue for incoming ubx NAV-PVT get messaged
         :param primitives.queue.Queue ack_nack_q: queue for incoming ubx ACK-NACK messages
@@ -86,7 +84,6 @@ class GnssHandler:
         :param uasyncio.Event stop_event: handling the ntrip client (stop/resume)
         """
         cls._app = app
-        cls._gga_q = gga_q
         cls._cfg_response_q = cfg_resp_q
         cls._nav_msg_q = nav_pvt_q
         cls._ack_nack_q = ack_nack_q
@@ -103,8 +100,6 @@ class GnssHandler:
 
         cls._accuracy = Accuracy(0, 0)
 
-        gc.collect()
-
     @classmethod
     async def set_update_rate(cls, update_rate: int) -> bool:
         """
@@ -132,10 +127,8 @@ class GnssHandler:
         await cls._msg_q.put(msg.serialize())
         ack = await cls._ack_nack_q.get()
         if ack.msg_id == b'\x01':  # ACK-ACK
-            gc.collect()
             return True
         else:
-            gc.collect()
             return False  # ACK-NACK
 
     @classmethod
@@ -155,7 +148,6 @@ class GnssHandler:
         await cls._msg_q.put(msg.serialize())
         cfg = await cls._cfg_response_q.get()
         result = cfg.__dict__["measRate"]
-        gc.collect()
         return int(result)
 
     @classmethod
@@ -185,10 +177,9 @@ class GnssHandler:
         await cls._msg_q.put(msg.serialize())
         ack = await cls._ack_nack_q.get()
         if ack.msg_id == b'\x01':  # ACK-ACK
-            gc.collect()
+            RtcmFilter.configure(gps=gps, gal=gal, glo=glo, bds=bds)
             return True
         else:
-            gc.collect()
             return False  # ACK-NACK
 
     @classmethod
@@ -223,7 +214,7 @@ class GnssHandler:
             "gal": int(val_gal),
             "bds": int(val_bds),
         }
-        gc.collect()
+        RtcmFilter.configure(**result)
         return result
 
     @classmethod
@@ -251,7 +242,16 @@ class GnssHandler:
         v_acc = nav.__dict__["vAcc"]
         cls._accuracy = Accuracy(h_acc, v_acc)
         cls._last_acc_time = utime.ticks_ms()
-        gc.collect()
+        return cls._accuracy
+
+    @classmethod
+    def get_cached_precision(cls) -> Accuracy:
+        """
+        Gets the precision of the last NAV-PVT poll without polling the receiver
+
+        :return: hAcc, vAcc
+        :rtype: Accuracy
+        """
         return cls._accuracy
 
     @classmethod
@@ -275,17 +275,16 @@ class GnssHandler:
         :return: UBXMessage NAV-SAT containing satellites with details
         :rtype: UBXMessage
         """
-        gc.collect()
+        HeapTelemetry.collect()
         await cls._flush_receive_qs()
         msg = UBXMessage(
             cls._nav_cls,
             cls._nav_sat,
             GET
         )
-        debug_gc()
+        HeapTelemetry.report()
         await cls._msg_q.put(msg.serialize())
         nav = await cls._nav_msg_q.get()
-        gc.collect()
         return nav
 
     @classmethod
@@ -305,10 +304,8 @@ class GnssHandler:
         await cls._msg_q.put(msg.serialize())
         ack = await cls._ack_nack_q.get()
         if ack.msg_id == b'\x01':  # ACK-ACK
-            gc.collect()
             return True
         else:
-            gc.collect()
             return False  # ACK-NACK
 
     @classmethod
@@ -379,10 +376,9 @@ class GnssHandler:
                 )
                 await cls._msg_q.put(msgnmea.serialize())
                 count = count + 1
-                gc.collect()
+                HeapTelemetry.checkpoint("gnss_handler")
         while not cls._ack_nack_q.empty:
             await cls._ack_nack_q.get()
-        gc.collect()
 
     @classmethod
     async def _flush_receive_qs(cls):
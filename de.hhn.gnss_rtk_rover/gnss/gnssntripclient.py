@@ -12,8 +12,6 @@ Created on 10 Oct 2022
 :author: vdueck
 """
 import gc
-from utils.mem_debug import debug_gc
-debug_gc()
 import primitives.queue
 from gnss.gnss_handler import GnssHandler
 from pyubx2.ubxreader import UBXReader
@@ -22,8 +20,19 @@ import uasyncio
 from uasyncio import Event
 from machine import UART
 import time
+import random
 from primitives.queue import Queue
-import usocket
+from utils.dns_cache import DnsCache
+from utils.capture import CaptureStream
+from utils.heap_telemetry import HeapTelemetry
+from utils.metrics import Metrics
+import utils.logging as logging
+from gnss.sourcetable import SourceTable
+from gnss.rtcm_stats import RtcmStats, msg_type
+from gnss.rtcm_filter import RtcmFilter
+from gnss.ntrip_http import NtripResponse, NtripResponseError, read_response
+from gnss.uart_reader import UartReader
+from gnss.realtime_binary import nmea2deg7
 from pyubx2.ubxtypes_core import RTCM3_PROTOCOL, ERR_IGNORE
 from pyubx2.exceptions import (
     RTCMParseError,
@@ -38,6 +47,11 @@ from utils.globals import (
     NTRIP_SERVER,
     MOUNTPOINT,
     GGA_INTERVAL,
+    GGA_INTERVAL_MAX,
+    GGA_MOVE_THRESHOLD,
+    NTRIP_STALE_TIMEOUT,
+    NTRIP_BACKOFF_MIN,
+    NTRIP_BACKOFF_MAX,
     REF_LAT,
     REF_LON,
     REF_ALT,
@@ -53,6 +67,23 @@ NTRIP_HEADERS = {
 GGALIVE = 0
 GGAFIXED = 1
 
+_logger = logging.getLogger("gnssntripclient")
+
+# connection states, reported through GNSSNTRIPClient.status
+STATE_DISABLED = "disabled"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_STREAMING = "streaming"
+STATE_STALE = "stale"
+STATE_BACKOFF = "backoff"
+
+_m_bytes = Metrics.counter("rover_ntrip_bytes_total", "RTCM bytes received from the caster")
+_m_forwarded = Metrics.counter("rover_ntrip_forwarded_bytes_total", "RTCM bytes written to the receiver")
+_m_reconnects = Metrics.counter("rover_ntrip_reconnects_total", "Reconnects to the caster")
+_m_state = {state: Metrics.gauge("rover_ntrip_state", "1 for the current NTRIP client state", 'state="%s"' % state)
+            for state in (STATE_DISABLED, STATE_CONNECTING, STATE_CONNECTED, STATE_STREAMING, STATE_STALE, STATE_BACKOFF)}
+Metrics.set(_m_state[STATE_DISABLED], 1)
+
 
 class GNSSNTRIPClient:
     """
@@ -61,9 +92,7 @@ class GNSSNTRIPClient:
 
     def __init__(self,
                  rtcmoutput: UART,
-                 app: object,
-                 gga_q: primitives.queue.Queue,
-                 ggaevent: uasyncio.Event):
+                 app: object):
         """
         Constructor.
 
@@ -72,15 +101,18 @@ class GNSSNTRIPClient:
         """
         self.__app = app  # Reference to calling application class (if applicable)
         self._ntripqueue = Queue()
-        self._socket = None
         self._swriter = None
         self._sreader = None
         self._task = None
-        self._read_gga_event = ggaevent
         self._output = uasyncio.StreamWriter(rtcmoutput)
-        self._last_gga = time.ticks_ms()
-        self._gga_queue = gga_q
-        self._first_start = True
+        self.capture = None  # CaptureWriter for the RTCM payload, None to not capture
+        self._gga_task = None
+        self._gga_interval = 0
+        self._state = STATE_DISABLED
+        self._reconnects = 0
+        self._last_rtcm = None
+        self._streamed = False
+        self._byte_rate = 0
 
         # persist settings to allow any calling app to retrieve them
         self._settings = {
@@ -92,7 +124,7 @@ class GNSSNTRIPClient:
             "user": "anon",
             "password": "password",
             "ggainterval": "None",
-            "sourcetable": [],
+            "sourcetable": SourceTable(),
             "reflat": "",
             "reflon": "",
             "refalt": "",
@@ -131,7 +163,10 @@ class GNSSNTRIPClient:
         self._settings["user"] = NTRIP_USER
         self._settings["password"] = NTRIP_PW
         self._settings["ggainterval"] = int(GGA_INTERVAL * 1000)
-        print("gnssntripclient -> starting ntrip reading task")
+        self._settings["reflat"] = REF_LAT
+        self._settings["reflon"] = REF_LON
+        self._settings["refalt"] = REF_ALT
+        _logger.info("starting ntrip reading task")
 
         stopevent.set()
         server = self._settings["server"]
@@ -139,56 +174,208 @@ class GNSSNTRIPClient:
         mountpoint = self._settings["mountpoint"]
         ggainterval = int(self._settings["ggainterval"])
 
+        attempt = 0
         while True:
-            if not stopevent.is_set():
-                try:
-                    self._socket = usocket.socket(usocket.AF_INET, usocket.SOCK_STREAM)
-                    self._socket.settimeout(TIMEOUT)
-                    addr = usocket.getaddrinfo(server, port)[0][-1]
-                    self._socket.connect(addr)
-                    msg = self._formatGET(self._settings)
-                    print(str(msg))
-                    self._swriter = uasyncio.StreamWriter(self._socket)
-                    self._sreader = uasyncio.StreamReader(self._socket)
-                    self._swriter.write(msg)
-                    await self._swriter.drain()
-                    async with ntrip_lock:
-                        GnssHandler.rtcm_enabled = True
-                    if mountpoint != "":
-                        await self._send_GGA(ggainterval, self._output)
-
-                    while True:
-                        if not stopevent.is_set():
-                            try:
-                                await self._do_data(self._sreader, stopevent, ggainterval, self._output, ntrip_lock)
-                            except Exception as ex:
-                                print(Exception)
-                                stopevent.set()
-                                await self._swriter.wait_closed()
-                                await self._sreader.wait_closed()
-                                async with ntrip_lock:
-                                    GnssHandler.rtcm_enabled = False
-                                break
-                        else:
-                            await uasyncio.sleep(1)
-                            async with ntrip_lock:
-                                GnssHandler.rtcm_enabled = False
-                except Exception as ex:
-                    print(Exception)
-                    stopevent.set()
-                    await self._swriter.wait_closed()
-                    await self._sreader.wait_closed()
-                    async with ntrip_lock:
-                        GnssHandler.rtcm_enabled = False
-                    break
-            else:
+            if stopevent.is_set():
+                self._set_state(STATE_DISABLED)
+                attempt = 0
                 await uasyncio.sleep(1)
-                async with ntrip_lock:
-                    GnssHandler.rtcm_enabled = False
+                continue
+
+            self._set_state(STATE_CONNECTING)
+            self._streamed = False
+            try:
+                if mountpoint == "":
+                    mountpoint = await self._select_mountpoint(server, port)
+                response = await self._request(server, port, self._settings)
+                if not response.is_stream:  # v1 casters answer an unknown mountpoint with the sourcetable
+                    raise NtripResponseError(404, "mountpoint " + mountpoint + " not available")
+                self._set_state(STATE_CONNECTED)
+                if mountpoint != "" and ggainterval > 0:
+                    self._gga_task = uasyncio.create_task(self._gga_uploader(ggainterval))
+                await self._do_data(response.body, stopevent, self._output, ntrip_lock)
+            except NtripResponseError as ex:
+                _logger.warning("caster response %s", ex)
+                if ex.status in (401, 403, 404):  # retrying soon will not help, wait the longest backoff
+                    attempt = 16
+            except Exception as ex:
+                _logger.warning("connection error %r", ex)
+            await self._close()
+            self._byte_rate = 0
+            async with ntrip_lock:
+                GnssHandler.rtcm_enabled = False
+
+            if self._streamed:  # the caster delivered data, start over with a short delay
+                attempt = 0
+            if not stopevent.is_set():
+                delay = self._backoff_ms(attempt)
+                attempt += 1
+                self._reconnects += 1
+                Metrics.inc(_m_reconnects)
+                self._set_state(STATE_BACKOFF)
+                _logger.info("reconnecting in %d ms", delay)
+                try:  # end the wait early if NTRIP gets disabled
+                    await uasyncio.wait_for(stopevent.wait(), delay / 1000)
+                except uasyncio.TimeoutError:
+                    pass
+
+    @property
+    def state(self) -> str:
+        """
+        Getter for the connection state (one of the STATE_* constants).
+        """
+        return self._state
+
+    @property
+    def status(self) -> dict:
+        """
+        Getter for the stream health.
+
+        :return: state, reconnect count, bytes/s, ms since the last RTCM message (None if none yet)
+                 and the current GGA interval
+        :rtype: dict
+        """
+        age = None
+        if self._last_rtcm is not None:
+            age = time.ticks_diff(time.ticks_ms(), self._last_rtcm)
+        return {
+            "state": self._state,
+            "reconnects": self._reconnects,
+            "bytesPerSec": self._byte_rate,
+            "rtcmAgeMs": age,
+            "ggaIntervalMs": self._gga_interval,
+        }
+
+    def _set_state(self, state: str):
+        """
+        Set the connection state and report the transition.
+
+        :param str state: new state
+        """
+        if state != self._state:
+            _logger.info("state %s -> %s", self._state, state)
+            Metrics.set(_m_state[self._state], 0)
+            Metrics.set(_m_state[state], 1)
+            self._state = state
+
+    @staticmethod
+    def _backoff_ms(attempt: int) -> int:
+        """
+        Jittered exponential backoff, between half and the full
+        NTRIP_BACKOFF_MIN * 2**attempt, capped at NTRIP_BACKOFF_MAX.
+
+        :param int attempt: number of failed attempts in a row
+        :return: delay in ms
+        :rtype: int
+        """
+        delay = min(NTRIP_BACKOFF_MIN * 1000 << min(attempt, 16), NTRIP_BACKOFF_MAX * 1000)
+        return delay // 2 + (delay // 2) * random.getrandbits(8) // 255
+
+    async def _close(self):
+        """
+        ASYNC
+        Close the caster connection, if any.
+        """
+        if self._gga_task is not None:
+            self._gga_task.cancel()
+            self._gga_task = None
+        self._gga_interval = 0
+        writer = self._swriter
+        self._swriter = None
+        self._sreader = None
+        if writer is not None:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _connect(self, server: str, port: int):
+        """
+        ASYNC
+        Open the connection to the caster without blocking the event loop.
+        The host name is resolved through the DnsCache, so only an expired
+        entry costs a (blocking) DNS lookup; the TCP connect itself is
+        non-blocking and bounded by TIMEOUT.
 
+        :param str server: caster host name or IP
+        :param int port: caster port
+        :raises: OSError, uasyncio.TimeoutError
+        """
+        ip = DnsCache.resolve(server, port)
+        try:
+            self._sreader, self._swriter = await uasyncio.wait_for(uasyncio.open_connection(ip, port), TIMEOUT)
+        except Exception:
+            DnsCache.expire(server)  # the caster may have moved, look it up again next time
+            raise
 
+    async def _request(self, server: str, port: int, settings: dict) -> NtripResponse:
+        """
+        ASYNC
+        Connect, send the GET request and read the response header.
 
+        :param str server: caster host name or IP
+        :param int port: caster port
+        :param dict settings: settings dictionary, the mountpoint selects the resource
+        :return: response, its body is the decoded payload
+        :rtype: NtripResponse
+        :raises: NtripResponseError if the caster rejects the request
+        """
+        await self._connect(server, port)
+        msg = self._formatGET(settings)
+        if __debug__:
+            _logger.debug("request %s", msg)
+        self._swriter.write(msg)
+        await self._swriter.drain()
+        response = await uasyncio.wait_for(read_response(self._sreader), TIMEOUT)
+        _logger.info("%s %d %s%s", response.protocol, response.status, response.content_type,
+                     " chunked" if response.chunked else "")
+        return response
 
+    async def get_sourcetable(self, server: str, port: int) -> SourceTable:
+        """
+        ASYNC
+        Retrieve the sourcetable from the caster.
+        The response is parsed while it is received, the raw table is never held in memory.
+
+        :param str server: caster host name or IP
+        :param int port: caster port
+        :return: the sourcetable, also kept in settings["sourcetable"]
+        :rtype: SourceTable
+        """
+        table = self._settings["sourcetable"]
+        table.clear()
+        settings = dict(self._settings)
+        settings["mountpoint"] = ""
+        try:
+            response = await self._request(server, port, settings)
+            if not response.is_sourcetable:
+                raise NtripResponseError(response.status, "no sourcetable in response")
+            count = await table.parse_stream(response.body)
+            _logger.info("sourcetable with %d mountpoints", count)
+        finally:
+            await self._close()
+        return table
+
+    async def _select_mountpoint(self, server: str, port: int) -> str:
+        """
+        ASYNC
+        Select the RTCM 3 mountpoint closest to the reference position.
+
+        :param str server: caster host name or IP
+        :param int port: caster port
+        :return: mountpoint name
+        :rtype: str
+        :raises: ValueError if the sourcetable has no usable mountpoint
+        """
+        table = await self.get_sourcetable(server, port)
+        name, dist = table.nearest(float(self._settings["reflat"]), float(self._settings["reflon"]), "RTCM 3")
+        if name is None:
+            raise ValueError("no RTCM 3 mountpoint in sourcetable")
+        _logger.info("closest mountpoint %s at %s km", name, dist)
+        self._settings["mountpoint"] = name
+        self._settings["distance"] = dist
+        return name
 
     @staticmethod
     def _formatGET(settings: dict) -> bytes:
@@ -220,39 +407,132 @@ class GNSSNTRIPClient:
         req = reqline1 + reqline2 + reqline3 + reqline4 + reqline5 + "\r\n"  # NECESSARY!!!
         return bytes(req, 'utf-8')
 
-    async def _send_GGA(self, ggainterval: int, output: uasyncio.StreamWriter):
+    async def _gga_uploader(self, ggainterval: int):
         """
-        THREADED
-        Send NMEA GGA sentence to NTRIP server at prescribed interval.
-        """
-        if time.ticks_diff(time.ticks_ms(), self._last_gga) > ggainterval or self._first_start:
-            self._read_gga_event.set()
-            raw_data = await self._gga_queue.get()
-            self._read_gga_event.clear()
-            if raw_data is not None:
-                self._swriter.write(raw_data)
+        ASYNC
+        Send NMEA GGA sentences to the NTRIP caster on its own timer,
+        independent of the RTCM read loop.
+        Uses the latest GGA read from the receiver, or a GGA of the reference
+        position if there is no recent one. The interval is ggainterval while
+        moving and doubles up to GGA_INTERVAL_MAX while static.
+
+        :param int ggainterval: GGA transmission interval in ms
+        """
+        interval = ggainterval
+        last_pos = None
+        deadline = time.ticks_ms()
+        while self._swriter is not None:
+            gga, mode = self._get_gga(ggainterval)
+            if gga is not None:
+                self._swriter.write(gga)
                 await self._swriter.drain()
-                await self._do_write(output, raw_data)
-                print("Sending gga to caster: " + str(raw_data))
-            self._last_gga = time.ticks_ms()
-            self._first_start = False
+                if __debug__:
+                    _logger.debug("sending gga to caster: %s", gga)
+                pos = self._gga_position(gga) if mode == GGALIVE else None
+                interval = self._next_gga_interval(interval, ggainterval, last_pos, pos)
+                last_pos = pos
+            self._gga_interval = interval
+            deadline = time.ticks_add(deadline, interval)
+            wait = time.ticks_diff(deadline, time.ticks_ms())
+            if wait < 0:  # fell behind, e.g. slow drain: restart the timer from now
+                deadline = time.ticks_ms()
+                wait = 0
+            await uasyncio.sleep_ms(wait)
+
+    def _get_gga(self, ggainterval: int) -> tuple:
+        """
+        Select the GGA sentence to upload.
+
+        :param int ggainterval: configured GGA interval in ms, older sentences are not used
+        :return: tuple of (GGA as bytes or None, GGALIVE or GGAFIXED)
+        :rtype: tuple
+        """
+        gga, received = UartReader.get_last_gga()
+        if gga is not None and time.ticks_diff(time.ticks_ms(), received) < max(2 * ggainterval, 2000):
+            return gga, GGALIVE
+        if self._settings["reflat"] and self._settings["reflon"]:
+            return self._formatGGA(self._settings), GGAFIXED
+        return None, GGAFIXED
+
+    @staticmethod
+    def _gga_position(gga: bytes) -> tuple:
+        """
+        :param bytes gga: raw GGA sentence
+        :return: tuple of (lat, lon) in 1e-7 deg, None if there is no fix
+        :rtype: tuple
+        """
+        try:
+            fields = gga.decode("utf-8").split(",")
+            if fields[6] == "0":
+                return None
+            return nmea2deg7(fields[2], fields[3]), nmea2deg7(fields[4], fields[5])
+        except (ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def _next_gga_interval(interval: int, ggainterval: int, last_pos: tuple, pos: tuple) -> int:
+        """
+        Adapt the GGA interval: back to ggainterval as soon as the rover moved
+        more than GGA_MOVE_THRESHOLD, doubled up to GGA_INTERVAL_MAX while static.
+
+        :param int interval: current interval in ms
+        :param int ggainterval: configured (fastest) interval in ms
+        :param tuple last_pos: position of the previous upload or None
+        :param tuple pos: position of this upload or None
+        :return: next interval in ms
+        :rtype: int
+        """
+        if last_pos is None or pos is None:
+            return ggainterval
+        # 1e-7 deg of latitude are 11.1 mm, the longitude difference is
+        # overestimated away from the equator, which only makes the check stricter
+        moved = max(abs(pos[0] - last_pos[0]), abs(pos[1] - last_pos[1])) * 11.132 / 1000
+        if moved > GGA_MOVE_THRESHOLD:
+            return ggainterval
+        return min(interval * 2, max(GGA_INTERVAL_MAX * 1000, ggainterval))
+
+    @staticmethod
+    def _formatGGA(settings: dict) -> bytes:
+        """
+        Format a NMEA GGA sentence of the reference position.
+
+        :param dict settings: settings dictionary
+        :return: GGA sentence
+        :rtype: bytes
+        """
+        lat = float(settings["reflat"])
+        lon = float(settings["reflon"])
+        alt = float(settings["refalt"] or 0)
+        hms = time.gmtime()[3:6]
+        latdeg = int(abs(lat))
+        londeg = int(abs(lon))
+        body = "GPGGA,%02d%02d%02d.00,%02d%08.5f,%s,%03d%08.5f,%s,1,12,1.0,%.1f,M,0.0,M,," % (
+            hms[0], hms[1], hms[2],
+            latdeg, (abs(lat) - latdeg) * 60, "N" if lat >= 0 else "S",
+            londeg, (abs(lon) - londeg) * 60, "E" if lon >= 0 else "W",
+            alt)
+        cksum = 0
+        for char in body:
+            cksum ^= ord(char)
+        return bytes("$%s*%02X\r\n" % (body, cksum), "utf-8")
 
     async def _do_data(self,
                        sock: uasyncio.StreamReader,
                        stopevent: Event,
-                       ggainterval: int,
                        output: uasyncio.StreamWriter,
                        ntrip_lock: uasyncio.Lock):
         """
         ASYNC
         Read and parse incoming NTRIP RTCM3 data stream.
 
-        :param socket sock: socket
+        :param sock: stream of the RTCM3 payload
         :param Event stopevent: stop event
-        :param int ggainterval: GGA transmission interval seconds
         :param uasyncio.StreamWriter output: output stream for RTCM3 messages
         """
-        print("ntrip begin do_data " + str(time.ticks_ms()))
+        if __debug__:
+            _logger.debug("begin do_data %d", time.ticks_ms())
+        if self.capture is not None:
+            sock = CaptureStream(sock, self.capture)
         # UBXReader will wrap socket as SocketStream
         ubr = UBXReader(
             sock,
@@ -262,20 +542,44 @@ class GNSSNTRIPClient:
             labelmsm=True,
         )
         raw_data = None
-        async with ntrip_lock:
-            GnssHandler.rtcm_enabled = True
+        self._byte_rate = 0
+        window_start = time.ticks_ms()
+        window_bytes = 0
         while not stopevent.is_set():
             try:
-                raw_data = await ubr.read()
-                if raw_data is not None:
-                    await self._do_write(output, raw_data)
-                await self._send_GGA(ggainterval, output)
+                try:
+                    raw_data = await uasyncio.wait_for(ubr.read(), NTRIP_STALE_TIMEOUT)
+                except uasyncio.TimeoutError:
+                    self._set_state(STATE_STALE)
+                    raise
+                if raw_data is None:
+                    raise EOFError("caster closed the connection")
+                now = time.ticks_ms()
+                if not self._streamed:
+                    self._streamed = True
+                    self._set_state(STATE_STREAMING)
+                    async with ntrip_lock:
+                        GnssHandler.rtcm_enabled = True
+                self._last_rtcm = now
+                window_bytes += len(raw_data)
+                Metrics.inc(_m_bytes, len(raw_data))
+                elapsed = time.ticks_diff(now, window_start)
+                if elapsed >= 1000:
+                    self._byte_rate = window_bytes * 1000 // elapsed
+                    window_start = now
+                    window_bytes = 0
+                    HeapTelemetry.checkpoint("ntrip")
+                if not RtcmStats.record(raw_data):  # corrupted frame, do not forward
+                    continue
+                if not RtcmFilter.accept(msg_type(raw_data)):  # not usable with the enabled constellations
+                    continue
+                await self._do_write(output, raw_data)
             except (
                 RTCMMessageError,
                 RTCMParseError,
                 RTCMTypeError,
             ) as err:
-                print("gnssntripclient -> Error parsing rtcm stream")
+                _logger.warning("error parsing rtcm stream: %s", err)
                 continue
 
     async def _do_write(self, output: uasyncio.StreamWriter, raw: bytes):
@@ -289,3 +593,4 @@ class GNSSNTRIPClient:
         """
         output.write(raw)
         await output.drain()
+        Metrics.inc(_m_forwarded, len(raw))
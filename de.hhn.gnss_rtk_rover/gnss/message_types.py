@@ -1,11 +1,13 @@
 class PositionData:
 
-    def __init__(self, time, fixType, lat, lon, elev):
+    def __init__(self, time, fixType, lat, lon, elev, ns="N", ew="E"):
         self.time = time
         self.fixType = fixType
         self.lat = lat
         self.lon = lon
         self.elev = elev
+        self.ns = ns
+        self.ew = ew
 
 class Accuracy:
 
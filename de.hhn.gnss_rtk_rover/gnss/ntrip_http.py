@@ -0,0 +1,208 @@
+"""
+NTRIP caster response handling.
+
+Parses the status line and headers of NTRIP v1 (ICY / SOURCETABLE) and
+NTRIP v2 (HTTP/1.1) responses and decodes a chunked transfer encoding,
+so the RTCM framer and the sourcetable parser only ever see the payload.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+
+_MAX_HEADERS = 32  # guard against a caster sending an endless header
+
+
+class NtripResponseError(Exception):
+    """
+    Caster rejected the request or sent an unexpected response.
+    """
+
+    def __init__(self, status: int, reason: str):
+        super().__init__("%d %s" % (status, reason))
+        self.status = status
+        self.reason = reason
+
+
+class ChunkedReader:
+    """
+    Decodes an HTTP chunked transfer encoding from a stream.
+    Offers the read(n) and readline() subset of a uasyncio.StreamReader.
+    """
+
+    def __init__(self, reader: object):
+        """
+        Constructor.
+
+        :param reader: stream positioned at the first chunk size line
+        """
+        self._reader = reader
+        self._left = 0  # bytes left in the current chunk
+        self._started = False
+        self._eof = False
+        self._buf = b""  # data read ahead by readline()
+
+    async def _next_chunk(self):
+        """
+        ASYNC
+        Read the next chunk size line, sets _eof on the last chunk or at EOF.
+        """
+        if self._started:
+            await self._reader.readline()  # CRLF terminating the previous chunk
+        self._started = True
+        line = await self._reader.readline()
+        if not line:
+            self._eof = True
+            return
+        try:
+            size = int(line.split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            raise NtripResponseError(502, "invalid chunk size " + str(line[:16]))
+        if size == 0:
+            self._eof = True
+            while True:  # trailer
+                line = await self._reader.readline()
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            return
+        self._left = size
+
+    async def _read_chunked(self, n: int) -> bytes:
+        """
+        ASYNC
+        Read up to n bytes of chunk payload, never across a chunk boundary.
+
+        :return: data, b"" at the end of the body
+        :rtype: bytes
+        """
+        if self._left == 0:
+            if self._eof:
+                return b""
+            await self._next_chunk()
+            if self._eof:
+                return b""
+        data = await self._reader.read(min(n, self._left))
+        if not data:
+            self._eof = True
+            return b""
+        self._left -= len(data)
+        return data
+
+    async def read(self, n: int = -1) -> bytes:
+        """
+        ASYNC
+        Read up to n bytes of the decoded body.
+
+        :param int n: maximum number of bytes, -1 for the rest of the current chunk
+        :return: data, b"" at the end of the body
+        :rtype: bytes
+        """
+        if n < 0:
+            n = max(self._left, 1)
+        if self._buf:
+            data = self._buf[:n]
+            self._buf = self._buf[n:]
+            return data
+        return await self._read_chunked(n)
+
+    async def readline(self) -> bytes:
+        """
+        ASYNC
+        Read one line of the decoded body.
+
+        :return: line including the line terminator, b"" at the end of the body
+        :rtype: bytes
+        """
+        while True:
+            idx = self._buf.find(b"\n")
+            if idx >= 0:
+                line = self._buf[:idx + 1]
+                self._buf = self._buf[idx + 1:]
+                return line
+            data = await self._read_chunked(256)
+            if not data:
+                line = self._buf
+                self._buf = b""
+                return line
+            self._buf += data
+
+
+class NtripResponse:
+    """
+    Status and headers of a caster response.
+    """
+
+    def __init__(self, protocol: str, status: int, reason: str, headers: dict, reader: object):
+        """
+        Constructor.
+
+        :param str protocol: ICY, SOURCETABLE or HTTP/1.x
+        :param int status: status code
+        :param str reason: reason phrase
+        :param dict headers: headers with lower case names
+        :param reader: stream positioned at the start of the body
+        """
+        self.protocol = protocol
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        self.body = ChunkedReader(reader) if self.chunked else reader
+
+    @property
+    def content_type(self) -> str:
+        """
+        Getter for the content type without parameters.
+        """
+        return self.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+
+    @property
+    def is_sourcetable(self) -> bool:
+        """
+        True if the body is a sourcetable.
+        NTRIP v1 casters answer an unknown mountpoint with the sourcetable.
+        """
+        return self.protocol == "SOURCETABLE" or self.content_type == "gnss/sourcetable"
+
+    @property
+    def is_stream(self) -> bool:
+        """
+        True if the body is a data stream.
+        """
+        return self.protocol == "ICY" or self.content_type == "gnss/data" \
+            or (self.status == 200 and not self.is_sourcetable and self.content_type in ("", "application/octet-stream"))
+
+
+async def read_response(reader: object) -> NtripResponse:
+    """
+    ASYNC
+    Read the status line and headers of a caster response.
+
+    :param reader: stream with async readline()
+    :return: the response, its body reader is positioned at the payload
+    :rtype: NtripResponse
+    :raises: NtripResponseError on a status >= 400 or a malformed status line
+    """
+    line = await reader.readline()
+    if not line:
+        raise NtripResponseError(502, "connection closed by caster")
+    parts = line.decode("utf-8").strip().split(" ", 2)
+    try:
+        protocol = parts[0]
+        status = int(parts[1])
+    except (IndexError, ValueError):
+        raise NtripResponseError(502, "invalid status line " + str(line[:32]))
+    reason = parts[2] if len(parts) > 2 else ""
+    headers = {}
+    if protocol != "ICY":  # NTRIP v1 streams start right after the status line
+        for _ in range(_MAX_HEADERS):
+            line = await reader.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.decode("utf-8").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise NtripResponseError(502, "too many headers")
+    if status >= 400:
+        raise NtripResponseError(status, reason)
+    return NtripResponse(protocol, status, reason, headers, reader)
@@ -0,0 +1,119 @@
+"""
+Compact binary realtime message.
+
+Fixed-layout alternative to the JSON RealTimeMessage for the websocket
+position feed. Clients opt in by requesting the PROTOCOL subprotocol in
+the websocket handshake; webapi/www/realtime.js holds the matching decoder.
+
+Layout (little endian, 32 bytes):
+
+    offset  type    field
+    0       uint8   version (VERSION)
+    1       uint8   fix type
+    2       uint8   flags (bit 0: RTCM corrections enabled)
+    3       uint8   reserved
+    4       uint32  sequence number
+    8       uint32  UTC time of day in ms
+    12      int32   latitude in 1e-7 deg
+    16      int32   longitude in 1e-7 deg
+    20      int32   height above MSL in mm
+    24      uint32  horizontal accuracy in mm
+    28      uint32  vertical accuracy in mm
+
+The NMEA strings are converted with integer arithmetic only, as the single
+precision floats of the ESP32 port cannot hold 1e-7 deg.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from struct import pack_into
+
+from gnss.message_types import PositionData, Accuracy
+
+PROTOCOL = "rover.bin.v1"
+VERSION = 1
+FORMAT = "<BBBBIIiiiII"
+SIZE = 32
+
+FLAG_RTCM = 0x01
+
+
+def str2fixed(value: str, decimals: int) -> int:
+    """
+    Parse a decimal string into an integer scaled by 10**decimals.
+
+    :param str value: decimal number, e.g. "193.25"
+    :param int decimals: number of decimals to keep
+    :return: scaled integer, 0 for an empty string
+    :rtype: int
+    """
+    if not value:
+        return 0
+    neg = value[0] == "-"
+    if neg:
+        value = value[1:]
+    whole, _, frac = value.partition(".")
+    frac = (frac + "0" * decimals)[:decimals]
+    res = int(whole or "0") * 10 ** decimals + int(frac or "0")
+    return -res if neg else res
+
+
+def nmea2deg7(value: str, hemisphere: str) -> int:
+    """
+    Convert a NMEA (d)ddmm.mmmm coordinate to 1e-7 degrees.
+
+    :param str value: coordinate as sent in the GGA sentence
+    :param str hemisphere: N, S, E or W
+    :return: coordinate in 1e-7 deg, negative for S and W
+    :rtype: int
+    """
+    if not value:
+        return 0
+    dot = value.find(".")
+    if dot < 0:
+        dot = len(value)
+    deg = int(value[:dot - 2] or "0")
+    minutes = str2fixed(value[dot - 2:], 7)  # minutes * 1e7
+    res = deg * 10000000 + (minutes + 30) // 60
+    return -res if hemisphere in ("S", "W") else res
+
+
+def time2ms(value: str) -> int:
+    """
+    Convert a NMEA hhmmss.ss time to ms since midnight.
+
+    :param str value: time as sent in the GGA sentence
+    :return: ms since midnight
+    :rtype: int
+    """
+    if len(value) < 6:
+        return 0
+    return (int(value[0:2]) * 3600 + int(value[2:4]) * 60) * 1000 + str2fixed(value[4:], 3)
+
+
+def pack(buf: bytearray, seq: int, position: PositionData, accuracy: Accuracy, rtcm: bool) -> bytearray:
+    """
+    Pack a realtime message into a preallocated buffer.
+
+    :param bytearray buf: buffer of at least SIZE bytes
+    :param int seq: sequence number, wraps at 2**32
+    :param PositionData position: latest position
+    :param Accuracy accuracy: latest accuracy
+    :param bool rtcm: True if RTCM corrections are enabled
+    :return: buf
+    :rtype: bytearray
+    """
+    pack_into(FORMAT, buf, 0,
+              VERSION,
+              int(position.fixType),
+              FLAG_RTCM if rtcm else 0,
+              0,
+              seq & 0xFFFFFFFF,
+              time2ms(position.time),
+              nmea2deg7(position.lat, position.ns),
+              nmea2deg7(position.lon, position.ew),
+              str2fixed(position.elev, 3),
+              int(accuracy.hAcc),
+              int(accuracy.vAcc))
+    return buf
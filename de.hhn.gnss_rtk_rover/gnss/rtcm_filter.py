@@ -0,0 +1,99 @@
+"""
+RtcmFilter class.
+
+Drops RTCM3 messages the receiver cannot use before they are written to
+the RTCM UART, keyed on the 12 bit message number:
+
+- observations, ephemerides and biases of constellations disabled with
+  GnssHandler.set_satellite_systems
+- optionally MSM5/6/7 of a constellation while its MSM4 is also received,
+  MSM4 is enough for RTK and about half the size of MSM7
+
+Station messages (1005, 1006, 1033, ...) always pass.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from array import array
+import utime
+
+from utils.globals import RTCM_PREFER_MSM4
+from utils.metrics import Metrics
+
+# constellation -> message numbers besides its MSM1-7 range
+_LEGACY = {
+    "gps": (1001, 1002, 1003, 1004, 1019),
+    "glo": (1009, 1010, 1011, 1012, 1020, 1230),
+    "gal": (1045, 1046),
+    "bds": (1042,),
+}
+# constellation -> first MSM message number (MSM1)
+_MSM_BASE = {
+    "gps": 1071,
+    "glo": 1081,
+    "gal": 1091,
+    "bds": 1121,
+}
+_MSM4_TIMEOUT = 5000  # ms an MSM4 may be missing before MSM5-7 pass again
+
+
+class RtcmFilter:
+    """
+    RtcmFilter class.
+    """
+
+    _drop = set()  # message numbers of disabled constellations
+    _prefer_msm4 = RTCM_PREFER_MSM4
+    # last MSM4 arrival per constellation, indexed by (msg number - 1071) // 10
+    _msm4_seen = array("I", [0] * 6)
+    _msm4_valid = bytearray(6)
+    dropped = 0
+
+    @classmethod
+    def configure(cls, gps: int = 1, gal: int = 1, glo: int = 1, bds: int = 1, prefer_msm4: bool = None):
+        """
+        Set the enabled constellations, same arguments as GnssHandler.set_satellite_systems.
+
+        :param int gps: GPS On=1 / Off=0
+        :param int gal: Galileo On=1 / Off=0
+        :param int glo: GLONASS On=1 / Off=0
+        :param int bds: BeiDou On=1 / Off=0
+        :param bool prefer_msm4: drop MSM5-7 while MSM4 is received (None = unchanged)
+        """
+        drop = set()
+        for name, enabled in (("gps", gps), ("gal", gal), ("glo", glo), ("bds", bds)):
+            if enabled:
+                continue
+            drop.update(_LEGACY[name])
+            drop.update(range(_MSM_BASE[name], _MSM_BASE[name] + 7))
+        cls._drop = drop
+        if prefer_msm4 is not None:
+            cls._prefer_msm4 = prefer_msm4
+
+    @classmethod
+    def accept(cls, mtype: int) -> bool:
+        """
+        Decide whether a message is forwarded to the receiver.
+
+        :param int mtype: 12 bit RTCM message number
+        :return: True if the message should be forwarded
+        :rtype: bool
+        """
+        if mtype in cls._drop:
+            cls.dropped += 1
+            return False
+        if cls._prefer_msm4 and 1071 <= mtype <= 1127:
+            i, msm = divmod(mtype - 1071, 10)
+            if msm == 3:  # MSM4
+                cls._msm4_seen[i] = utime.ticks_ms()
+                cls._msm4_valid[i] = 1
+            elif msm >= 4 and cls._msm4_valid[i]:  # MSM5, 6, 7
+                if utime.ticks_diff(utime.ticks_ms(), cls._msm4_seen[i]) < _MSM4_TIMEOUT:
+                    cls.dropped += 1
+                    return False
+                cls._msm4_valid[i] = 0
+        return True
+
+
+Metrics.counter("rover_rtcm_filtered_total", "RTCM3 frames not forwarded to the receiver", fn=lambda: RtcmFilter.dropped)
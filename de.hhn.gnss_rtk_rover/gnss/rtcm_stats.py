@@ -0,0 +1,181 @@
+"""
+RtcmStats class.
+
+Per message type statistics of the RTCM3 correction stream: count, bytes,
+last arrival, inter-arrival EWMA and CRC failures.
+
+The table lives in preallocated arrays of MAX_TYPES slots, so recording a
+frame in the forwarding path allocates nothing. Frames of types beyond
+MAX_TYPES are only counted in the totals.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from array import array
+import utime
+from utils.metrics import Metrics
+
+MAX_TYPES = 32
+_EWMA_SHIFT = 3  # EWMA weight 1/8, the interval is kept in 1/8 ms
+# longer gaps are outages, not message rates, and are counted as this many ms,
+# which keeps the interval << _EWMA_SHIFT in a small int and in array "I"
+MAX_INTERVAL_MS = 3600000
+
+
+def _crc24q_table() -> array:
+    table = array("I", [0] * 256)
+    for i in range(256):
+        crc = i << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+        table[i] = crc & 0xFFFFFF
+    return table
+
+
+_CRC_TABLE = _crc24q_table()
+
+
+def crc24q(data, length: int) -> int:
+    """
+    CRC-24Q as used by RTCM3.
+
+    :param data: bytes
+    :param int length: number of bytes to include
+    :return: CRC
+    :rtype: int
+    """
+    crc = 0
+    table = _CRC_TABLE
+    for i in range(length):
+        crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ data[i]]
+    return crc
+
+
+def msg_type(raw) -> int:
+    """
+    :param raw: RTCM3 frame
+    :return: 12 bit message number, 0 if the frame is too short
+    :rtype: int
+    """
+    if len(raw) < 5:
+        return 0
+    return (raw[3] << 4) | (raw[4] >> 4)
+
+
+class RtcmStats:
+    """
+    RtcmStats class.
+    """
+
+    _types = array("H", [0] * MAX_TYPES)
+    _count = array("I", [0] * MAX_TYPES)
+    _bytes = array("I", [0] * MAX_TYPES)
+    _last = array("I", [0] * MAX_TYPES)
+    _interval = array("I", [0] * MAX_TYPES)
+    _crc_errors = array("I", [0] * MAX_TYPES)
+    _used = 0
+    frames = 0
+    crc_errors = 0
+    untracked = 0
+
+    @classmethod
+    def reset(cls):
+        """
+        Clear all statistics.
+        """
+        for arr in (cls._types, cls._count, cls._bytes, cls._last, cls._interval, cls._crc_errors):
+            for i in range(MAX_TYPES):
+                arr[i] = 0
+        cls._used = 0
+        cls.frames = 0
+        cls.crc_errors = 0
+        cls.untracked = 0
+
+    @classmethod
+    def _slot(cls, mtype: int) -> int:
+        """
+        :param int mtype: message number
+        :return: table slot of mtype, -1 if the table is full
+        :rtype: int
+        """
+        types = cls._types
+        for i in range(cls._used):
+            if types[i] == mtype:
+                return i
+        if cls._used < MAX_TYPES:
+            i = cls._used
+            types[i] = mtype
+            cls._used += 1
+            return i
+        return -1
+
+    @classmethod
+    def record(cls, raw) -> bool:
+        """
+        Validate the CRC of an RTCM3 frame and account it.
+
+        :param raw: complete RTCM3 frame including header and CRC
+        :return: True if the CRC is valid
+        :rtype: bool
+        """
+        length = len(raw)
+        cls.frames += 1
+        valid = length >= 6 and crc24q(raw, length - 3) == (raw[length - 3] << 16) | (raw[length - 2] << 8) | raw[length - 1]
+        i = cls._slot(msg_type(raw))
+        if not valid:
+            cls.crc_errors += 1
+            if i >= 0:
+                cls._crc_errors[i] += 1
+            return False
+        if i < 0:
+            cls.untracked += 1
+            return True
+        now = utime.ticks_ms()
+        if cls._count[i]:
+            dt = utime.ticks_diff(now, cls._last[i])
+            if dt > MAX_INTERVAL_MS:
+                dt = MAX_INTERVAL_MS
+            elif dt < 0:
+                dt = 0
+            dt <<= _EWMA_SHIFT
+            if cls._interval[i]:
+                cls._interval[i] += (dt - cls._interval[i]) >> _EWMA_SHIFT
+            else:
+                cls._interval[i] = dt
+        cls._count[i] += 1
+        cls._bytes[i] += length
+        cls._last[i] = now
+        return True
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        """
+        :return: totals and one entry per message type, sorted by message number
+        :rtype: dict
+        """
+        now = utime.ticks_ms()
+        types = []
+        for i in range(cls._used):
+            count = cls._count[i]
+            types.append({
+                "type": cls._types[i],
+                "count": count,
+                "bytes": cls._bytes[i],
+                "ageMs": utime.ticks_diff(now, cls._last[i]) if count else None,
+                "intervalMs": cls._interval[i] >> _EWMA_SHIFT if count > 1 else None,
+                "crcErrors": cls._crc_errors[i],
+            })
+        types.sort(key=lambda t: t["type"])
+        return {
+            "frames": cls.frames,
+            "crcErrors": cls.crc_errors,
+            "untracked": cls.untracked,
+            "types": types,
+        }
+
+
+Metrics.counter("rover_rtcm_frames_total", "RTCM3 frames received", fn=lambda: RtcmStats.frames)
+Metrics.counter("rover_rtcm_crc_errors_total", "RTCM3 frames with an invalid CRC", fn=lambda: RtcmStats.crc_errors)
@@ -0,0 +1,209 @@
+"""
+SourceTable class.
+
+Compact, spatially indexed NTRIP sourcetable.
+
+The caster response is parsed line by line while it is received, only the
+STR entries are kept and only as (name, lat, lon, format) tuples with the
+coordinates as ints in 1e-4 deg. The entries are binned into a grid of
+CELL_DEG x CELL_DEG cells, so the closest mountpoint is found by searching
+rings of cells around the position instead of every entry of the table.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from math import sin, cos, acos, radians
+from utils.globals import EARTH_RADIUS
+
+CELL_DEG = 1  # grid cell size in degrees
+_SCALE = 10000  # coordinates are stored in 1e-4 deg
+_KM_PER_DEG = 111.19  # km per degree of latitude
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float, rds: int = EARTH_RADIUS) -> float:
+    """
+    Calculate spherical distance between two coordinates.
+
+    :param float lat1: lat1
+    :param float lon1: lon1
+    :param float lat2: lat2
+    :param float lon2: lon2
+    :param float rds: earth radius (6371 km)
+    :return: spherical distance in km
+    :rtype: float
+    """
+    phi1, lambda1, phi2, lambda2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+    cosd = cos(phi2 - phi1) - cos(phi1) * cos(phi2) * (1 - cos(lambda2 - lambda1))
+    return rds * acos(max(-1.0, min(1.0, cosd)))
+
+
+class SourceTable:
+    """
+    SourceTable class.
+    """
+
+    def __init__(self):
+        self._cells = {}  # (cell lat, cell lon) -> [(name, lat, lon, format)]
+        self._formats = {}  # shares the format strings between entries
+        self._bounds = None  # [min cell lat, max cell lat, min cell lon, max cell lon]
+        self._count = 0
+        self.complete = False
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        self.__init__()
+
+    @staticmethod
+    def _cell(lat: int, lon: int) -> tuple:
+        return lat // (CELL_DEG * _SCALE), lon // (CELL_DEG * _SCALE)
+
+    def add(self, name: str, lat: float, lon: float, fmt: str = ""):
+        """
+        Add a mountpoint.
+
+        :param str name: mountpoint name
+        :param float lat: latitude in deg
+        :param float lon: longitude in deg
+        :param str fmt: data format, e.g. "RTCM 3.2"
+        """
+        lat = int(round(lat * _SCALE))
+        lon = int(round(lon * _SCALE))
+        fmt = self._formats.setdefault(fmt, fmt)
+        cell = self._cell(lat, lon)
+        entries = self._cells.get(cell)
+        if entries is None:
+            entries = self._cells[cell] = []
+        entries.append((name, lat, lon, fmt))
+        self._count += 1
+        b = self._bounds
+        if b is None:
+            self._bounds = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            b[0] = min(b[0], cell[0])
+            b[1] = max(b[1], cell[0])
+            b[2] = min(b[2], cell[1])
+            b[3] = max(b[3], cell[1])
+
+    def parse_line(self, line) -> bool:
+        """
+        Parse one line of the sourcetable.
+        Lines other than STR entries are ignored.
+
+        :param line: sourcetable line as bytes or str
+        :return: False once ENDSOURCETABLE is reached, else True
+        :rtype: bool
+        """
+        if isinstance(line, (bytes, bytearray)):
+            if not line.startswith(b"STR;"):
+                if line.startswith(b"ENDSOURCETABLE"):
+                    self.complete = True
+                    return False
+                return True
+            line = line.decode("utf-8")
+        elif not line.startswith("STR;"):
+            if line.startswith("ENDSOURCETABLE"):
+                self.complete = True
+                return False
+            return True
+        fields = line.split(";", 11)
+        if len(fields) < 11:
+            return True
+        try:
+            self.add(fields[1], float(fields[9]), float(fields[10]), fields[3])
+        except ValueError:
+            pass  # mountpoint without position
+        return True
+
+    async def parse_stream(self, reader) -> int:
+        """
+        ASYNC
+        Parse a sourcetable from a stream, one line at a time,
+        until ENDSOURCETABLE or EOF.
+
+        :param reader: stream with an async readline() method
+        :return: number of mountpoints in the table
+        :rtype: int
+        """
+        while True:
+            line = await reader.readline()
+            if not line or not self.parse_line(line):
+                break
+        return self._count
+
+    def find(self, name: str) -> tuple:
+        """
+        Find a mountpoint by name.
+
+        :param str name: mountpoint name
+        :return: tuple of (name, lat deg, lon deg, format) or None if not found
+        :rtype: tuple
+        """
+        for entries in self._cells.values():
+            for entry in entries:
+                if entry[0] == name:
+                    return entry[0], entry[1] / _SCALE, entry[2] / _SCALE, entry[3]
+        return None
+
+    def nearest(self, lat: float, lon: float, fmt: str = "") -> tuple:
+        """
+        Find the mountpoint closest to a position.
+        Searches rings of grid cells around the position and stops as soon
+        as no unsearched cell can hold a closer mountpoint.
+
+        :param float lat: latitude in deg
+        :param float lon: longitude in deg
+        :param str fmt: only consider formats starting with this, e.g. "RTCM 3" ("" = all)
+        :return: tuple of (name of closest mountpoint, distance in km) or (None, None)
+        :rtype: tuple
+        """
+        if self._bounds is None:
+            return None, None
+        clat, clon = self._cell(int(round(lat * _SCALE)), int(round(lon * _SCALE)))
+        b = self._bounds
+        max_ring = max(clat - b[0], b[1] - clat, clon - b[2], b[3] - clon, 0)
+        best = None
+        best_dist = None
+        ring = 0
+        while ring <= max_ring:
+            for cell in self._ring(clat, clon, ring):
+                entries = self._cells.get(cell)
+                if entries is None:
+                    continue
+                for entry in entries:
+                    if fmt and not entry[3].startswith(fmt):
+                        continue
+                    dist = haversine(lat, lon, entry[1] / _SCALE, entry[2] / _SCALE)
+                    if best_dist is None or dist < best_dist:
+                        best = entry[0]
+                        best_dist = dist
+            if best_dist is not None:
+                # distance to the nearest cell outside the searched rings,
+                # meridians converge, so use the smallest width of a degree of longitude
+                edge = min(90.0, abs(lat) + (ring + 1) * CELL_DEG)
+                if best_dist <= ring * CELL_DEG * _KM_PER_DEG * cos(radians(edge)):
+                    break
+            ring += 1
+        if best is None:
+            return None, None
+        return best, round(best_dist, 2)
+
+    @staticmethod
+    def _ring(clat: int, clon: int, ring: int):
+        """
+        Generator of the cells at Chebyshev distance ring from (clat, clon).
+        """
+        if ring == 0:
+            yield clat, clon
+            return
+        for dlon in range(-ring, ring + 1):
+            yield clat - ring, clon + dlon
+            yield clat + ring, clon + dlon
+        for dlat in range(-ring + 1, ring):
+            yield clat + dlat, clon - ring
+            yield clat + dlat, clon + ring
@@ -0,0 +1,559 @@
+"""
+Binary track recording.
+
+Positions are stored as fixed-size records, collected in a preallocated
+block buffer and written to flash one whole block at a time, so the flash
+sees few, large, sector aligned writes. The blocks go to numbered files
+in a directory, a new file is started when a file reaches its size limit
+and the oldest files are deleted beyond a maximum number of files.
+
+A completed file ends with an index block holding the time range and the
+bounding box of every data block, so TrackReader can seek straight to the
+blocks covering a time window or an area. The file being written, and
+files left without index by a reset, are served by scanning the block
+headers instead, which only gives the time ranges.
+
+Block layout (little endian, BLOCK_SIZE bytes):
+
+    offset  type    field
+    0       4s      magic (BLOCK_MAGIC)
+    4       uint16  number of valid records
+    6       uint16  record size (RECORD_SIZE)
+    8       uint32  UTC time of day in ms of the first record
+    12      uint32  UTC time of day in ms of the last record
+    16      records, RECORDS_PER_BLOCK slots, slots beyond the count are undefined
+
+Record layout (RECORD_SIZE bytes):
+
+    offset  type    field
+    0       uint32  UTC time of day in ms
+    4       int32   latitude in 1e-7 deg
+    8       int32   longitude in 1e-7 deg
+    12      int32   height above MSL in mm
+    16      uint16  horizontal accuracy in mm (clamped)
+    18      uint16  vertical accuracy in mm (clamped)
+    20      uint16  age of the corrections in 0.1 s (AGE_NONE without corrections)
+    22      uint8   fix quality of the GGA sentence
+    23      uint8   satellites in use
+
+Index block layout (BLOCK_SIZE bytes, last block of a completed file):
+
+    offset  type    field
+    0       4s      magic (INDEX_MAGIC)
+    4       uint16  number of entries, one per data block
+    6       uint16  entry size (INDEX_ENTRY_SIZE)
+    8       uint32  number of records in the file
+    12      uint32  reserved
+    16      entries, INDEX_ENTRIES slots
+
+Index entry layout (INDEX_ENTRY_SIZE bytes):
+
+    offset  type    field
+    0       uint32  UTC time of day in ms of the first record
+    4       uint32  UTC time of day in ms of the last record
+    8       int32   minimum latitude in 1e-7 deg
+    12      int32   minimum longitude in 1e-7 deg
+    16      int32   maximum latitude in 1e-7 deg
+    20      int32   maximum longitude in 1e-7 deg
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from array import array
+import os
+from struct import pack_into, unpack_from
+import uasyncio
+import utime
+
+from gnss.realtime_binary import str2fixed, nmea2deg7, time2ms
+from utils.globals import TRACK_DIR, TRACK_FILE_BLOCKS, TRACK_MAX_FILES, TRACK_FLUSH_INTERVAL
+import utils.logging as logging
+
+try:
+    import mmap
+except ImportError:  # MicroPython
+    mmap = None
+
+_logger = logging.getLogger("track")
+
+BLOCK_SIZE = 4096  # flash sector size
+BLOCK_MAGIC = b"TRKB"
+BLOCK_FORMAT = "<4sHHII"
+BLOCK_HEADER = 16
+RECORD_FORMAT = "<IiiiHHHBB"
+RECORD_SIZE = 24
+RECORDS_PER_BLOCK = (BLOCK_SIZE - BLOCK_HEADER) // RECORD_SIZE
+AGE_NONE = 0xFFFF
+FILE_EXT = ".trk"
+INDEX_MAGIC = b"TRKI"
+INDEX_FORMAT = "<4sHHII"
+INDEX_ENTRY_FORMAT = "<IIiiii"
+INDEX_ENTRY_SIZE = 24
+INDEX_ENTRIES = (BLOCK_SIZE - BLOCK_HEADER) // INDEX_ENTRY_SIZE
+DAY_MS = 86400000
+
+
+def track_path(directory: str, track_id: int) -> str:
+    """
+    :param str directory: track directory
+    :param int track_id: track number
+    :return: path of the track file
+    :rtype: str
+    """
+    return "%s/%05d%s" % (directory, track_id, FILE_EXT)
+
+
+def list_tracks(directory: str = TRACK_DIR) -> list:
+    """
+    :param str directory: track directory
+    :return: track numbers in ascending order, empty if the directory does not exist
+    :rtype: list
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    ids = []
+    for name in names:
+        if name.endswith(FILE_EXT):
+            try:
+                ids.append(int(name[:-len(FILE_EXT)]))
+            except ValueError:
+                pass
+    ids.sort()
+    return ids
+
+
+def track_info(path: str):
+    """
+    Count the records of a track file from its block headers. Only whole blocks
+    are counted, a block being appended by the TrackLogger is left out.
+
+    :param str path: track file
+    :return: number of blocks, number of records or None if a block header is invalid
+    :rtype: tuple
+    """
+    blocks = os.stat(path)[6] // BLOCK_SIZE
+    records = 0
+    header = bytearray(BLOCK_HEADER)
+    with open(path, "rb") as f:
+        if blocks:
+            f.seek((blocks - 1) * BLOCK_SIZE)
+            if f.readinto(header) == BLOCK_HEADER:
+                magic, entries, _, records, _ = unpack_from(INDEX_FORMAT, header)
+                if magic == INDEX_MAGIC:
+                    return entries, records
+                records = 0
+        for block in range(blocks):
+            f.seek(block * BLOCK_SIZE)
+            if f.readinto(header) < BLOCK_HEADER:
+                return block, None
+            magic, count, size, _, _ = unpack_from(BLOCK_FORMAT, header)
+            if magic != BLOCK_MAGIC or size != RECORD_SIZE or count > RECORDS_PER_BLOCK:
+                return blocks, None
+            records += count
+    return blocks, records
+
+
+def read_records(path: str, blocks: int = None):
+    """
+    Generator of the records of a track file. The blocks are read one at a time
+    into a single preallocated buffer, blocks with an invalid header are skipped.
+
+    :param str path: track file
+    :param int blocks: number of blocks to read, None for all whole blocks
+    :return: record tuples in the order of RECORD_FORMAT
+    """
+    buf = bytearray(BLOCK_SIZE)
+    with open(path, "rb") as f:
+        block = 0
+        while blocks is None or block < blocks:
+            if f.readinto(buf) < BLOCK_SIZE:
+                return
+            block += 1
+            magic, count, size, _, _ = unpack_from(BLOCK_FORMAT, buf)
+            if magic == INDEX_MAGIC:
+                return
+            if magic != BLOCK_MAGIC or size != RECORD_SIZE or count > RECORDS_PER_BLOCK:
+                _logger.warning("invalid block %d in %s", block - 1, path)
+                continue
+            for offset in range(BLOCK_HEADER, BLOCK_HEADER + count * RECORD_SIZE, RECORD_SIZE):
+                yield unpack_from(RECORD_FORMAT, buf, offset)
+
+
+def _clamp16(value: int) -> int:
+    return 0xFFFF if value > 0xFFFF else (0 if value < 0 else value)
+
+
+class TrackLogger:
+    """
+    TrackLogger class.
+    """
+
+    def __init__(self,
+                 directory: str = TRACK_DIR,
+                 file_blocks: int = TRACK_FILE_BLOCKS,
+                 max_files: int = TRACK_MAX_FILES,
+                 flush_interval: int = TRACK_FLUSH_INTERVAL):
+        """
+        Constructor.
+
+        :param str directory: track directory, created if missing
+        :param int file_blocks: blocks per file before a new file is started, at most INDEX_ENTRIES
+        :param int max_files: number of files kept, the oldest are deleted
+        :param int flush_interval: seconds after which a partly filled block is written anyway
+        """
+        self._directory = directory
+        self._file_blocks = min(file_blocks, INDEX_ENTRIES)
+        self._max_files = max_files
+        self._flush_ms = flush_interval * 1000
+        self._buf = bytearray(BLOCK_SIZE)
+        self._count = 0  # records in the buffer
+        self._first_time = 0  # ticks_ms of the first record in the buffer
+        self._track_id = None
+        self._blocks = 0  # blocks in the current file
+        self._file_records = 0  # records in the current file
+        # index entry per block of the current file, first and last time, bounding box
+        self._index = array("i", [0] * (self._file_blocks * 6))
+        self._min_lat = self._min_lon = self._max_lat = self._max_lon = 0  # bounding box of the buffer
+        self.records = 0
+        self.blocks_written = 0
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # exists
+
+    @property
+    def track_id(self) -> int:
+        """
+        Getter for the number of the file being written, None before the first block.
+        """
+        return self._track_id
+
+    def add_gga(self, gga: bytes, h_acc: int = 0, v_acc: int = 0) -> bool:
+        """
+        Parse a GGA sentence and add it as record, writes the block when it is full.
+
+        :param bytes gga: raw NMEA GGA sentence
+        :param int h_acc: horizontal accuracy in mm
+        :param int v_acc: vertical accuracy in mm
+        :return: True if a record was added, False without a fix or for a malformed sentence
+        :rtype: bool
+        """
+        try:
+            fields = gga.decode("utf-8").strip("$\r\n").split("*", 1)[0].split(",")
+            fix = int(fields[6] or "0")
+            if not fix:
+                return False
+            age = fields[13] if len(fields) > 13 else ""
+            self.add(time2ms(fields[1]),
+                     nmea2deg7(fields[2], fields[3]),
+                     nmea2deg7(fields[4], fields[5]),
+                     str2fixed(fields[9], 3),
+                     h_acc,
+                     v_acc,
+                     str2fixed(age, 1) if age else AGE_NONE,
+                     fix,
+                     int(fields[7] or "0"))
+        except (ValueError, IndexError, UnicodeError):
+            _logger.warning("badly formed GGA %s", gga)
+            return False
+        return True
+
+    def add(self, time_ms: int, lat: int, lon: int, height: int,
+            h_acc: int, v_acc: int, age: int, fix: int, sats: int):
+        """
+        Add a record, writes the block when it is full.
+
+        :param int time_ms: UTC time of day in ms
+        :param int lat: latitude in 1e-7 deg
+        :param int lon: longitude in 1e-7 deg
+        :param int height: height above MSL in mm
+        :param int h_acc: horizontal accuracy in mm
+        :param int v_acc: vertical accuracy in mm
+        :param int age: age of the corrections in 0.1 s, AGE_NONE without corrections
+        :param int fix: GGA fix quality
+        :param int sats: satellites in use
+        """
+        if self._count == 0:
+            self._first_time = utime.ticks_ms()
+            self._min_lat = self._max_lat = lat
+            self._min_lon = self._max_lon = lon
+        else:
+            if lat < self._min_lat:
+                self._min_lat = lat
+            elif lat > self._max_lat:
+                self._max_lat = lat
+            if lon < self._min_lon:
+                self._min_lon = lon
+            elif lon > self._max_lon:
+                self._max_lon = lon
+        pack_into(RECORD_FORMAT, self._buf, BLOCK_HEADER + self._count * RECORD_SIZE,
+                  time_ms, lat, lon, height, _clamp16(h_acc), _clamp16(v_acc), _clamp16(age),
+                  fix & 0xFF, sats & 0xFF)
+        self._count += 1
+        self.records += 1
+        if self._count >= RECORDS_PER_BLOCK:
+            self.flush()
+
+    def due(self) -> bool:
+        """
+        :return: True if the buffer holds records older than the flush interval
+        :rtype: bool
+        """
+        return self._count > 0 and utime.ticks_diff(utime.ticks_ms(), self._first_time) >= self._flush_ms
+
+    def flush(self):
+        """
+        Write the buffer as one block, partly filled blocks are written whole as well,
+        so flushing them early costs flash space and erase cycles (TRACK_FLUSH_INTERVAL).
+        """
+        if not self._count:
+            return
+        first = unpack_from("<I", self._buf, BLOCK_HEADER)[0]
+        last = unpack_from("<I", self._buf, BLOCK_HEADER + (self._count - 1) * RECORD_SIZE)[0]
+        pack_into(BLOCK_FORMAT, self._buf, 0, BLOCK_MAGIC, self._count, RECORD_SIZE, first, last)
+        if self._track_id is None or self._blocks >= self._file_blocks:
+            self._rotate()
+        try:
+            with open(track_path(self._directory, self._track_id), "ab") as f:
+                f.write(self._buf)
+            i = self._blocks * 6
+            self._index[i] = first
+            self._index[i + 1] = last
+            self._index[i + 2] = self._min_lat
+            self._index[i + 3] = self._min_lon
+            self._index[i + 4] = self._max_lat
+            self._index[i + 5] = self._max_lon
+            self._blocks += 1
+            self._file_records += self._count
+            self.blocks_written += 1
+        except OSError as err:
+            _logger.error("writing track block failed: %s", err)
+        self._count = 0
+
+    def _write_index(self):
+        """
+        Complete the current file with the index block.
+        """
+        if self._track_id is None or not self._blocks:
+            return
+        buf = bytearray(BLOCK_SIZE)
+        pack_into(INDEX_FORMAT, buf, 0, INDEX_MAGIC, self._blocks, INDEX_ENTRY_SIZE, self._file_records, 0)
+        for block in range(self._blocks):
+            i = block * 6
+            pack_into(INDEX_ENTRY_FORMAT, buf, BLOCK_HEADER + block * INDEX_ENTRY_SIZE,
+                      self._index[i], self._index[i + 1], self._index[i + 2],
+                      self._index[i + 3], self._index[i + 4], self._index[i + 5])
+        try:
+            with open(track_path(self._directory, self._track_id), "ab") as f:
+                f.write(buf)
+        except OSError as err:
+            _logger.error("writing track index failed: %s", err)
+
+    def _rotate(self):
+        """
+        Complete the current file, start a new one and delete the oldest files beyond the maximum.
+        """
+        self._write_index()
+        ids = list_tracks(self._directory)
+        self._track_id = ids[-1] + 1 if ids else 1
+        self._blocks = 0
+        self._file_records = 0
+        ids.append(self._track_id)
+        while len(ids) > self._max_files:
+            try:
+                os.remove(track_path(self._directory, ids.pop(0)))
+            except OSError:
+                pass
+        _logger.info("recording track %d", self._track_id)
+
+    def close(self):
+        """
+        Write pending records and complete the current file, the next block starts a new one.
+        """
+        self.flush()
+        self._write_index()
+        self._track_id = None
+
+    async def run(self, position_event: uasyncio.Event, get_gga, get_accuracy=None):
+        """
+        ASYNC
+        Record every position announced by position_event.
+
+        :param uasyncio.Event position_event: set by the position source for every new GGA sentence
+        :param get_gga: function returning the latest GGA sentence and its ticks_ms, e.g. UartReader.get_last_gga
+        :param get_accuracy: function returning the latest Accuracy without polling the receiver, or None
+        """
+        try:
+            while True:
+                try:
+                    await uasyncio.wait_for(position_event.wait(), self._flush_ms / 1000)
+                except uasyncio.TimeoutError:
+                    if self.due():
+                        self.flush()
+                    continue
+                position_event.clear()
+                gga, _ = get_gga()
+                if gga is None:
+                    continue
+                h_acc = v_acc = 0
+                if get_accuracy is not None:
+                    accuracy = get_accuracy()
+                    h_acc = accuracy.hAcc
+                    v_acc = accuracy.vAcc
+                self.add_gga(gga, h_acc, v_acc)
+                if self.due():
+                    self.flush()
+        finally:
+            self.close()
+
+
+def _spans(first: int, last: int) -> tuple:
+    """
+    :return: the time of day range first..last (inclusive) as one or, wrapping midnight, two ranges
+    :rtype: tuple
+    """
+    if first <= last:
+        return ((first, last),)
+    return ((first, DAY_MS - 1), (0, last))
+
+
+class TrackReader:
+    """
+    Reads the records of a track file, only touching the blocks covering a query.
+
+    The blocks are looked up in the index block of a completed file, or in the
+    block headers otherwise. On CPython the file is memory mapped, on MicroPython
+    the blocks are read with readinto into a single block buffer.
+
+        with TrackReader(track_path(TRACK_DIR, 3)) as reader:
+            for record in reader.records(10 * 3600000, 10 * 3600000 + 5 * 60000):
+                ...
+    """
+
+    def __init__(self, path: str):
+        """
+        Constructor.
+
+        :param str path: track file
+        :raises: OSError if the file does not exist
+        """
+        self._file = open(path, "rb")
+        size = os.stat(path)[6]
+        self._map = None
+        if mmap is not None and size >= BLOCK_SIZE:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buf = None
+        else:
+            self._buf = bytearray(BLOCK_SIZE)
+        self.blocks = size // BLOCK_SIZE  # data blocks
+        self.record_count = 0
+        self.indexed = False
+        self.blocks_read = 0  # data blocks read by records()
+        # first and last time and bounding box per block, a first time of -1 marks an invalid block
+        self._index = array("i")
+        self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read(self, offset: int, size: int):
+        """
+        :return: buffer holding the bytes at offset and the position of offset in the buffer
+        :rtype: tuple
+        """
+        if self._map is not None:
+            return self._map, offset
+        self._file.seek(offset)
+        self._file.readinto(memoryview(self._buf)[:size])
+        return self._buf, 0
+
+    def _load_index(self):
+        """
+        Load the index block, or collect the time ranges from the block headers.
+        """
+        if self.blocks:
+            buf, pos = self._read((self.blocks - 1) * BLOCK_SIZE, BLOCK_SIZE)
+            magic, entries, size, records, _ = unpack_from(INDEX_FORMAT, buf, pos)
+            if magic == INDEX_MAGIC and size == INDEX_ENTRY_SIZE and entries == self.blocks - 1:
+                for offset in range(pos + BLOCK_HEADER, pos + BLOCK_HEADER + entries * INDEX_ENTRY_SIZE,
+                                    INDEX_ENTRY_SIZE):
+                    self._index.extend(unpack_from(INDEX_ENTRY_FORMAT, buf, offset))
+                self.blocks = entries
+                self.record_count = records
+                self.indexed = True
+                return
+        for block in range(self.blocks):
+            buf, pos = self._read(block * BLOCK_SIZE, BLOCK_HEADER)
+            magic, count, size, first, last = unpack_from(BLOCK_FORMAT, buf, pos)
+            if magic != BLOCK_MAGIC or size != RECORD_SIZE or count > RECORDS_PER_BLOCK:
+                first = last = -1
+                count = 0
+            # the bounding box is only known from the index
+            self._index.extend((first, last, -0x80000000, -0x80000000, 0x7FFFFFFF, 0x7FFFFFFF))
+            self.record_count += count
+
+    def find_blocks(self, start_ms: int = None, end_ms: int = None, bbox: tuple = None) -> list:
+        """
+        :param int start_ms: start of the time window, UTC time of day in ms, None for no time window
+        :param int end_ms: end of the time window (exclusive), a window with end_ms <= start_ms wraps midnight,
+                           required with start_ms
+        :param tuple bbox: min latitude, min longitude, max latitude, max longitude in 1e-7 deg, None for no area
+        :return: numbers of the blocks which may hold records in the time window and area
+        :rtype: list
+        """
+        windows = None if start_ms is None else _spans(start_ms, (end_ms - 1) % DAY_MS)
+        found = []
+        for block in range(self.blocks):
+            i = block * 6
+            first = self._index[i]
+            if first < 0:
+                continue
+            if bbox is not None and (self._index[i + 2] > bbox[2] or self._index[i + 4] < bbox[0]
+                                     or self._index[i + 3] > bbox[3] or self._index[i + 5] < bbox[1]):
+                continue
+            if windows is not None:
+                hit = False
+                for a, b in _spans(first, self._index[i + 1]):
+                    for c, d in windows:
+                        if a <= d and c <= b:
+                            hit = True
+                if not hit:
+                    continue
+            found.append(block)
+        return found
+
+    def records(self, start_ms: int = None, end_ms: int = None, bbox: tuple = None):
+        """
+        Generator of the records in a time window and area, parameters as for find_blocks().
+
+        :return: record tuples in the order of RECORD_FORMAT
+        """
+        wrap = start_ms is not None and end_ms <= start_ms
+        for block in self.find_blocks(start_ms, end_ms, bbox):
+            self.blocks_read += 1
+            buf, pos = self._read(block * BLOCK_SIZE, BLOCK_SIZE)
+            count = unpack_from("<H", buf, pos + 4)[0]
+            for offset in range(pos + BLOCK_HEADER, pos + BLOCK_HEADER + count * RECORD_SIZE, RECORD_SIZE):
+                record = unpack_from(RECORD_FORMAT, buf, offset)
+                if start_ms is not None:
+                    tod = record[0]
+                    if wrap:
+                        if end_ms <= tod < start_ms:
+                            continue
+                    elif tod < start_ms or tod >= end_ms:
+                        continue
+                if bbox is not None and not (bbox[0] <= record[1] <= bbox[2] and bbox[1] <= record[2] <= bbox[3]):
+                    continue
+                yield record
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
@@ -0,0 +1,157 @@
+"""
+Track export.
+
+Converts a binary track file (gnss.track) to GPX, GeoJSON or CSV while it
+is sent, record by record, so the heap use does not depend on the track
+length.
+
+Every record is formatted to a line of the same length: numbers are right
+aligned in fields wide enough for their whole binary range, and missing
+values are padded with spaces, which all three formats allow around
+values. The content length is then known in advance from the record count
+in the block headers, and the response needs no chunked encoding.
+
+The records only hold the UTC time of day. The date is taken from the
+modification time of the file, the time of the last block written, and
+records with a later time of day are dated one day earlier. This is off
+for tracks longer than a day and with the clock of the board not set.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import os
+import utime
+
+from gnss.track import track_info, read_records, AGE_NONE
+
+FORMATS = {
+    "gpx": "application/gpx+xml",
+    "geojson": "application/geo+json",
+    "csv": "text/csv",
+}
+
+DAY_MS = 86400000
+
+# GGA fix quality -> GPX fix type, padded to the same length
+_GPX_FIX = {
+    1: "<fix>3d</fix>  ",
+    2: "<fix>dgps</fix>",
+    4: "<fix>dgps</fix>",
+    5: "<fix>dgps</fix>",
+}
+_GPX_FIX_NONE = " " * 15
+_GPX_AGE = "<ageofdgpsdata>%6s</ageofdgpsdata>"
+_GPX_AGE_NONE = " " * (len(_GPX_AGE) - 3 + 6)
+
+
+def _decimal(value: int, fmt: str, scale: int) -> str:
+    """
+    :param int value: fixed point value
+    :param str fmt: format of sign, integer part and fraction, e.g. "%s%d.%07d"
+    :param int scale: 10 ** digits of the fraction
+    :return: decimal string without exponent
+    :rtype: str
+    """
+    if value < 0:
+        value = -value
+        return fmt % ("-", value // scale, value % scale)
+    return fmt % ("", value // scale, value % scale)
+
+
+def _date(seconds: int) -> str:
+    """
+    :param int seconds: seconds since the epoch
+    :return: ISO date
+    :rtype: str
+    """
+    t = utime.gmtime(seconds)
+    return "%04d-%02d-%02d" % (t[0], t[1], t[2])
+
+
+class TrackExport:
+    """
+    TrackExport class, iterating yields the export piece by piece.
+    """
+
+    def __init__(self, path: str, track_id: int, fmt: str):
+        """
+        Constructor.
+
+        :param str path: track file
+        :param int track_id: track number, used as name
+        :param str fmt: key of FORMATS
+        :raises: OSError if the file does not exist, KeyError for an unknown format
+        """
+        self.content_type = FORMATS[fmt]
+        self._fmt = fmt
+        self._path = path
+        self._track_id = track_id
+        # only the blocks complete now are exported, blocks appended meanwhile
+        # would change the content length
+        self._blocks, self.records = track_info(path)
+        mtime = os.stat(path)[8]
+        t = utime.gmtime(mtime)
+        self._end_tod = (t[3] * 3600 + t[4] * 60 + t[5]) * 1000 + 999
+        self._date = _date(mtime)
+        self._date_before = _date(mtime - 86400)
+
+    @property
+    def content_length(self) -> int:
+        """
+        Getter for the length of the export in bytes, None if the record count is unknown.
+        """
+        if self.records is None:
+            return None
+        return len(self._head()) + self.records * len(self._line(True, 0, 0, 0, 0, 0, 0, 0, 0, 0)) \
+            + len(self._tail())
+
+    def _head(self) -> str:
+        if self._fmt == "gpx":
+            return '<?xml version="1.0" encoding="UTF-8"?>\n' \
+                   '<gpx version="1.1" creator="gnss_rtk_rover" xmlns="http://www.topografix.com/GPX/1/1">\n' \
+                   '<trk><name>Track %05d</name><trkseg>\n' % self._track_id
+        if self._fmt == "geojson":
+            return '{"type":"FeatureCollection","name":"Track %05d","features":[\n' % self._track_id
+        return "time,lat,lon,height,hAcc,vAcc,age,fix,sats\n"
+
+    def _tail(self) -> str:
+        if self._fmt == "gpx":
+            return "</trkseg></trk>\n</gpx>\n"
+        if self._fmt == "geojson":
+            return "]}\n"
+        return ""
+
+    def _line(self, first: bool, time_ms: int, lat: int, lon: int, height: int,
+              h_acc: int, v_acc: int, age: int, fix: int, sats: int) -> str:
+        """
+        :return: one record in the export format, all records give lines of the same length
+        :rtype: str
+        """
+        time_ms %= DAY_MS
+        stamp = "%sT%02d:%02d:%02d.%03dZ" % (self._date if time_ms <= self._end_tod else self._date_before,
+                                            time_ms // 3600000, time_ms // 60000 % 60,
+                                            time_ms // 1000 % 60, time_ms % 1000)
+        lat = _decimal(lat, "%s%d.%07d", 10000000)
+        lon = _decimal(lon, "%s%d.%07d", 10000000)
+        height = _decimal(height, "%s%d.%03d", 1000)
+        age = None if age == AGE_NONE else _decimal(age, "%s%d.%d", 10)
+        if self._fmt == "gpx":
+            return '<trkpt lat="%12s" lon="%12s"><ele>%12s</ele><time>%s</time>%s<sat>%3d</sat>%s</trkpt>\n' % (
+                lat, lon, height, stamp, _GPX_FIX.get(fix, _GPX_FIX_NONE), sats,
+                _GPX_AGE_NONE if age is None else _GPX_AGE % age)
+        if self._fmt == "geojson":
+            return '%s{"type":"Feature","geometry":{"type":"Point","coordinates":[%12s,%12s,%12s]},' \
+                   '"properties":{"time":"%s","hAcc":%5d,"vAcc":%5d,"age":%6s,"fix":%3d,"sats":%3d}}\n' % (
+                       " " if first else ",", lon, lat, height, stamp, h_acc, v_acc,
+                       "null" if age is None else age, fix, sats)
+        return "%s,%12s,%12s,%12s,%5d,%5d,%6s,%3d,%3d\n" % (
+            stamp, lat, lon, height, h_acc, v_acc, "" if age is None else age, fix, sats)
+
+    def __iter__(self):
+        yield self._head()
+        first = True
+        for record in read_records(self._path, self._blocks):
+            yield self._line(first, *record)
+            first = False
+        yield self._tail()
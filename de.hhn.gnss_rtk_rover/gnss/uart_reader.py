@@ -12,6 +12,7 @@ Created on 4 Sep 2022
 """
 import gc
 import uasyncio
+import utime
 
 from collections import OrderedDict
 import primitives.queue
@@ -20,6 +21,21 @@ import pyubx2.exceptions as ube
 from gnss.message_types import PositionData
 from pyubx2.ubxmessage import UBXMessage
 from pyubx2.ubxhelpers import calc_checksum, bytes2val
+from utils.heap_telemetry import HeapTelemetry
+from utils.latency import LatencyTrace, STAGE_FRAME, STAGE_DISPATCH, STAGE_PUBLISH
+from utils.metrics import Metrics
+import utils.logging as logging
+
+_logger = logging.getLogger("uart_reader")
+
+_m_bytes = Metrics.counter("rover_uart_bytes_total", "Bytes of NMEA and UBX frames read from UART1")
+_m_nmea = Metrics.counter("rover_uart_frames_total", "Frames read from UART1 by protocol", 'proto="nmea"')
+_m_ubx = Metrics.counter("rover_uart_frames_total", "Frames read from UART1 by protocol", 'proto="ubx"')
+_m_nmea_cksum = Metrics.counter("rover_uart_checksum_errors_total", "Frames with an invalid checksum", 'proto="nmea"')
+_m_drop_position = Metrics.counter("rover_queue_drops_total", "Messages dropped on a full queue", 'queue="position"')
+_m_drop_ack = Metrics.counter("rover_queue_drops_total", "Messages dropped on a full queue", 'queue="ack"')
+_m_drop_cfg = Metrics.counter("rover_queue_drops_total", "Messages dropped on a full queue", 'queue="cfg"')
+_m_drop_nav = Metrics.counter("rover_queue_drops_total", "Messages dropped on a full queue", 'queue="nav"')
 
 gc.collect()
 
@@ -30,45 +46,41 @@ class UartReader:
 
     _app = None
     _sreader = None
-    _gga_q = None
     _cfg_resp_q = None
     _nav_pvt_q = None
     _ack_nack_q = None
-    _gga_event = None
     _position_q = None
     _posision: PositionData = None
+    _last_gga = None
+    _last_gga_time = None
+    position_event: uasyncio.Event = None  # set for every new GGA sentence, e.g. for the track logger
 
     @classmethod
     def initialize(cls,
                    app: object,
                    sreader: uasyncio.StreamReader,
-                   gga_q: primitives.queue.Queue,
                    cfg_resp_q: primitives.queue.Queue,
                    nav_pvt_q: primitives.queue.Queue,
                    ack_nack_q: primitives.queue.Queue,
-                   ggaevent: uasyncio.Event,
                    position_q: primitives.queue.Queue):
         """Initialize class variables.
 
         :param object app: The calling app
         :param uasyncio.StreamReader sreader: the serial connection to the GNSS Receiver(UART1)
-        :param primitives.queue.Queue gga_q: queue for gga messages to ntrip client
         :param primitives.queue.Queue cfg_resp_q: queue for ubx responses to configuration messages
         :param primitives.queue.Queue nav_pvt_q: queue for ubx NAV-PVT get messaged
         :param primitives.queue.Queue ack_nack_q: queue for ubx ACK-NACK messages
         :param primitives.queue.Queue position_q: main queue for position data to web api / client
-        :param uasyncio.Event ggaevent: event to synchronize with NTRIP client
         """
 
         cls._app = app
         cls._sreader = sreader
-        cls._gga_q = gga_q
         cls._cfg_resp_q = cfg_resp_q
         cls._nav_pvt_q = nav_pvt_q
         cls._ack_nack_q = ack_nack_q
-        cls._gga_event = ggaevent
         cls._position_q = position_q
         cls._posision = PositionData("", 0, "", "", "")
+        cls.position_event = uasyncio.Event()
     @classmethod
     async def run(cls):
         """
@@ -77,59 +89,87 @@ class UartReader:
         gcount = 0
         while True:
             if gcount >= 10:
-                gc.collect()
+                HeapTelemetry.checkpoint("uart_reader")
                 gcount = 0
             byte1 = await cls._sreader.read(1)
             # if not UBX, NMEA or RTCM3, discard and continue
             if byte1 not in (b"\xb5", b"\x24", b"\xd3"):
                 continue
+            start = utime.ticks_us()
             byte2 = await cls._sreader.read(1)
             bytehdr = byte1 + byte2
-            gcount += 1 # count 10 message reads to trigger the garbage collector
+            gcount += 1 # count 10 message reads to sample the heap
             # if it's an NMEA message ('$G' or '$P')
             if bytehdr in ubt.NMEA_HDR:
                 # read the rest of the NMEA message from the buffer
                 byten = await cls._sreader.readline()  # NMEA protocol is CRLF-terminated
+                Metrics.inc(_m_bytes, len(bytehdr) + len(byten))
+                Metrics.inc(_m_nmea)
                 if "GGA" not in str(byten):
                     continue
+                LatencyTrace.begin(start)
+                LatencyTrace.stamp(STAGE_FRAME)
                 raw_data = bytehdr + byten
                 try:
                     checksum_valid = cls._isvalid_cksum(raw_data)
                     if not checksum_valid:
-                        print("uart_reader WARN -> NMEA Sentence corrupted, invalid checksum")
+                        Metrics.inc(_m_nmea_cksum)
+                        _logger.warning("NMEA sentence corrupted, invalid checksum")
                         continue
                 except Exception as err:
-                    print("Badly formed message {}".format(raw_data))
+                    _logger.warning("badly formed message %s", raw_data)
                     continue
-                print("uart_reader -> nmea received: " + str(raw_data))
+                if __debug__:
+                    _logger.debug("nmea received: %s", raw_data)
                 cls._get_position_dict(raw_data)
+                LatencyTrace.stamp(STAGE_DISPATCH)
+                cls._last_gga = raw_data
+                cls._last_gga_time = utime.ticks_ms()
+                cls.position_event.set()
                 # if the queue is full then skip. The gga consumer needs to handle messages fast enough otherwise
                 # rxBuffer will overflow
                 if cls._position_q.empty():
                     await cls._position_q.put(cls._posision)
-                if cls._gga_event.is_set():
-                    await cls._gga_q.put(raw_data)
+                    LatencyTrace.stamp(STAGE_PUBLISH)
                 else:
-                    continue
+                    Metrics.inc(_m_drop_position)
+                continue
             # if it's a UBX message (b'\xb5\x62')
             if bytehdr in ubt.UBX_HDR:
                 msg = await cls._parse_ubx(bytehdr)
+                Metrics.inc(_m_ubx)
                 if msg.msg_cls == b"\x05":  # ACK-ACK or ACK-NACK message
-                    print("uart_reader -> parsed ACK/NACK message: " + str(msg))
+                    if __debug__:
+                        _logger.debug("parsed ACK/NACK message: %s", msg)
                     if cls._ack_nack_q.full():
+                        Metrics.inc(_m_drop_ack)
                         continue
                     await cls._ack_nack_q.put(msg)
                 if msg.msg_cls == b"\x06":  # CFG message
-                    print("uart_reader -> Parsed CFG Message")
+                    if __debug__:
+                        _logger.debug("parsed CFG message")
                     if cls._cfg_resp_q.full():
+                        Metrics.inc(_m_drop_cfg)
                         continue
                     await cls._cfg_resp_q.put(msg)
                 if msg.msg_cls == b"\x01":  # NAV message
-                    print("uart_reader -> Parsed NAV Message")
-                    if cls._cfg_resp_q.full():
+                    if __debug__:
+                        _logger.debug("parsed NAV message")
+                    if cls._nav_pvt_q.full():
+                        Metrics.inc(_m_drop_nav)
                         continue
                     await cls._nav_pvt_q.put(msg)
 
+    @classmethod
+    def get_last_gga(cls) -> tuple:
+        """
+        Latest valid NMEA GGA sentence, without waiting for the next one.
+
+        :return: tuple of (raw GGA as bytes, ticks_ms when received), (None, None) if none yet
+        :rtype: tuple
+        """
+        return cls._last_gga, cls._last_gga_time
+
     @classmethod
     async def _parse_ubx(cls, hdr: bytes) -> UBXMessage:
         """
@@ -150,6 +190,7 @@ class UartReader:
         plb = byten[0:leni]
         cksum = byten[leni: leni + 2]
         raw_data = hdr + clsid + msgid + lenb + plb + cksum
+        Metrics.inc(_m_bytes, len(raw_data))
         parsed_data = cls.parse(
             raw_data
         )
@@ -308,7 +349,7 @@ class UartReader:
                 msgid = hdr[2:]
             return talker, msgid, payload, cksum
         except Exception as err:
-            print("Badly formed message {}".format(message))
+            _logger.warning("badly formed message %s", message)
 
     @classmethod
     def _get_position_dict(cls, message: object):
@@ -326,8 +367,10 @@ class UartReader:
             nmea_fields = content.split(",")
             cls._posision.time = str(nmea_fields[1])
             cls._posision.lat = str(nmea_fields[2])
+            cls._posision.ns = str(nmea_fields[3])
             cls._posision.lon = str(nmea_fields[4])
+            cls._posision.ew = str(nmea_fields[5])
             cls._posision.elev = str(nmea_fields[9])
             cls._posision.fixType = int(nmea_fields[6])
         except Exception as err:
-            print("Badly formed message {}".format(message))
+            _logger.warning("badly formed message %s", message)
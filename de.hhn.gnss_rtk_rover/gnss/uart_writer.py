@@ -9,6 +9,10 @@ import gc
 gc.collect()
 import primitives.queue
 import uasyncio
+from utils.heap_telemetry import HeapTelemetry
+import utils.logging as logging
+
+_logger = logging.getLogger("uart_writer")
 
 class UartWriter:
     """
@@ -38,8 +42,9 @@ class UartWriter:
         ASYNC: Send incoming messages from queue to the GNSS receiver.
         """
         while True:
-            gc.collect()
+            HeapTelemetry.checkpoint("uart_writer")
             msg = await cls._queue.get()
-            print("uart_writer -> Sending message over UART1")
+            if __debug__:
+                _logger.debug("sending %d bytes over UART1", len(msg))
             cls._swriter.write(msg)
             await cls._swriter.drain()
@@ -2,20 +2,30 @@ import gc
 import uasyncio
 from machine import UART, Pin
 from uasyncio import Event, Task, Lock
+import os
 from utils.wifimanager import WiFiManager
-from utils.globals import WIFI_SSID, WIFI_PW
-from utils.mem_debug import debug_gc
+from utils.globals import WIFI_SSID, WIFI_PW, CAPTURE_ENABLED, CAPTURE_DIR
+from utils.capture import CaptureWriter, CaptureStream, CHANNEL_UART, CHANNEL_NTRIP
+from utils.heap_telemetry import HeapTelemetry
 from gnss.gnss_handler import GnssHandler
 from gnss.uart_writer import UartWriter
 from primitives.queue import Queue
 from gnss.uart_reader import UartReader
 from gnss.gnssntripclient import GNSSNTRIPClient
 from webapi.requesthandler import RequestHandler
+from utils.log_ring import LogRing
+from gnss.track import TrackLogger
+import utils.logging as logging
 gc.collect()
 
 async def main():
+    log_ring = LogRing()
+    logging.setSink(log_ring)
+    uasyncio.create_task(log_ring.flusher())
+    HeapTelemetry.configure()
+    uasyncio.create_task(HeapTelemetry.run())
+
     ntrip_stop_event = Event()
-    ggaevent = Event()
 
     masterTx = Pin(0)
     masterRx = Pin(1)
@@ -27,7 +37,6 @@ async def main():
     rtcm_lock = Lock()
 
 
-    gga_q = Queue(maxsize=1)
     cfg_q = Queue(maxsize=5)
     nav_q = Queue(maxsize=5)
     ack_q = Queue(maxsize=20)
@@ -42,6 +51,12 @@ async def main():
 
     sreader = uasyncio.StreamWriter(uart_ubx_nmea)
     swriter = uasyncio.StreamReader(uart_ubx_nmea)
+    if CAPTURE_ENABLED:  # raw data for replays, see utils.capture.ReplayStream
+        try:
+            os.mkdir(CAPTURE_DIR)
+        except OSError:
+            pass
+        sreader = CaptureStream(sreader, CaptureWriter(CAPTURE_DIR + "/uart.cap", CHANNEL_UART))
     test = ""
 
     UartWriter.initialize(app=test,
@@ -49,11 +64,9 @@ async def main():
                           queue=msg_q)
     UartReader.initialize(app=test,
                           sreader=sreader,
-                          gga_q=gga_q,
                           cfg_resp_q=cfg_q,
                           nav_pvt_q=nav_q,
                           ack_nack_q=ack_q,
-                          ggaevent=ggaevent,
                           position_q=pos_q)
 
     GnssHandler.initialize(app=test,
@@ -61,24 +74,29 @@ async def main():
                            nav_pvt_q=nav_q,
                            cfg_resp_q=cfg_q,
                            msg_q=msg_q,
-                           gga_q=gga_q,
                            pos_q=pos_q,
                            ntrip_lock=rtcm_lock,
                            stop_event=ntrip_stop_event)
 
     writertask = uasyncio.create_task(UartWriter.run())
     readertask = uasyncio.create_task(UartReader.run())
+    tracklogger = TrackLogger()
+    tracktask = uasyncio.create_task(tracklogger.run(UartReader.position_event,
+                                                     UartReader.get_last_gga,
+                                                     GnssHandler.get_cached_precision))
 
     await GnssHandler.set_minimum_nmea_msgs()
     wifi = WiFiManager(WIFI_SSID, WIFI_PW)
     await wifi.connect()
-    debug_gc()
+    HeapTelemetry.report()
     # await GnssHandler.set_update_rate(2000)
     # enabled = await GnssHandler.set_high_precision_mode(1)
     # print("main -> high precision mode enabled: " + str(enabled))
     gc.collect()
 
-    ntripclient = GNSSNTRIPClient(uart_rtcm, test, gga_q, ggaevent)
+    ntripclient = GNSSNTRIPClient(uart_rtcm, test)
+    if CAPTURE_ENABLED:
+        ntripclient.capture = CaptureWriter(CAPTURE_DIR + "/ntrip.cap", CHANNEL_NTRIP)
     ntriptask = uasyncio.create_task(ntripclient.run(rtcm_lock, ntrip_stop_event))
     gc.collect()
     gccount = 0
@@ -89,7 +107,7 @@ async def main():
         # gccount += 1
         # async with rtcm_lock:
         #     print("rtcm enabled: " + str(GnssHandler.rtcm_enabled))
-        # debug_gc()
+        # HeapTelemetry.report()
         await uasyncio.sleep(1)
 
 
@@ -76,7 +76,6 @@ class UBXMessage:
         self._do_attributes(**kwargs)
 
         self._immutable = True  # once initialised, object is immutable
-        gc.collect()
 
     def _do_attributes(self, **kwargs):
         """
@@ -152,8 +152,11 @@ class UBXReader:
         """
 
         data = await self._stream.read(size)
-        if len(data) < size:  # EOF
-            raise EOFError()
+        while len(data) < size:  # socket reads may return less than requested
+            more = await self._stream.read(size - len(data))
+            if not more:  # EOF
+                raise EOFError()
+            data += more
         return data
 
     @property
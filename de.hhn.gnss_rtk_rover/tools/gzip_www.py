@@ -0,0 +1,51 @@
+"""
+Build step for the web assets.
+
+Writes a gzip compressed '.gz' sibling next to every compressible file in
+webapi/www. MicroWebSrv serves the sibling with 'Content-Encoding: gzip'
+to clients sending 'Accept-Encoding: gzip'. Run it on the host before
+uploading the www folder:
+
+    python3 tools/gzip_www.py [webapi/www]
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import gzip
+import os
+import sys
+
+# already compressed formats and templates rendered on the rover are skipped
+SKIP_EXT = (".gz", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".zip", ".woff", ".woff2", ".pyhtml")
+MIN_SIZE = 256
+MIN_SAVING = 0.1
+
+
+def gzip_dir(path: str):
+    """
+    Create or refresh the '.gz' siblings of all files below path.
+    Stale siblings are removed if compression does not save enough.
+
+    :param str path: web root directory
+    """
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(SKIP_EXT):
+                continue
+            src = os.path.join(root, name)
+            dst = src + ".gz"
+            with open(src, "rb") as file:
+                data = file.read()
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(data) < MIN_SIZE or len(packed) > len(data) * (1 - MIN_SAVING):
+                if os.path.exists(dst):
+                    os.remove(dst)
+                continue
+            with open(dst, "wb") as file:
+                file.write(packed)
+            print("%s: %d -> %d bytes" % (src, len(data), len(packed)))
+
+
+if __name__ == "__main__":
+    gzip_dir(sys.argv[1] if len(sys.argv) > 1 else os.path.join("webapi", "www"))
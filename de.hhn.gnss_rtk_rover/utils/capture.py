@@ -0,0 +1,340 @@
+"""
+Raw data capture and replay.
+
+CaptureStream tees everything read from a stream (UART1, the NTRIP
+payload) into a CaptureWriter, which stores it as blocks stamped with the
+ms since the start of the capture. A block is closed after span_ms, which
+is the timing resolution of the replay. Blocks are collected in a buffer
+and written to the file one buffer at a time.
+
+ReplayStream serves a capture file back through the read subset of
+uasyncio.StreamReader, at the recorded speed, scaled or as fast as
+possible, as input for benchmarks and regression runs of the parser,
+NTRIP forwarding and web paths.
+
+Block layout (little endian):
+
+    offset  type    field
+    0       4s      magic (BLOCK_MAGIC)
+    4       uint8   version (VERSION)
+    5       uint8   channel (CHANNEL_UART, CHANNEL_NTRIP)
+    6       uint16  data length
+    8       uint32  ms since the start of the capture
+    12      data
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from struct import pack_into, unpack_from
+import uasyncio
+import utime
+
+from utils.globals import CAPTURE_MAX_BYTES
+import utils.logging as logging
+
+_logger = logging.getLogger("capture")
+
+BLOCK_MAGIC = b"CAPB"
+BLOCK_FORMAT = "<4sBBHI"
+BLOCK_HEADER = 12
+VERSION = 1
+CHANNEL_UART = 0
+CHANNEL_NTRIP = 1
+
+
+class CaptureWriter:
+    """
+    CaptureWriter class.
+    """
+
+    def __init__(self,
+                 path: str,
+                 channel: int = CHANNEL_UART,
+                 max_bytes: int = CAPTURE_MAX_BYTES,
+                 span_ms: int = 20,
+                 buffer_size: int = 4096):
+        """
+        Constructor.
+
+        :param str path: capture file, overwritten
+        :param int channel: channel stored in the block headers
+        :param int max_bytes: file size after which the capture stops
+        :param int span_ms: maximum time span of a block
+        :param int buffer_size: bytes collected before a file write
+        """
+        self._channel = channel
+        self._max_bytes = max_bytes
+        self._span_ms = span_ms
+        self._buf = bytearray(buffer_size)
+        self._mv = memoryview(self._buf)
+        self._used = 0  # bytes in the buffer, including the open block
+        self._block = -1  # buffer offset of the open block, -1 if none is open
+        self._block_start = 0
+        self._start = utime.ticks_ms()
+        self._file = open(path, "wb")
+        self.written = 0
+        self.dropped = 0  # bytes not captured because the file reached max_bytes
+
+    @property
+    def closed(self) -> bool:
+        """
+        True once the capture is closed or reached max_bytes.
+        """
+        return self._file is None
+
+    def write(self, data):
+        """
+        Capture data.
+
+        :param data: bytes read from the captured stream
+        """
+        size = len(data)
+        if self._file is None:
+            self.dropped += size
+            return
+        now = utime.ticks_ms()
+        if self._block >= 0 and utime.ticks_diff(now, self._block_start) >= self._span_ms:
+            self._close_block()
+        src = None
+        pos = 0
+        while pos < size:
+            if self._block < 0:
+                if self._used + BLOCK_HEADER >= len(self._buf):
+                    self._flush()
+                    if self._file is None:
+                        self.dropped += size - pos
+                        return
+                self._block = self._used
+                self._block_start = now
+                self._used += BLOCK_HEADER
+            n = min(len(self._buf) - self._used, size - pos)
+            if n == size:  # the common case, no view needed
+                self._mv[self._used:self._used + n] = data
+            else:
+                if src is None:
+                    src = memoryview(data)
+                self._mv[self._used:self._used + n] = src[pos:pos + n]
+            self._used += n
+            pos += n
+            if self._used >= len(self._buf):
+                self._flush()
+
+    def _close_block(self):
+        """
+        Write the header of the open block.
+        """
+        if self._block < 0:
+            return
+        length = self._used - self._block - BLOCK_HEADER
+        if length:
+            pack_into(BLOCK_FORMAT, self._buf, self._block, BLOCK_MAGIC, VERSION, self._channel,
+                      length, utime.ticks_diff(self._block_start, self._start))
+        else:
+            self._used = self._block
+        self._block = -1
+
+    def _flush(self):
+        """
+        Close the open block and write the buffer to the file.
+        """
+        self._close_block()
+        if self._used and self._file is not None:
+            self._file.write(self._mv[:self._used])
+            self.written += self._used
+            if self.written >= self._max_bytes:
+                _logger.warning("capture reached %d bytes, stopped", self.written)
+                self._file.close()
+                self._file = None
+        self._used = 0
+
+    def close(self):
+        """
+        Write the pending data and close the file.
+        """
+        self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CaptureStream:
+    """
+    Stream wrapper that tees the data read into a CaptureWriter.
+    """
+
+    def __init__(self, stream: object, capture: CaptureWriter):
+        """
+        Constructor.
+
+        :param stream: captured stream, e.g. a uasyncio.StreamReader
+        :param CaptureWriter capture: writer of the captured data
+        """
+        self._stream = stream
+        self._capture = capture
+
+    async def read(self, n: int = -1) -> bytes:
+        data = await self._stream.read(n)
+        self._capture.write(data)
+        return data
+
+    async def readexactly(self, n: int) -> bytes:
+        data = await self._stream.readexactly(n)
+        self._capture.write(data)
+        return data
+
+    async def readline(self) -> bytes:
+        data = await self._stream.readline()
+        self._capture.write(data)
+        return data
+
+    async def readinto(self, buf) -> int:
+        n = await self._stream.readinto(buf)
+        if n:
+            self._capture.write(memoryview(buf)[:n])
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class ReplayStream:
+    """
+    Serves a capture file through the read subset of uasyncio.StreamReader.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, channel: int = None, loop: bool = False):
+        """
+        Constructor.
+
+        :param str path: capture file
+        :param float speed: 1 for the recorded speed, 2 for twice as fast, 0 for as fast as possible
+        :param int channel: only replay blocks of this channel, None for all
+        :param bool loop: start over at the end of the file instead of returning b""
+        """
+        self._path = path
+        self._speed = speed
+        self._channel = channel
+        self._loop = loop
+        self._file = open(path, "rb")
+        self._hdr = bytearray(BLOCK_HEADER)
+        self._data = bytearray(4096)
+        self._len = 0  # bytes in the current block
+        self._pos = 0  # bytes of the current block already served
+        self._start = None  # ticks_ms of the first read
+        self.blocks = 0
+        self.eof = False
+
+    async def _next_block(self) -> bool:
+        """
+        ASYNC
+        Load the next block and wait until it is due.
+
+        :return: False at the end of the file
+        :rtype: bool
+        """
+        rewound = False  # rewound without finding a block to serve since
+        while True:
+            if self._file.readinto(self._hdr) < BLOCK_HEADER:
+                if not self._loop or rewound:  # a looped capture without a block of the channel ends as well
+                    self.eof = True
+                    return False
+                self._file.seek(0)
+                self._start = None
+                rewound = True
+                continue
+            magic, version, channel, length, offset = unpack_from(BLOCK_FORMAT, self._hdr)
+            if magic != BLOCK_MAGIC:
+                raise ValueError("invalid capture block in " + self._path)
+            if length > len(self._data):
+                self._data = bytearray(length)
+            if self._file.readinto(memoryview(self._data)[:length]) < length:
+                continue  # truncated last block, handled as end of the file
+            if self._channel is None or channel == self._channel:
+                break
+        self._len = length
+        self._pos = 0
+        self.blocks += 1
+        if self._start is None:
+            self._start = utime.ticks_add(utime.ticks_ms(), -int(offset / self._speed) if self._speed else 0)
+        if self._speed:
+            delay = int(offset / self._speed) - utime.ticks_diff(utime.ticks_ms(), self._start)
+            if delay > 0:
+                await uasyncio.sleep_ms(delay)
+        return True
+
+    async def _available(self) -> int:
+        """
+        ASYNC
+        :return: bytes left in the current block after loading the next one if needed, 0 at the end
+        :rtype: int
+        """
+        if self._pos >= self._len and not await self._next_block():
+            return 0
+        return self._len - self._pos
+
+    async def read(self, n: int = -1) -> bytes:
+        """
+        ASYNC
+        Read up to n bytes, at most up to the end of the current block.
+
+        :param int n: maximum number of bytes, -1 for the rest of the current block
+        :return: data, b"" at the end of the capture
+        :rtype: bytes
+        """
+        avail = await self._available()
+        if not avail:
+            return b""
+        if n < 0 or n > avail:
+            n = avail
+        data = bytes(self._data[self._pos:self._pos + n])
+        self._pos += n
+        return data
+
+    async def readinto(self, buf) -> int:
+        """
+        ASYNC
+        Read into buf, at most up to the end of the current block.
+
+        :return: number of bytes read, 0 at the end of the capture
+        :rtype: int
+        """
+        avail = await self._available()
+        n = min(avail, len(buf))
+        buf[:n] = memoryview(self._data)[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    async def readexactly(self, n: int) -> bytes:
+        """
+        ASYNC
+        :raises: EOFError if the capture ends before n bytes
+        """
+        data = b""
+        while len(data) < n:
+            more = await self.read(n - len(data))
+            if not more:
+                raise EOFError()
+            data += more
+        return data
+
+    async def readline(self) -> bytes:
+        """
+        ASYNC
+        :return: line including b"\\n", the rest of the capture at its end
+        :rtype: bytes
+        """
+        line = b""
+        while True:
+            avail = await self._available()
+            if not avail:
+                return line
+            end = self._data.find(b"\n", self._pos, self._len)
+            stop = self._len if end < 0 else end + 1
+            line += self._data[self._pos:stop]
+            self._pos = stop
+            if end >= 0:
+                return bytes(line)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,80 @@
+"""
+DnsCache class.
+
+Caches resolved host addresses.
+
+usocket.getaddrinfo blocks the whole uasyncio loop while the DNS query
+runs, so it is only called when the cached address expired. If the lookup
+fails, the last known address is used.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import usocket
+import utime
+import utils.logging as logging
+
+_logger = logging.getLogger("dns_cache")
+
+DNS_TTL = 3600  # seconds a resolved address is used without a new lookup
+DNS_RETRY = 60  # seconds until a failed lookup is retried, the last known address is used meanwhile
+
+
+class DnsCache:
+    """
+    DnsCache class.
+    """
+
+    # host -> [ip, ticks_ms of the lookup]
+    _entries = {}
+
+    @staticmethod
+    def _is_ip(host: str) -> bool:
+        """
+        :param str host: host name or dotted IPv4 address
+        :return: True if host is a dotted IPv4 address
+        :rtype: bool
+        """
+        parts = host.split(".")
+        return len(parts) == 4 and all(p.isdigit() for p in parts)
+
+    @classmethod
+    def resolve(cls, host: str, port: int) -> str:
+        """
+        Resolve host to an IPv4 address.
+
+        :param str host: host name or dotted IPv4 address
+        :param int port: port, passed to getaddrinfo
+        :return: dotted IPv4 address
+        :rtype: str
+        :raises: OSError if the host was never resolved and the lookup fails
+        """
+        if cls._is_ip(host):
+            return host
+        entry = cls._entries.get(host)
+        if entry is not None and entry[1] is not None \
+                and utime.ticks_diff(utime.ticks_ms(), entry[1]) < DNS_TTL * 1000:
+            return entry[0]
+        try:
+            ip = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0][-1][0]
+        except OSError as err:
+            if entry is None:
+                raise
+            _logger.warning("DNS lookup of %s failed (%s), using %s", host, err, entry[0])
+            entry[1] = utime.ticks_add(utime.ticks_ms(), (DNS_RETRY - DNS_TTL) * 1000)
+            return entry[0]
+        cls._entries[host] = [ip, utime.ticks_ms()]
+        return ip
+
+    @classmethod
+    def expire(cls, host: str):
+        """
+        Force a new lookup on the next resolve, e.g. after a failed connect.
+        The address is kept as fallback.
+
+        :param str host: host name
+        """
+        entry = cls._entries.get(host)
+        if entry is not None:
+            entry[1] = None
@@ -43,7 +43,23 @@ NTRIP_PW = "sap21hhN"
 NTRIP_SERVER = "sapos-ntrip.rlp.de"
 OUTPORT_NTRIP = 2101
 MOUNTPOINT = "VRS_3_4G_RP"
-GGA_INTERVAL = 5
+GGA_INTERVAL = 5  # seconds between GGA uploads while moving
+GGA_INTERVAL_MAX = 60  # seconds between GGA uploads while static
+GGA_MOVE_THRESHOLD = 5  # metres of movement that reset the GGA interval
+NTRIP_STALE_TIMEOUT = 10  # seconds without RTCM data before the stream is declared stale
+NTRIP_BACKOFF_MIN = 1  # seconds, first reconnect delay
+NTRIP_BACKOFF_MAX = 60  # seconds, upper bound of the reconnect delay
+RTCM_PREFER_MSM4 = False  # drop MSM5-7 of a constellation while its MSM4 is received
+TRACK_DIR = "/tracks"  # directory of the recorded tracks
+TRACK_FILE_BLOCKS = 64  # 4 KB blocks of 170 records per track file, about 3 h at 1 Hz if the blocks are full
+TRACK_MAX_FILES = 4  # oldest track files are deleted beyond this number
+# seconds after which a partly filled block is written: at most this much of the track is lost on a
+# power cut, but every block is written whole, so below 170 s at 1 Hz the blocks are partly empty,
+# the files cover less time and the flash wears faster, e.g. 60 s: 35 % used, 64 min per file, 2.8x writes
+TRACK_FLUSH_INTERVAL = 170
+CAPTURE_ENABLED = False  # tee raw UART1 and NTRIP data into CAPTURE_DIR
+CAPTURE_DIR = "/capture"
+CAPTURE_MAX_BYTES = 262144  # per capture file
 REF_LAT = "50.390281"
 REF_LON = "7.3161025"
 REF_ALT = "269.7"
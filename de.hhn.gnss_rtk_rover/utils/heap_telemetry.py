@@ -0,0 +1,179 @@
+"""
+HeapTelemetry class.
+
+Heap and garbage collector telemetry with an adaptive collection policy,
+replaces utils.mem_debug.debug_gc.
+
+Instead of the loops calling gc.collect() unconditionally, MicroPython
+collects on its own: gc.threshold() triggers a collection after a quarter
+of the free heap has been allocated, and run() moves the threshold along
+with the working set. Loops call checkpoint(), which keeps the free heap
+low-water mark of the calling task and only collects when the free heap
+falls below an eighth of the heap.
+
+Collections done by collect() and checkpoint() are counted and timed.
+Collections done by MicroPython are counted when the allocated heap
+shrank between two samples, several of them between two samples count
+as one.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import gc
+import micropython
+import uasyncio
+import utime
+import utils.logging as logging
+from utils.metrics import Metrics
+
+_logger = logging.getLogger("heap")
+
+THRESHOLD_DIV = 4  # automatic collection after free heap / THRESHOLD_DIV bytes were allocated
+LOW_FREE_DIV = 8  # checkpoint() collects below heap / LOW_FREE_DIV bytes free
+MIN_THRESHOLD = 4096
+
+
+class HeapTelemetry:
+    """
+    HeapTelemetry class.
+    """
+
+    _threshold_div = THRESHOLD_DIV
+    _low_free = 0
+    _threshold = -1
+    _last_alloc = 0
+    _tasks = {}  # task name -> lowest free heap seen by checkpoint()
+    min_free = None
+    collections = 0
+    auto_collections = 0
+    gc_total_ms = 0
+    _gc_total_us = 0  # remainder of gc_total_ms, keeps both small ints
+    gc_max_us = 0
+    gc_last_us = 0
+
+    @classmethod
+    def configure(cls, threshold_div: int = THRESHOLD_DIV, low_free_div: int = LOW_FREE_DIV):
+        """
+        Enable the adaptive policy.
+
+        :param int threshold_div: automatic collection after free heap / threshold_div bytes were allocated
+        :param int low_free_div: checkpoint() collects below heap / low_free_div bytes free
+        """
+        cls.collect()
+        cls._threshold_div = threshold_div
+        cls._low_free = (gc.mem_free() + gc.mem_alloc()) // low_free_div
+        cls._tune()
+        gc.enable()
+
+    @classmethod
+    def _tune(cls):
+        """
+        Move the automatic collection threshold along with the free heap.
+        """
+        threshold = max(gc.mem_free() // cls._threshold_div, MIN_THRESHOLD)
+        if threshold != cls._threshold:
+            cls._threshold = threshold
+            gc.threshold(threshold)
+
+    @classmethod
+    def collect(cls) -> int:
+        """
+        Run a timed collection.
+
+        :return: duration in us
+        :rtype: int
+        """
+        start = utime.ticks_us()
+        gc.collect()
+        duration = utime.ticks_diff(utime.ticks_us(), start)
+        cls.collections += 1
+        cls.gc_last_us = duration
+        if duration > cls.gc_max_us:
+            cls.gc_max_us = duration
+        total = cls._gc_total_us + duration
+        cls.gc_total_ms += total // 1000
+        cls._gc_total_us = total % 1000
+        cls._last_alloc = gc.mem_alloc()
+        return duration
+
+    @classmethod
+    def sample(cls) -> int:
+        """
+        Sample the heap.
+
+        :return: free heap in bytes
+        :rtype: int
+        """
+        free = gc.mem_free()
+        alloc = gc.mem_alloc()
+        if alloc < cls._last_alloc:
+            cls.auto_collections += 1
+        cls._last_alloc = alloc
+        if cls.min_free is None or free < cls.min_free:
+            cls.min_free = free
+        return free
+
+    @classmethod
+    def checkpoint(cls, task: str):
+        """
+        Sample the heap from a task loop, replaces gc.collect() in loops.
+        Collects only if the free heap is below the low mark.
+
+        :param str task: name of the calling task
+        """
+        free = cls.sample()
+        low = cls._tasks.get(task)
+        if low is None or free < low:
+            cls._tasks[task] = free
+        if free < cls._low_free:
+            cls.collect()
+
+    @classmethod
+    async def run(cls, interval_ms: int = 5000):
+        """
+        ASYNC
+        Sample the heap and adapt the collection threshold periodically.
+
+        :param int interval_ms: time between two samples
+        """
+        while True:
+            cls.sample()
+            cls._tune()
+            await uasyncio.sleep_ms(interval_ms)
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        """
+        :return: heap figures, collection statistics and the low-water mark per task
+        :rtype: dict
+        """
+        return {
+            "free": gc.mem_free(),
+            "alloc": gc.mem_alloc(),
+            "minFree": cls.min_free,
+            "threshold": cls._threshold,
+            "collections": cls.collections,
+            "autoCollections": cls.auto_collections,
+            "gcTotalMs": cls.gc_total_ms,
+            "gcMaxUs": cls.gc_max_us,
+            "gcLastUs": cls.gc_last_us,
+            "tasks": dict(cls._tasks),
+        }
+
+    @classmethod
+    def report(cls):
+        """
+        Log the heap figures, with the MicroPython heap dump in debug builds.
+        """
+        _logger.info("heap: %s", cls.as_dict())
+        if __debug__:
+            micropython.mem_info()
+
+
+Metrics.gauge("rover_heap_free_bytes", "Free heap", fn=gc.mem_free)
+Metrics.gauge("rover_heap_alloc_bytes", "Allocated heap", fn=gc.mem_alloc)
+Metrics.gauge("rover_heap_min_free_bytes", "Lowest free heap sampled", fn=lambda: HeapTelemetry.min_free)
+Metrics.counter("rover_gc_collections_total", "Garbage collections", 'kind="explicit"', fn=lambda: HeapTelemetry.collections)
+Metrics.counter("rover_gc_collections_total", "Garbage collections", 'kind="auto"', fn=lambda: HeapTelemetry.auto_collections)
+Metrics.counter("rover_gc_time_ms_total", "Time spent in explicit collections", fn=lambda: HeapTelemetry.gc_total_ms)
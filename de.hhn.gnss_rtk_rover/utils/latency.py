@@ -0,0 +1,188 @@
+"""
+LatencyTrace class.
+
+Measures how old a position is at each stage of its way from the UART to
+the browser. UartReader starts an epoch with the ticks_us of the first
+byte of a GGA sentence, later stages record the time elapsed since:
+
+- frame: sentence completely read
+- dispatch: checksum checked and position fields updated
+- publish: position put on the position queue
+- encode: JSON encoded / binary frame packed for a WebSocket client
+- sent: MicroWebSocket.SendText / SendBinary completed
+
+Every stage aggregates count, min, average and max and a histogram with
+four bins per power of two, from which the p95 is estimated. All of it
+lives in preallocated arrays, so recording a sample allocates nothing.
+The stages are rendered as a summary on /metrics.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from array import array
+import utime
+from utils.metrics import Metrics
+
+STAGE_FRAME = 0
+STAGE_DISPATCH = 1
+STAGE_PUBLISH = 2
+STAGE_ENCODE = 3
+STAGE_SENT = 4
+STAGES = ("frame", "dispatch", "publish", "encode", "sent")
+BINS = 96  # covers 0 us up to about 30 s, slower samples go to the last bin
+
+
+def _bin(value: int) -> int:
+    """
+    :param int value: latency in us
+    :return: histogram bin, four bins per power of two
+    :rtype: int
+    """
+    if value < 8:
+        return value
+    exp = 0
+    while value >= 8:
+        value >>= 1
+        exp += 1
+    return min((exp << 2) + value, BINS - 1)
+
+
+def _bin_limit(index: int) -> int:
+    """
+    :param int index: histogram bin
+    :return: smallest latency in us of the next bin
+    :rtype: int
+    """
+    if index < 8:
+        return index + 1
+    exp, mantissa = divmod(index, 4)
+    return (mantissa + 5) << (exp - 1)
+
+
+class LatencyTrace:
+    """
+    LatencyTrace class.
+    """
+
+    _hist = array("I", [0] * (BINS * len(STAGES)))
+    _count = array("I", [0] * len(STAGES))
+    _min = array("I", [0] * len(STAGES))
+    _max = array("I", [0] * len(STAGES))
+    # sum split in seconds and microseconds, neither overflows a small int
+    _sum_s = array("I", [0] * len(STAGES))
+    _sum_us = array("I", [0] * len(STAGES))
+    _epoch = 0  # ticks_us of the first byte of the latest GGA sentence
+
+    @classmethod
+    def reset(cls):
+        """
+        Clear all statistics.
+        """
+        for arr in (cls._hist, cls._count, cls._min, cls._max, cls._sum_s, cls._sum_us):
+            for i in range(len(arr)):
+                arr[i] = 0
+
+    @classmethod
+    def begin(cls, start: int):
+        """
+        Start a new epoch, called by UartReader for every GGA sentence.
+
+        :param int start: ticks_us of the first byte of the sentence
+        """
+        cls._epoch = start
+
+    @classmethod
+    def epoch(cls) -> int:
+        """
+        :return: ticks_us the latest epoch started at, keep it to stamp later stages of this position
+        :rtype: int
+        """
+        return cls._epoch
+
+    @classmethod
+    def stamp(cls, stage: int, epoch: int = None):
+        """
+        Record the time elapsed since the start of an epoch.
+
+        :param int stage: one of the STAGE_ constants
+        :param int epoch: ticks_us returned by epoch(), None for the latest epoch
+        """
+        if epoch is None:
+            epoch = cls._epoch
+        value = utime.ticks_diff(utime.ticks_us(), epoch)
+        if value < 0:
+            value = 0
+        count = cls._count[stage] + 1
+        cls._count[stage] = count
+        if count == 1 or value < cls._min[stage]:
+            cls._min[stage] = value
+        if value > cls._max[stage]:
+            cls._max[stage] = value
+        total = cls._sum_us[stage] + value
+        if total >= 1000000:
+            cls._sum_s[stage] += total // 1000000
+            total %= 1000000
+        cls._sum_us[stage] = total
+        cls._hist[stage * BINS + _bin(value)] += 1
+
+    @classmethod
+    def percentile(cls, stage: int, pct: int) -> int:
+        """
+        :param int stage: one of the STAGE_ constants
+        :param int pct: percentile 1..100
+        :return: upper limit in us of the histogram bin holding the percentile, None without samples
+        :rtype: int
+        """
+        count = cls._count[stage]
+        if not count:
+            return None
+        wanted = (count * pct + 99) // 100
+        seen = 0
+        offset = stage * BINS
+        for i in range(BINS):
+            seen += cls._hist[offset + i]
+            if seen >= wanted:
+                return min(_bin_limit(i), cls._max[stage])
+        return cls._max[stage]
+
+    @classmethod
+    def as_dict(cls) -> dict:
+        """
+        :return: count, minUs, avgUs, p95Us and maxUs per stage
+        :rtype: dict
+        """
+        stages = {}
+        for stage, name in enumerate(STAGES):
+            count = cls._count[stage]
+            stages[name] = {
+                "count": count,
+                "minUs": cls._min[stage] if count else None,
+                "avgUs": (cls._sum_s[stage] * 1000000 + cls._sum_us[stage]) // count if count else None,
+                "p95Us": cls.percentile(stage, 95),
+                "maxUs": cls._max[stage] if count else None,
+            }
+        return stages
+
+    @classmethod
+    def render(cls):
+        """
+        Generator of the stages as Prometheus summary, registered with Metrics.collector.
+        """
+        yield "# HELP rover_latency_us Time since the first byte of the GGA sentence per stage\n" \
+              "# TYPE rover_latency_us summary\n"
+        for stage, name in enumerate(STAGES):
+            count = cls._count[stage]
+            if not count:
+                continue
+            yield 'rover_latency_us{stage="%s",quantile="0.95"} %d\n' % (name, cls.percentile(stage, 95))
+            yield 'rover_latency_us_sum{stage="%s"} %d\n' % (name, cls._sum_s[stage] * 1000000 + cls._sum_us[stage])
+            yield 'rover_latency_us_count{stage="%s"} %d\n' % (name, count)
+        yield "# HELP rover_latency_max_us Highest time since the first byte of the GGA sentence per stage\n" \
+              "# TYPE rover_latency_max_us gauge\n"
+        for stage, name in enumerate(STAGES):
+            if cls._count[stage]:
+                yield 'rover_latency_max_us{stage="%s"} %d\n' % (name, cls._max[stage])
+
+
+Metrics.collector(LatencyTrace.render)
@@ -0,0 +1,133 @@
+"""
+LogRing class.
+
+In-RAM ring buffer sink for utils.logging.
+
+Log records are copied into a preallocated buffer of a fixed number of
+fixed-size slots, overwriting the oldest, instead of being written to the
+console while the caller waits. An async flusher task drains new records
+in batches to the console and/or a file, and the buffer content can be
+read at any time, e.g. by the /logs route after a stall.
+
+    ring = LogRing()
+    logging.setSink(ring)
+    uasyncio.create_task(ring.flusher())
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import sys
+import uasyncio
+from array import array
+
+RECORDS = 64  # number of slots
+RECORD_SIZE = 120  # bytes per slot, longer records are truncated
+
+
+class LogRing:
+    """
+    LogRing class.
+    """
+
+    def __init__(self, records: int = RECORDS, size: int = RECORD_SIZE):
+        """
+        Constructor.
+
+        :param int records: number of slots
+        :param int size: bytes per slot
+        """
+        self._records = records
+        self._size = size
+        self._buf = bytearray(records * size)
+        self._mv = memoryview(self._buf)
+        self._len = array("H", [0] * records)
+        self._seq = 0  # number of records ever written
+        self._flushed = 0  # sequence number up to which the flusher wrote
+        self.dropped = 0  # records overwritten before the flusher wrote them
+        self._event = uasyncio.Event()
+
+    @property
+    def seq(self) -> int:
+        """
+        Getter for the number of records ever written.
+        """
+        return self._seq
+
+    def write(self, levelname: str, name: str, msg: str):
+        """
+        Store a record, called by Logger.log.
+
+        :param str levelname: level name
+        :param str name: logger name
+        :param str msg: formatted message
+        """
+        slot = self._seq % self._records
+        start = slot * self._size
+        end = start + self._size - 1  # keep room for the newline
+        pos = start
+        for part in (levelname, ":", name, ":", msg):
+            data = part.encode("utf-8") if isinstance(part, str) else part
+            n = min(len(data), end - pos)
+            self._mv[pos:pos + n] = data[:n]
+            pos += n
+            if pos >= end:
+                break
+        self._buf[pos] = 10  # "\n"
+        self._len[slot] = pos + 1 - start
+        self._seq += 1
+        self._event.set()
+
+    def records(self, since: int = 0):
+        """
+        Generator of the stored records, oldest first.
+
+        :param int since: sequence number of the first record wanted
+        :return: memoryviews of the records including the newline, only valid until the next write
+        """
+        first = max(since, self._seq - self._records, 0)
+        for seq in range(first, self._seq):
+            slot = seq % self._records
+            start = slot * self._size
+            yield self._mv[start:start + self._len[slot]]
+
+    def dump(self):
+        """
+        Generator of the stored records as bytes, for the /logs route.
+        """
+        for record in self.records():
+            yield bytes(record)
+
+    async def flusher(self, stream=sys.stderr, path: str = None, interval_ms: int = 500):
+        """
+        ASYNC
+        Drain new records to the console and/or a file, one batch per interval.
+
+        :param stream: console stream, None to not write to the console
+        :param str path: file the records are appended to, None for no file
+        :param int interval_ms: minimum time between two batches
+        """
+        while True:
+            await self._event.wait()
+            self._event.clear()
+            behind = self._seq - self._flushed
+            if behind > self._records:
+                self.dropped += behind - self._records
+            batch = b"".join(self.records(self._flushed))
+            self._flushed = self._seq
+            if stream is not None:
+                try:
+                    out = getattr(stream, "buffer", None)
+                    if out is not None:
+                        out.write(batch)
+                    else:
+                        stream.write(batch.decode("utf-8", "ignore"))
+                except Exception:
+                    pass
+            if path is not None:
+                try:
+                    with open(path, "ab") as f:
+                        f.write(batch)
+                except OSError:
+                    pass
+            await uasyncio.sleep_ms(interval_ms)
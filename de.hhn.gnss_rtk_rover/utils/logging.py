@@ -3,6 +3,13 @@ Logger class.
 
 Simple logging class.
 
+Messages are %-formatted only if the level is enabled, so pass the values
+as arguments instead of building the string: _logger.debug("got %s", msg).
+Debug calls in hot paths are additionally wrapped in "if __debug__:", the
+MicroPython compiler removes these blocks at optimisation level 1 or higher
+(micropython.opt_level(1) in boot.py, or mpy-cross -O1), so they cost
+nothing at all in a production build.
+
 Created on 27 Sep 2022
 
 :author: vdueck
@@ -26,6 +33,7 @@ _level_dict = {
 }
 
 _stream = sys.stderr
+_sink = None
 
 
 class Logger:
@@ -71,11 +79,23 @@ class Logger:
         :param args: optional payload
         """
         if level >= (self.level or _level):
-            _stream.write("%s:%s:" % (self._level_str(level), self.name))
-            if not args:
-                print(msg, file=_stream)
+            if args:
+                msg = msg % args
+            if _sink is not None:
+                _sink.write(self._level_str(level), self.name, msg)
             else:
-                print(msg % args, file=_stream)
+                _stream.write("%s:%s:%s\n" % (self._level_str(level), self.name, msg))
+
+    def isEnabledFor(self, level) -> bool:
+        """
+        checks whether a message of the given level would be logged,
+        use it to skip building expensive arguments
+
+        :param _level_dict level: the log level
+        :return: True if enabled
+        :rtype: bool
+        """
+        return level >= (self.level or _level)
 
     def debug(self, msg, *args):
         """
@@ -84,7 +104,8 @@ class Logger:
         :param str msg: the log message
         :param args: optional payload
         """
-        self.log(DEBUG, msg, *args)
+        if DEBUG >= (self.level or _level):
+            self.log(DEBUG, msg, *args)
 
     def info(self, msg, *args):
         """
@@ -140,6 +161,34 @@ _level = INFO
 _loggers = {}
 
 
+def setSink(sink):
+    """
+    sends all records to a sink instead of writing them to the console,
+    e.g. a utils.log_ring.LogRing
+
+    :param sink: object with a write(levelname, name, msg) method, None for the console
+    """
+    global _sink
+    _sink = sink
+
+
+def getSink():
+    """
+    :return: the sink set with setSink, None if records go to the console
+    """
+    return _sink
+
+
+def basicConfig(level=INFO):
+    """
+    sets the default log level of all loggers without an own level
+
+    :param _level_dict level: the log level
+    """
+    global _level
+    _level = level
+
+
 def getLogger(name) -> Logger:
     if name not in _loggers:
         _loggers[name] = Logger(name)
@@ -0,0 +1,175 @@
+"""
+Metrics class.
+
+Registry of counters and gauges rendered in the Prometheus text format.
+
+Series are registered once, usually at import time of the module that
+updates them, and get a slot in a preallocated array. Updating a series
+is an array increment by slot number, cheap enough to stay enabled in
+production:
+
+    _m_bytes = Metrics.counter("rover_uart_bytes_total", "Bytes read from UART1")
+    Metrics.inc(_m_bytes, len(data))
+
+Values are unsigned 32 bit, counters wrap to 0 at 2**32 as on a restart,
+which Prometheus rate() and increase() treat as a counter reset.
+
+Values kept elsewhere are read at render time from a function passed as
+fn, other modules can add whole metric families with collector().
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+from array import array
+
+MAX_SERIES = 96
+
+COUNTER = "counter"
+GAUGE = "gauge"
+
+
+class Metrics:
+    """
+    Metrics class.
+    """
+
+    _values = array("I", [0] * MAX_SERIES)
+    _series = []  # (name, labels, fn) per slot
+    _index = {}  # (name, labels) -> slot
+    _families = {}  # name -> (type, help)
+    _collectors = []
+    dropped = 0  # series not registered because the registry was full
+
+    @classmethod
+    def _register(cls, name: str, mtype: str, help: str, labels: str, fn) -> int:
+        """
+        :return: slot of the series, -1 if the registry is full
+        :rtype: int
+        """
+        key = (name, labels)
+        slot = cls._index.get(key)
+        if slot is not None:
+            return slot
+        if len(cls._series) >= MAX_SERIES:
+            cls.dropped += 1
+            return -1
+        if name not in cls._families:
+            cls._families[name] = (mtype, help)
+        slot = len(cls._series)
+        cls._series.append((name, labels, fn))
+        cls._index[key] = slot
+        return slot
+
+    @classmethod
+    def counter(cls, name: str, help: str, labels: str = "", fn=None) -> int:
+        """
+        Register a counter.
+
+        :param str name: metric name, should end with _total
+        :param str help: help text
+        :param str labels: label set without braces, e.g. 'proto="nmea"'
+        :param fn: function returning the value at render time, None to use inc()
+        :return: slot for inc(), -1 if the registry is full
+        :rtype: int
+        """
+        return cls._register(name, COUNTER, help, labels, fn)
+
+    @classmethod
+    def gauge(cls, name: str, help: str, labels: str = "", fn=None) -> int:
+        """
+        Register a gauge.
+
+        :param str name: metric name
+        :param str help: help text
+        :param str labels: label set without braces
+        :param fn: function returning the value at render time, None to use set()
+        :return: slot for set(), -1 if the registry is full
+        :rtype: int
+        """
+        return cls._register(name, GAUGE, help, labels, fn)
+
+    @classmethod
+    def collector(cls, fn):
+        """
+        Register a function rendering additional metric families.
+
+        :param fn: generator function yielding lines in the Prometheus text format
+        """
+        cls._collectors.append(fn)
+
+    @classmethod
+    def inc(cls, slot: int, value: int = 1):
+        """
+        Increment a counter, wraps to 0 at 2**32.
+
+        :param int slot: slot returned by counter()
+        :param int value: increment
+        """
+        if slot >= 0:
+            cls._values[slot] = (cls._values[slot] + value) & 0xFFFFFFFF
+
+    @classmethod
+    def set(cls, slot: int, value: int):
+        """
+        Set a gauge.
+
+        :param int slot: slot returned by gauge()
+        :param int value: non-negative value
+        """
+        if slot >= 0:
+            cls._values[slot] = value
+
+    @classmethod
+    def inc_labels(cls, name: str, help: str, labels: str, value: int = 1):
+        """
+        Increment a counter whose label values are only known when it is updated,
+        registers the series on first use.
+
+        :param str name: metric name
+        :param str help: help text
+        :param str labels: label set without braces
+        :param int value: increment
+        """
+        slot = cls._index.get((name, labels))
+        if slot is None:
+            slot = cls._register(name, COUNTER, help, labels, None)
+        cls.inc(slot, value)
+
+    @classmethod
+    def value(cls, slot: int) -> int:
+        """
+        :param int slot: slot of the series
+        :return: current value
+        :rtype: int
+        """
+        name, labels, fn = cls._series[slot]
+        return fn() if fn is not None else cls._values[slot]
+
+    @classmethod
+    def render(cls):
+        """
+        Generator of the Prometheus text format, one piece per family and series,
+        to be written with a streamed response.
+        """
+        done = set()
+        for name, _, _ in cls._series:
+            if name in done:
+                continue
+            done.add(name)
+            mtype, help = cls._families[name]
+            yield "# HELP %s %s\n# TYPE %s %s\n" % (name, help, name, mtype)
+            for slot in range(len(cls._series)):
+                sname, labels, _ = cls._series[slot]
+                if sname != name:
+                    continue
+                value = cls.value(slot)
+                if value is None:
+                    continue
+                if labels:
+                    yield "%s{%s} %d\n" % (name, labels, value)
+                else:
+                    yield "%s %d\n" % (name, value)
+        for fn in cls._collectors:
+            for piece in fn():
+                yield piece
@@ -5,11 +5,36 @@ Copyright © 2018 Jean-Christophe Bos & HC² (www.hc2.fr)
 
 from   hashlib     import sha1
 from   binascii    import b2a_base64
-from   struct      import pack
+from   struct      import pack_into, unpack
 from   _thread     import start_new_thread, allocate_lock
 import gc
 
 import uasyncio
+import utils.logging as logging
+
+_logger = logging.getLogger("microWebSocket")
+
+
+def _unmaskPython(buf, offset, length, mask) :
+    # XOR of the whole payload as one big integer instead of a loop per byte
+    mv  = memoryview(buf)[offset:offset+length]
+    key = (bytes(mask) * ((length >> 2) + 1))[:length]
+    mv[:] = (int.from_bytes(mv, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+try :
+    import micropython
+
+    @micropython.viper
+    def _unmaskViper(buf: ptr8, offset: int, length: int, mask: ptr8) :
+        i = 0
+        while i < length :
+            buf[offset + i] ^= mask[i & 3]
+            i += 1
+
+    _unmask = _unmaskViper
+except :
+    # no native code emitter (or not MicroPython at all)
+    _unmask = _unmaskPython
 
 
 class MicroWebSocket :
@@ -30,6 +55,9 @@ class MicroWebSocket :
     _msgTypeText   = 1
     _msgTypeBin    = 2
 
+    # frames up to this size are sent with a single write of header and payload
+    _sendBufLen    = 512
+
     # ============================================================================
     # ===( Utils  )===============================================================
     # ============================================================================
@@ -76,31 +104,37 @@ class MicroWebSocket :
         self._httpCli           = None
         self._closed            = True
         self._lock              = None
+        self.Protocol           = None
         self.RecvTextCallback   = None
         self.RecvBinaryCallback = None
         self.ClosedCallback     = None
 
 
-    async def run(self, sreader: uasyncio.StreamReader, swriter: uasyncio.StreamWriter, httpClient, httpResponse, maxRecvLen, acceptCallback) :
+    async def run(self, sreader: uasyncio.StreamReader, swriter: uasyncio.StreamWriter, httpClient, httpResponse, maxRecvLen, acceptCallback, maxMsgLen=None, protocols=None) :
         self._sreader           = sreader
         self._swriter           = swriter
         self._httpCli           = httpClient
         self._closed            = True
         self._lock              = allocate_lock()
+        self.Protocol           = None
+        # messages longer than the receive buffer grow it up to this cap
+        self._maxMsgLen         = max(maxMsgLen or maxRecvLen, maxRecvLen)
         self.RecvTextCallback   = None
         self.RecvBinaryCallback = None
         self.ClosedCallback     = None
 
-        print("inside websocket.run(): starting ws task")
-        if await self._handshake(httpResponse) :
+        if __debug__ :
+            _logger.debug("starting websocket")
+        if await self._handshake(httpResponse, protocols) :
             self._ctrlBuf = MicroWebSocket._tryAllocByteArray(0x7D)
             self._msgBuf  = MicroWebSocket._tryAllocByteArray(maxRecvLen)
-            if self._ctrlBuf and self._msgBuf :
+            self._sendBuf = MicroWebSocket._tryAllocByteArray(self._sendBufLen)
+            if self._ctrlBuf and self._msgBuf and self._sendBuf :
                 self._msgType = None
                 self._msgLen  = 0
                 await self._wsProcess(acceptCallback)
                 return
-            print("MicroWebSocket : Out of memory on new WebSocket connection.")
+            _logger.error("out of memory on new WebSocket connection")
         try :
             await self._sreader.wait_closed()
             await self._swriter.wait_closed()
@@ -111,14 +145,20 @@ class MicroWebSocket :
     # ===( Functions )============================================================
     # ============================================================================
 
-    async def _handshake(self, httpResponse) :
+    async def _handshake(self, httpResponse, protocols=None) :
         try :
-            key = self._httpCli.GetRequestHeaders().get('sec-websocket-key', None)
+            headers = self._httpCli.GetRequestHeaders()
+            key = headers.get('sec-websocket-key', None)
             if key :
                 key += self._handshakeSign
                 r = sha1(key.encode()).digest()
                 r = b2a_base64(r).decode().strip()
-                await httpResponse.WriteSwitchProto("websocket", { "Sec-WebSocket-Accept" : r })
+                respHeaders = { "Sec-WebSocket-Accept" : r }
+                self.Protocol = MicroWebSocket._selectProtocol( headers.get('sec-websocket-protocol', None),
+                                                                protocols )
+                if self.Protocol :
+                    respHeaders["Sec-WebSocket-Protocol"] = self.Protocol
+                await httpResponse.WriteSwitchProto("websocket", respHeaders)
                 return True
         except :
             pass
@@ -126,6 +166,18 @@ class MicroWebSocket :
 
     # ----------------------------------------------------------------------------
 
+    @staticmethod
+    def _selectProtocol(requested, supported) :
+        # first subprotocol offered by the client that the server supports
+        if requested and supported :
+            for proto in requested.split(',') :
+                proto = proto.strip()
+                if proto in supported :
+                    return proto
+        return None
+
+    # ----------------------------------------------------------------------------
+
     async def _wsProcess(self, acceptCallback) :
         self._closed = False
         # try :
@@ -147,9 +199,7 @@ class MicroWebSocket :
 
     async def _receiveFrame(self) :
         try :
-            b = await self._sreader.read(2)
-            if not b or len(b) != 2 :
-                return False
+            b = await self._sreader.readexactly(2)
 
             fin    = b[0] & 0x80 > 0
             opcode = b[0] & 0x0F
@@ -164,29 +214,22 @@ class MicroWebSocket :
                 self._msgType = self._msgTypeBin
 
             if length == 0x7E :
-                b = await self._sreader.read(2)
-                if not b or len(b) != 2 :
-                    return False
+                b = await self._sreader.readexactly(2)
                 length = (b[0] << 8) + b[1]
             elif length == 0x7F :
-                return False
-            mask = await self._sreader.read(4) if masked else None
-            if masked and (not mask or len(mask) != 4) :
-                return False
+                length = unpack('>Q', await self._sreader.readexactly(8))[0]
+            mask = await self._sreader.readexactly(4) if masked else None
             if opcode == self._opContFrame or \
                opcode == self._opTextFrame or \
                opcode == self._opBinFrame :
                 if length > 0 :
-                    buf = memoryview(self._msgBuf)[self._msgLen:]
-                    if length > len(buf) :
+                    if not self._reserveMsgBuf(self._msgLen + length) :
                         return False
-                    x = await self._sreader.readinto(buf[0:length])
-                    if x != length :
+                    buf = memoryview(self._msgBuf)[self._msgLen:self._msgLen+length]
+                    if not await self._readInto(buf) :
                         return False
                     if masked :
-                        for i in range(length) :
-                            idx = self._msgLen + i
-                            self._msgBuf[idx] ^= mask[i%4]
+                        _unmask(self._msgBuf, self._msgLen, length, mask)
                     self._msgLen += length
                     if fin :
                         b = bytes(memoryview(self._msgBuf)[:self._msgLen])
@@ -195,13 +238,13 @@ class MicroWebSocket :
                                 try :
                                     await self.RecvTextCallback(self, b.decode())
                                 except Exception as ex :
-                                    print("MicroWebSocket : Error on recv text callback (%s)." % str(ex))
+                                    _logger.error("error on recv text callback (%s)", ex)
                         else :
                             if self.RecvBinaryCallback :
                                 try :
                                     await self.RecvBinaryCallback(self, b)
                                 except Exception as ex :
-                                    print("MicroWebSocket : Error on recv binary callback (%s)." % str(ex))
+                                    _logger.error("error on recv binary callback (%s)", ex)
                         self._msgType = None
                         self._msgLen  = 0
                 else :
@@ -212,10 +255,11 @@ class MicroWebSocket :
                 if length > len(self._ctrlBuf) :
                     return False
                 if length > 0 :
-                    x = await self._sreader.readinto(self._ctrlBuf[0:length])
-                    if x != length :
-                        return False
                     pingData = memoryview(self._ctrlBuf)[:length]
+                    if not await self._readInto(pingData) :
+                        return False
+                    if masked :
+                        _unmask(self._ctrlBuf, 0, length, mask)
                 else :
                     pingData = None
                 await self._sendFrame(self._opPongFrame, pingData)
@@ -226,7 +270,32 @@ class MicroWebSocket :
         except :
             return False
 
-        print("inside websocket._receiveFrame(): SUCCESS")
+        return True
+
+    # ----------------------------------------------------------------------------
+
+    def _reserveMsgBuf(self, size) :
+        if size <= len(self._msgBuf) :
+            return True
+        if size > self._maxMsgLen :
+            return False
+        buf = MicroWebSocket._tryAllocByteArray(size)
+        if buf is None :
+            return False
+        buf[:self._msgLen] = memoryview(self._msgBuf)[:self._msgLen]
+        self._msgBuf = buf
+        return True
+
+    # ----------------------------------------------------------------------------
+
+    async def _readInto(self, buf) :
+        # a frame payload may arrive in several TCP segments
+        pos = 0
+        while pos < len(buf) :
+            x = await self._sreader.readinto(buf[pos:])
+            if not x :
+                return False
+            pos += x
         return True
 
     # ----------------------------------------------------------------------------
@@ -234,23 +303,30 @@ class MicroWebSocket :
     async def _sendFrame(self, opcode, data=None, fin=True) :
         if not self._closed and opcode >= 0x00 and opcode <= 0x0F :
             dataLen = 0 if not data else len(data)
-            if dataLen <= 0xFFFF :
-                b1 = (0x80 | opcode) if fin else opcode
-                b2 = 0x7E if dataLen >= 0x7E else dataLen
-                # try :
-                msg = pack('>BB', b1, b2)
-                self._swriter.write(msg)
-                await self._swriter.drain()
+            buf     = self._sendBuf
+            buf[0]  = (0x80 | opcode) if fin else opcode
+            if dataLen < 0x7E :
+                buf[1] = dataLen
+                hdrLen = 2
+            elif dataLen <= 0xFFFF :
+                buf[1] = 0x7E
+                pack_into('>H', buf, 2, dataLen)
+                hdrLen = 4
+            else :
+                buf[1] = 0x7F
+                pack_into('>Q', buf, 2, dataLen)
+                hdrLen = 10
+            # no await between the writes, so frames of concurrent senders
+            # cannot interleave, and only one drain per frame
+            if hdrLen + dataLen <= len(buf) :
                 if dataLen > 0 :
-                    if dataLen >= 0x7E :
-                        self._swriter.write(pack('>H', dataLen))
-                        await self._swriter.drain()
-                    self._swriter.write(data)
-                    await self._swriter.drain()
-                    ret = True
-                else:
-                    ret = True
-                return ret
+                    buf[hdrLen:hdrLen+dataLen] = data
+                self._swriter.write(memoryview(buf)[:hdrLen+dataLen])
+            else :
+                self._swriter.write(memoryview(buf)[:hdrLen])
+                self._swriter.write(data)
+            await self._swriter.drain()
+            return True
         return False
 
     # ----------------------------------------------------------------------------
@@ -271,7 +347,8 @@ class MicroWebSocket :
     # ----------------------------------------------------------------------------
 
     async def Close(self) :
-        print("closing websocket")
+        if __debug__ :
+            _logger.debug("closing websocket")
         if not self._closed :
             try :
                 await self._sendFrame(self._opCloseFrame)
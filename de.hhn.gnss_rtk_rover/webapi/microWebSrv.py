@@ -6,9 +6,14 @@ Copyright © 2018 Jean-Christophe Bos & HC² (www.hc2.fr)
 
 from    json        import loads, dumps
 from    os          import stat
+from    collections import OrderedDict
 import  re
 
 import uasyncio
+import utils.logging as logging
+from utils.metrics import Metrics
+
+_logger = logging.getLogger("microWebSrv")
 
 try :
     from webapi.microWebTemplate import MicroWebTemplate
@@ -29,6 +34,15 @@ class MicroWebSrvRoute :
         self.routeRegex    = routeRegex   
 
 
+class MicroWebSrvStaticFile :
+    def __init__(self, physPath, size, gzPath, gzSize, etag) :
+        self.physPath = physPath
+        self.size     = size
+        self.gzPath   = gzPath
+        self.gzSize   = gzSize
+        self.etag     = etag
+
+
 class MicroWebSrv :
 
     # ============================================================================
@@ -79,6 +93,8 @@ class MicroWebSrv :
 
     _pyhtmlPagesExt = '.pyhtml'
 
+    _gzipExt        = '.gz'
+
     # ============================================================================
     # ===( Class globals  )=======================================================
     # ============================================================================
@@ -142,6 +158,15 @@ class MicroWebSrv :
     def _isPyHTMLFile(filename) :
         return filename.lower().endswith(MicroWebSrv._pyhtmlPagesExt)
 
+    # ----------------------------------------------------------------------------
+
+    @staticmethod
+    def _countRequest(route, code) :
+        # labelled by the route pattern, not the path, to keep the number of series bounded
+        Metrics.inc_labels( "rover_http_requests_total",
+                            "HTTP requests by route and status",
+                            'route="%s",code="%s"' % (route, code) )
+
     # ============================================================================
     # ===( Constructor )==========================================================
     # ============================================================================
@@ -158,28 +183,68 @@ class MicroWebSrv :
         self._started       = False
 
         self.MaxWebSocketRecvLen        = 1024
+        self.MaxWebSocketMsgLen         = 4096
         self.WebSocketThreaded          = False
+        # subprotocols accepted in the handshake, in order of preference of the client
+        self.WebSocketProtocols         = ()
         self.AcceptWebSocketCallback    = None
+        # 0 : no caching, 1 : ETag and Cache-Control headers,
+        # 2 : additionally answer If-None-Match with 304 Not Modified
         self.LetCacheStaticContentLevel = 2
+        self.StaticCacheControl         = "max-age=3600"
+        self.StaticCacheMaxFileSize     = 4096
+        self.StaticCacheMaxBytes        = 16384
+        self.KeepAliveTimeout           = 5
+        self.MaxKeepAliveRequests       = 100
+        self.MaxKeepAliveConnections    = 4
+        self.SendBufferSize             = 1024
+
+        self._keepAliveCount = 0
+        self._staticPaths    = { }
+        self._staticFiles    = { }
+        self._staticContent  = OrderedDict()
+        self._staticCacheLen = 0
 
         self._routeHandlers = []
+        # static routes are looked up by (method, path), only routes with
+        # <arg> parts are matched by regex, grouped by method
+        self._staticRoutes  = { }
+        self._regexRoutes   = { }
+        self._routeMethods  = { }
         routeHandlers += self._docoratedRouteHandlers
         for route, method, func in routeHandlers :
+            method     = method.upper()
             routeParts = route.split('/')
             # -> ['', 'users', '<uID>', 'addresses', '<addrID>', 'test', '<anotherID>']
             routeArgNames = []
             routeRegex    = ''
             for s in routeParts :
-                if s.startswith('<') and s.endswith('>') :
-                    routeArgNames.append(s[1:-1])
+                if s.startswith('<') and '>' in s :
+                    # -> '<id>' or '<id>.gpx', a fixed suffix is matched literally
+                    end = s.index('>')
+                    routeArgNames.append(s[1:end])
                     routeRegex += '/(\\w*)'
+                    for c in s[end+1:] :
+                        routeRegex += c if c.isalpha() or c.isdigit() else '\\' + c
                 elif s :
                     routeRegex += '/' + s
+            if routeArgNames :
+                routePath = None
+            else :
+                # -> '/users/addresses', the same form GetRouteHandler looks up
+                routePath = routeRegex
             routeRegex += '$'
             # -> '/users/(\w*)/addresses/(\w*)/test/(\w*)$'
             routeRegex = re.compile(routeRegex)
 
-            self._routeHandlers.append(MicroWebSrvRoute(route, method, func, routeArgNames, routeRegex))
+            rh = MicroWebSrvRoute(route, method, func, routeArgNames, routeRegex)
+            self._routeHandlers.append(rh)
+            if routePath is not None :
+                if (method, routePath) not in self._staticRoutes :
+                    self._staticRoutes[(method, routePath)] = rh
+                    self._routeMethods.setdefault(routePath, []).append(method)
+            else :
+                self._regexRoutes.setdefault(method, []).append(rh)
 
     # ============================================================================
     # ===( Server Process )=======================================================
@@ -189,9 +254,19 @@ class MicroWebSrv :
         self._started = True
         # try:
         cliAddr = sreader.get_extra_info("peername")
-        print("client connected: " + str(cliAddr))
+        if __debug__ :
+            _logger.debug("client connected: %s", cliAddr)
         cli = self._client(self, sreader, swriter, cliAddr)
-        await cli.processRequest()
+        # only a limited number of sockets may stay open between requests,
+        # further connections are served once and closed
+        keepAlive = self._keepAliveCount < self.MaxKeepAliveConnections
+        if keepAlive :
+            self._keepAliveCount += 1
+        try :
+            await cli.processConnection(keepAlive)
+        finally :
+            if keepAlive :
+                self._keepAliveCount -= 1
         # except OSError:
         #     pass
 
@@ -202,7 +277,7 @@ class MicroWebSrv :
     async def Start(self) :
         if not self._started :
             self._server = await uasyncio.start_server(self._serverProcess, self._srvAddr[0], self._srvAddr[1])
-            print("server running at: " + str(self._srvAddr[0]) + ":" + str(self._srvAddr[1]))
+            _logger.info("server running at: %s:%s", self._srvAddr[0], self._srvAddr[1])
             self._started = True
     # ----------------------------------------------------------------------------
 
@@ -233,32 +308,65 @@ class MicroWebSrv :
     # ----------------------------------------------------------------------------
     
     def GetRouteHandler(self, resUrl, method) :
+        rh, routeArgs = self._getRoute(resUrl, method)
+        return (rh.func if rh else None, routeArgs)
+
+    # ----------------------------------------------------------------------------
+
+    def _getRoute(self, resUrl, method) :
         if self._routeHandlers :
             #resUrl = resUrl.upper()
             if resUrl.endswith('/') :
                 resUrl = resUrl[:-1]
             method = method.upper()
-            for rh in self._routeHandlers :
-                if rh.method == method :
-                    m = rh.routeRegex.match(resUrl)
-                    if m :   # found matching route?
-                        if rh.routeArgNames :
-                            routeArgs = {}
-                            for i, name in enumerate(rh.routeArgNames) :
-                                value = m.group(i+1)
-                                try :
-                                    value = int(value)
-                                except :
-                                    pass
-                                routeArgs[name] = value
-                            return (rh.func, routeArgs)
-                        else :
-                            return (rh.func, None)
+            rh = self._staticRoutes.get((method, resUrl), None)
+            if rh :
+                return (rh, None)
+            for rh in self._regexRoutes.get(method, ()) :
+                m = rh.routeRegex.match(resUrl)
+                if m :   # found matching route?
+                    routeArgs = {}
+                    for i, name in enumerate(rh.routeArgNames) :
+                        value = m.group(i+1)
+                        try :
+                            value = int(value)
+                        except :
+                            pass
+                        routeArgs[name] = value
+                    return (rh, routeArgs)
         return (None, None)
 
     # ----------------------------------------------------------------------------
 
+    def GetRouteMethods(self, resUrl) :
+        # methods with a route for this path, to tell 405 from 404
+        if resUrl.endswith('/') :
+            resUrl = resUrl[:-1]
+        methods = list(self._routeMethods.get(resUrl, ()))
+        for method in self._regexRoutes :
+            if method not in methods :
+                for rh in self._regexRoutes[method] :
+                    if rh.routeRegex.match(resUrl) :
+                        methods.append(method)
+                        break
+        return methods
+
+    # ----------------------------------------------------------------------------
+
     def _physPathFromURLPath(self, urlPath) :
+        # flash contents only change on deployment, so resolved paths are
+        # remembered to save the os.stat probing (up to six for '/')
+        cache = self.LetCacheStaticContentLevel > 0
+        if cache and urlPath in self._staticPaths :
+            return self._staticPaths[urlPath]
+        physPath = self._probePhysPath(urlPath)
+        if cache and physPath :
+            self._staticPaths[urlPath] = physPath
+        return physPath
+
+    # ----------------------------------------------------------------------------
+
+    def _probePhysPath(self, urlPath) :
         if urlPath == '/' :
             for idxPage in self._indexPages :
                 physPath = self._webPath + '/' + idxPage
@@ -270,6 +378,47 @@ class MicroWebSrv :
                 return physPath
         return None
 
+    # ----------------------------------------------------------------------------
+
+    def _getStaticFile(self, physPath) :
+        sf = self._staticFiles.get(physPath, None)
+        if sf is None :
+            try :
+                st = stat(physPath)
+            except :
+                return None
+            gzPath = physPath + self._gzipExt
+            try :
+                gzSize = stat(gzPath)[6]
+            except :
+                gzPath = None
+                gzSize = None
+            # weak validator from modification time and size is enough here
+            etag = '%x-%x' % (st[8], st[6])
+            sf = MicroWebSrvStaticFile(physPath, st[6], gzPath, gzSize, etag)
+            self._staticFiles[physPath] = sf
+        return sf
+
+    # ----------------------------------------------------------------------------
+
+    def _getStaticContent(self, physPath, size) :
+        # small LRU of hot files kept in RAM, None if the file is not cacheable
+        if size > self.StaticCacheMaxFileSize or size > self.StaticCacheMaxBytes :
+            return None
+        content = self._staticContent.pop(physPath, None)
+        if content is None :
+            try :
+                with open(physPath, 'rb') as file :
+                    content = file.read()
+            except :
+                return None
+            self._staticCacheLen += len(content)
+            while self._staticCacheLen > self.StaticCacheMaxBytes :
+                oldest = next(iter(self._staticContent))
+                self._staticCacheLen -= len(self._staticContent.pop(oldest))
+        self._staticContent[physPath] = content
+        return content
+
     # ============================================================================
     # ===( Class Client  )========================================================
     # ============================================================================
@@ -283,6 +432,14 @@ class MicroWebSrv :
             self._sreader       = sreader
             self._swriter       = swriter
             self._addr          = addr
+            self._wstask        = None
+            self._keepAlive     = False
+            self._sendBuf       = bytearray(microWebSrv.SendBufferSize)
+            self._resetRequest()
+
+        # ------------------------------------------------------------------------
+
+        def _resetRequest(self) :
             self._method        = None
             self._path          = None
             self._httpVer       = None
@@ -292,20 +449,52 @@ class MicroWebSrv :
             self._headers       = { }
             self._contentType   = None
             self._contentLength = 0
-            self._wstask        = None
+            self._contentRead   = 0
+
+        # ------------------------------------------------------------------------
+
+        async def processConnection(self, keepAlive) :
+            try :
+                count = 0
+                while True :
+                    count += 1
+                    self._resetRequest()
+                    self._keepAlive = keepAlive and \
+                                      count < self._microWebSrv.MaxKeepAliveRequests
+                    if not await self.processRequest() :
+                        break
+            except Exception as ex :
+                _logger.warning('connection error (%s)', ex)
+            try :
+                await self._sreader.wait_closed()
+                await self._swriter.wait_closed()
+            except :
+                pass
 
         # ------------------------------------------------------------------------
 
         async def processRequest(self) :
+            # returns True if the connection may be reused for another request
+            try :
+                line_raw = await uasyncio.wait_for( self._sreader.readline(),
+                                                    self._microWebSrv.KeepAliveTimeout )
+            except uasyncio.TimeoutError :
+                return False
+            if not line_raw :
+                return False
             # try :
             response = MicroWebSrv._response(self)
-            if await self._parseFirstLine(response) :
+            route = "none"
+            if self._parseFirstLine(line_raw) :
                 if await self._parseHeader(response) :
+                    self._keepAlive = self._keepAlive and self._getConnKeepAlive()
                     upg = self._getConnUpgrade()
                     if not upg :
-                        routeHandler, routeArgs = self._microWebSrv.GetRouteHandler(self._resPath, self._method)
-                        if routeHandler :
+                        rh, routeArgs = self._microWebSrv._getRoute(self._resPath, self._method)
+                        if rh :
                             #try :
+                                route = rh.route
+                                routeHandler = rh.func
                                 if routeArgs is not None:
                                     await routeHandler(self, response, routeArgs)
                                 else :
@@ -313,49 +502,74 @@ class MicroWebSrv :
                             # except Exception as ex :
                             #     print('MicroWebSrv handler exception:\r\n  - In route %s %s\r\n  - %s' % (self._method, self._resPath, ex))
                             #     raise ex
-                        elif self._method.upper() == "GET" :
-                            filepath = self._microWebSrv._physPathFromURLPath(self._resPath)
+                        else :
+                            filepath = None
+                            if self._method == "GET" :
+                                filepath = self._microWebSrv._physPathFromURLPath(self._resPath)
                             if filepath :
+                                route = "static"
                                 if MicroWebSrv._isPyHTMLFile(filepath) :
                                     await response.WriteResponsePyHTMLFile(filepath)
                                 else :
                                     contentType = self._microWebSrv.GetMimeTypeFromFilename(filepath)
                                     if contentType :
-                                        result = await response.WriteResponseFile(filepath, contentType)
+                                        result = await response.WriteResponseStaticFile(filepath, contentType)
                                     else :
                                         await response.WriteResponseForbidden()
                             else :
-                                await response.WriteResponseNotFound()
-                        else :
-                            await response.WriteResponseMethodNotAllowed()
+                                methods = self._microWebSrv.GetRouteMethods(self._resPath)
+                                if methods :
+                                    await response.WriteResponseMethodNotAllowed(methods)
+                                else :
+                                    await response.WriteResponseNotFound()
                     elif upg == 'websocket' and 'MicroWebSocket' in globals() \
                          and self._microWebSrv.AcceptWebSocketCallback :
-                            print("inside websrv.processrequest(): starting ws task")
+                            if __debug__ :
+                                _logger.debug("starting websocket")
+                            MicroWebSrv._countRequest("websocket", 101)
                             websocket = MicroWebSocket()
                             await websocket.run( sreader = self._sreader,
                                                  swriter        = self._swriter,
                                                  httpClient     = self,
                                                  httpResponse   = response,
                                                  maxRecvLen     = self._microWebSrv.MaxWebSocketRecvLen,
-                                                 acceptCallback = self._microWebSrv.AcceptWebSocketCallback)
-                            return
+                                                 acceptCallback = self._microWebSrv.AcceptWebSocketCallback,
+                                                 maxMsgLen      = self._microWebSrv.MaxWebSocketMsgLen,
+                                                 protocols      = self._microWebSrv.WebSocketProtocols)
+                            return False
                     else :
+                        self._keepAlive = False
                         await response.WriteResponseNotImplemented()
                 else :
+                    self._keepAlive = False
                     await response.WriteResponseBadRequest()
+            else :
+                self._keepAlive = False
+                await response.WriteResponseBadRequest()
             # except :
             #     await response.WriteResponseInternalServerError()
-            try :
-                await self._sreader.wait_closed()
-                await self._swriter.wait_closed()
-            except :
-                pass
+            MicroWebSrv._countRequest(route, response.Code)
+            if self._keepAlive :
+                # skip the part of the request body the handler did not read,
+                # so the next request on this connection starts at its first line
+                return await self._skipRequestContent()
+            return False
 
         # ------------------------------------------------------------------------
 
-        async def _parseFirstLine(self, response) :
+        async def _skipRequestContent(self) :
+            size = self._contentLength - self._contentRead
+            while size > 0 :
+                data = await self._sreader.read(min(size, 512))
+                if not data :
+                    return False
+                size -= len(data)
+            return True
+
+        # ------------------------------------------------------------------------
+
+        def _parseFirstLine(self, line_raw) :
             try :
-                line_raw = await self._sreader.readline()
                 elements = line_raw.decode().strip().split()
                 if len(elements) == 3 :
                     self._method  = elements[0].upper()
@@ -402,6 +616,14 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
+        def _getConnKeepAlive(self) :
+            conn = self._headers.get('connection', '').lower()
+            if self._httpVer == 'HTTP/1.1' :
+                return 'close' not in conn
+            return 'keep-alive' in conn
+
+        # ------------------------------------------------------------------------
+
         def GetServer(self) :
             return self._microWebSrv
 
@@ -465,9 +687,11 @@ class MicroWebSrv :
         async def ReadRequestContent(self, size=None) :
             if size is None :
                 size = self._contentLength
+            size = min(size, self._contentLength - self._contentRead)
             if size > 0 :
                 try :
-                    content = await self._sreader.read(size)
+                    content = await self._sreader.readexactly(size)
+                    self._contentRead += len(content)
                     return content
                 except :
                     pass
@@ -489,7 +713,7 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
-        def ReadRequestContentAsJSON(self) :
+        async def ReadRequestContentAsJSON(self) :
             data = await self.ReadRequestContent()
             if data :
                 try :
@@ -507,7 +731,10 @@ class MicroWebSrv :
         # ------------------------------------------------------------------------
 
         def __init__(self, client) :
-            self._client = client
+            self._client  = client
+            self._bufLen  = 0
+            self._chunked = False
+            self.Code     = 0
 
         # ------------------------------------------------------------------------
 
@@ -528,63 +755,125 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
-        async def _writeFirstLine(self, code) :
+        def _bufAppend(self, data, strEncoding='ISO-8859-1') :
+            if type(data) == str :
+                data = data.encode(strEncoding)
+            buf = self._client._sendBuf
+            end = self._bufLen + len(data)
+            if end > len(buf) :
+                # oversized headers, grow the connection buffer once
+                buf.extend(bytearray(end - len(buf)))
+            buf[self._bufLen:end] = data
+            self._bufLen = end
+
+        # ------------------------------------------------------------------------
+
+        async def _flush(self, content=None) :
+            # sends the buffered header and the content with a single drain,
+            # small contents are copied behind the header to go out in one segment
+            buf = self._client._sendBuf
+            if content and self._bufLen + len(content) <= len(buf) :
+                self._bufAppend(content)
+                content = None
+            if self._bufLen :
+                self._client._swriter.write(memoryview(buf)[:self._bufLen])
+                self._bufLen = 0
+            if content :
+                self._client._swriter.write(content)
+            await self._client._swriter.drain()
+            return True
+
+        # ------------------------------------------------------------------------
+
+        async def _writeChunk(self, data) :
+            if self._chunked :
+                self._bufAppend("%x\r\n" % len(data))
+            await self._flush(data)
+            if self._chunked :
+                # the chunk end goes out with the next chunk header
+                self._bufAppend(b"\r\n")
+
+        # ------------------------------------------------------------------------
+
+        async def _writeLastChunk(self) :
+            if self._chunked :
+                self._bufAppend(b"0\r\n\r\n")
+            if self._bufLen :
+                await self._flush()
+
+        # ------------------------------------------------------------------------
+
+        def _writeFirstLine(self, code) :
+            self.Code = code
             reason = self._responseCodes.get(code, ('Unknown reason', ))[0]
-            result = await self._write("HTTP/1.1 %s %s\r\n" % (code, reason))
-            return result
+            self._bufAppend("HTTP/1.1 %s %s\r\n" % (code, reason))
 
         # ------------------------------------------------------------------------
 
-        async def _writeHeader(self, name, value) :
-            result = await self._write("%s: %s\r\n" % (name, value))
-            return result
+        def _writeHeader(self, name, value) :
+            self._bufAppend("%s: %s\r\n" % (name, value))
 
         # ------------------------------------------------------------------------
 
-        async def _writeContentTypeHeader(self, contentType, charset=None) :
+        def _writeContentTypeHeader(self, contentType, charset=None) :
             if contentType :
                 ct = contentType \
                    + (("; charset=%s" % charset) if charset else "")
             else :
                 ct = "application/octet-stream"
-            await self._writeHeader("Content-Type", ct)
+            self._writeHeader("Content-Type", ct)
 
         # ------------------------------------------------------------------------
 
-        async def _writeServerHeader(self) :
-            await self._writeHeader("Server", "MicroWebSrv by JC`zic")
+        def _writeServerHeader(self) :
+            self._bufAppend(self._serverHeader)
 
         # ------------------------------------------------------------------------
 
-        async def _writeEndHeader(self) :
-            result = await self._write("\r\n")
-            return result
+        def _writeEndHeader(self) :
+            self._bufAppend(b"\r\n")
 
         # ------------------------------------------------------------------------
 
-        async def _writeBeforeContent(self, code, headers, contentType, contentCharset, contentLength) :
-            await self._writeFirstLine(code)
+        def _writeBeforeContent(self, code, headers, contentType, contentCharset, contentLength) :
+            # only assembles the header in the connection buffer, see _flush
+            self._bufLen = 0
+            self._writeFirstLine(code)
             if isinstance(headers, dict) :
                 for header in headers :
-                    await self._writeHeader(header, headers[header])
-            if contentLength > 0 :
-                await self._writeContentTypeHeader(contentType, contentCharset)
-                await self._writeHeader("Content-Length", contentLength)
-            await self._writeServerHeader()
-            await self._writeHeader("Connection", "close")
-            await self._writeEndHeader()
+                    self._writeHeader(header, headers[header])
+            if contentLength is None :
+                # streamed content of unknown length, see _writeChunk
+                self._writeContentTypeHeader(contentType, contentCharset)
+                if self._chunked :
+                    self._writeHeader("Transfer-Encoding", "chunked")
+            else :
+                if contentLength > 0 :
+                    self._writeContentTypeHeader(contentType, contentCharset)
+                if code != 204 and code != 304 :
+                    # an empty body must be announced too on persistent connections
+                    self._writeHeader("Content-Length", contentLength)
+            self._writeServerHeader()
+            if self._client._keepAlive :
+                self._writeHeader("Connection", "keep-alive")
+                self._writeHeader("Keep-Alive", "timeout=%s" % self._client._microWebSrv.KeepAliveTimeout)
+            else :
+                self._writeHeader("Connection", "close")
+            self._writeEndHeader()
 
         # ------------------------------------------------------------------------
 
         async def WriteSwitchProto(self, upgrade, headers=None) :
-            await self._writeFirstLine(101)
-            await self._writeHeader("Connection", "Upgrade")
-            await self._writeHeader("Upgrade",    upgrade)
+            self._bufLen = 0
+            self._writeFirstLine(101)
+            self._writeHeader("Connection", "Upgrade")
+            self._writeHeader("Upgrade",    upgrade)
             if isinstance(headers, dict) :
                 for header in headers :
-                    await self._writeHeader(header, headers[header])
-            await self._writeServerHeader()
-            await self._writeEndHeader()
+                    self._writeHeader(header, headers[header])
+            self._writeServerHeader()
+            self._writeEndHeader()
+            await self._flush()
 
         # ------------------------------------------------------------------------
 
@@ -596,25 +885,21 @@ class MicroWebSrv :
                     contentLength = len(content)
                 else :
                     contentLength = 0
-                await self._writeBeforeContent(code, headers, contentType, contentCharset, contentLength)
-                if content :
-                    result = await self._write(content)
-                    return result
-                return True
+                self._writeBeforeContent(code, headers, contentType, contentCharset, contentLength)
+                result = await self._flush(content)
+                return result
             except :
+                self._client._keepAlive = False
                 return False
 
         # ------------------------------------------------------------------------
 
         async def WriteResponsePyHTMLFile(self, filepath, headers=None, vars=None) :
             if 'MicroWebTemplate' in globals() :
-                with open(filepath, 'r') as file :
-                    code = file.read()
-                mWebTmpl = MicroWebTemplate(code, escapeStrFunc=MicroWebSrv.HTMLEscape, filepath=filepath)
                 try :
-                    tmplResult = mWebTmpl.Execute(None, vars)
-                    result = await self.WriteResponse(200, headers, "text/html", "UTF-8", tmplResult)
-                    return result
+                    # compiled once per file modification, then only rendered
+                    mWebTmpl = MicroWebTemplate.LoadFile(filepath, escapeStrFunc=MicroWebSrv.HTMLEscape)
+                    return await self._writeTemplate(mWebTmpl.Generate(None, vars), headers)
                 except Exception as ex :
                     error = await self.WriteResponse( 500,
     	                                       None,
@@ -635,18 +920,23 @@ class MicroWebSrv :
                 size = stat(filepath)[6]
                 if size > 0 :
                     with open(filepath, 'rb') as file :
-                        await self._writeBeforeContent(200, headers, contentType, None, size)
+                        self._writeBeforeContent(200, headers, contentType, None, size)
                         try :
-                            buf = bytearray(1024)
+                            # the first chunk is read behind the header into the
+                            # same connection buffer, the rest streams through it
+                            buf = memoryview(self._client._sendBuf)
                             while size > 0 :
-                                x = file.readinto(buf)
-                                if x < len(buf) :
-                                    buf = memoryview(buf)[:x]
-                                if not await self._write(buf) :
-                                    return False
+                                if self._bufLen >= len(buf) :
+                                    await self._flush()
+                                x = file.readinto(buf[self._bufLen:])
+                                if not x :
+                                    raise Exception('Unexpected end of file')
+                                self._bufLen += x
                                 size -= x
+                                await self._flush()
                             return True
                         except :
+                            self._client._keepAlive = False
                             await self.WriteResponseInternalServerError()
                             return False
             except :
@@ -656,6 +946,98 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
+        async def _writeTemplate(self, pieces, headers) :
+            return await self.WriteResponseStream(pieces, "text/html", "UTF-8", headers)
+
+        # ------------------------------------------------------------------------
+
+        @staticmethod
+        def _nextPieces(pieces, chunkSize) :
+            # collects generated pieces up to about chunkSize bytes
+            pending = [ ]
+            size    = 0
+            for piece in pieces :
+                if isinstance(piece, str) :
+                    piece = piece.encode('UTF-8')
+                pending.append(piece)
+                size += len(piece)
+                if size >= chunkSize :
+                    break
+            return pending, size
+
+        # ------------------------------------------------------------------------
+
+        async def WriteResponseStream(self, pieces, contentType="text/plain", contentCharset="UTF-8", headers=None, contentLength=None) :
+            # pieces (str or bytes) are streamed in buffer sized chunks while they are generated,
+            # with a known contentLength as plain body, otherwise content fitting the send buffer
+            # goes out with a Content-Length and more content is chunked
+            pieces        = iter(pieces)
+            chunkSize     = len(self._client._sendBuf) - 16
+            pending, size = self._nextPieces(pieces, chunkSize)
+            if contentLength is None :
+                if size < chunkSize :
+                    return await self.WriteResponse(200, headers, contentType, contentCharset, b''.join(pending))
+                self._chunked = self._client._httpVer == 'HTTP/1.1'
+                if not self._chunked :
+                    # the end of content is told by closing the connection
+                    self._client._keepAlive = False
+            else :
+                self._chunked = False
+            self._writeBeforeContent(200, headers, contentType, contentCharset, contentLength)
+            sent = 0
+            try :
+                while pending :
+                    data = b''.join(pending)
+                    await self._writeChunk(data)
+                    sent += len(data)
+                    pending, size = self._nextPieces(pieces, chunkSize)
+                await self._writeLastChunk()
+            except Exception as ex :
+                # the status line is already sent, only closing the connection
+                # tells the client that the content is incomplete
+                _logger.error('streaming error (%s)', ex)
+                self._client._keepAlive = False
+                return False
+            if contentLength is not None and sent != contentLength :
+                _logger.error('streamed %d bytes, announced %d', sent, contentLength)
+                self._client._keepAlive = False
+                return False
+            return True
+
+        # ------------------------------------------------------------------------
+
+        async def WriteResponseStaticFile(self, filepath, contentType=None, headers=None) :
+            srv = self._client._microWebSrv
+            if srv.LetCacheStaticContentLevel <= 0 :
+                return await self.WriteResponseFile(filepath, contentType, headers)
+            sf = srv._getStaticFile(filepath)
+            if sf is None :
+                return await self.WriteResponseNotFound()
+            if not isinstance(headers, dict) :
+                headers = { }
+            gzip = sf.gzPath is not None and \
+                   'gzip' in self._client._headers.get('accept-encoding', '')
+            etag = ('"%s-gz"' if gzip else '"%s"') % sf.etag
+            headers["ETag"]          = etag
+            headers["Cache-Control"] = srv.StaticCacheControl
+            if sf.gzPath is not None :
+                headers["Vary"] = "Accept-Encoding"
+            if srv.LetCacheStaticContentLevel > 1 :
+                inm = self._client._headers.get('if-none-match', None)
+                if inm and (inm == '*' or etag in inm) :
+                    return await self.WriteResponseNotModified(headers)
+            if gzip :
+                headers["Content-Encoding"] = "gzip"
+                path, size = sf.gzPath, sf.gzSize
+            else :
+                path, size = sf.physPath, sf.size
+            content = srv._getStaticContent(path, size)
+            if content is not None :
+                return await self.WriteResponse(200, headers, contentType, None, content)
+            return await self.WriteResponseFile(path, contentType, headers)
+
+        # ------------------------------------------------------------------------
+
         async def WriteResponseFileAttachment(self, filepath, attachmentName, headers=None) :
             if not isinstance(headers, dict) :
                 headers = { }
@@ -681,10 +1063,10 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
-        async def WriteResponseError(self, code) :
+        async def WriteResponseError(self, code, headers=None) :
             responseCode = self._responseCodes.get(code, ('Unknown reason', ''))
             return await self.WriteResponse( code,
-                                       None,
+                                       headers,
                                        "text/html",
                                        "UTF-8",
                                        self._errCtnTmpl % {
@@ -704,8 +1086,9 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
-        async def WriteResponseNotModified(self) :
-            return await self.WriteResponseError(304)
+        async def WriteResponseNotModified(self, headers=None) :
+            # a 304 response must not carry a body
+            return await self.WriteResponse(304, headers, None, None, None)
 
         # ------------------------------------------------------------------------
 
@@ -727,8 +1110,9 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
-        async def WriteResponseMethodNotAllowed(self) :
-            return await self.WriteResponseError(405)
+        async def WriteResponseMethodNotAllowed(self, allowedMethods=None) :
+            headers = { "Allow" : ", ".join(allowedMethods) } if allowedMethods else None
+            return await self.WriteResponseError(405, headers)
 
         # ------------------------------------------------------------------------
 
@@ -749,6 +1133,10 @@ class MicroWebSrv :
 
         # ------------------------------------------------------------------------
 
+        _serverHeader = b"Server: MicroWebSrv by JC`zic\r\n"
+
+        # ------------------------------------------------------------------------
+
         _errCtnTmpl = """\
         <html>
             <head>
@@ -3,6 +3,7 @@ The MIT License (MIT)
 Copyright © 2018 Jean-Christophe Bos & HC² (www.hc2.fr)
 """
 
+from os import stat
 import re
 
 class MicroWebTemplate :
@@ -26,7 +27,25 @@ class MicroWebTemplate :
 
 	MESSAGE_TEXT            = ''
 	MESSAGE_STYLE           = ''
-	
+
+	MAX_CACHED_TEMPLATES	= 8
+
+	# compiled operations, see _compileBloc
+	_OP_TEXT				= 0
+	_OP_EXPR				= 1
+	_OP_PYTHON				= 2
+	_OP_IF					= 3
+	_OP_FOR					= 4
+
+	_reIdentifier			= re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*$')
+
+    # ============================================================================
+    # ===( Class globals  )=======================================================
+    # ============================================================================
+
+	# filepath -> (mtimes of the file and its includes, compiled template)
+	_cache					= { }
+
     # ============================================================================
     # ===( Constructor )==========================================================
     # ============================================================================
@@ -36,29 +55,52 @@ class MicroWebTemplate :
 		self._escapeStrFunc	= escapeStrFunc
 		self._filepath		= filepath
 		self._pos    		= 0
-		self._endPos 		= len(code)-1
 		self._line   		= 1
-		self._reIdentifier	= re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*$')
-		self._pyGlobalVars	= { }
-		self._pyLocalVars	= { }
-		self._rendered		= ''
-		self._instructions	= {
-			MicroWebTemplate.INSTRUCTION_PYTHON : self._processInstructionPYTHON,
-			MicroWebTemplate.INSTRUCTION_IF 	: self._processInstructionIF,
-			MicroWebTemplate.INSTRUCTION_ELIF 	: self._processInstructionELIF,
-			MicroWebTemplate.INSTRUCTION_ELSE 	: self._processInstructionELSE,
-			MicroWebTemplate.INSTRUCTION_FOR 	: self._processInstructionFOR,
-			MicroWebTemplate.INSTRUCTION_END	: self._processInstructionEND,
-			MicroWebTemplate.INSTRUCTION_INCLUDE: self._processInstructionINCLUDE,
-		}
+		self._includes		= [ ]
+		self._ops			= None
 
     # ============================================================================
     # ===( Functions )============================================================
     # ============================================================================
 
+	@staticmethod
+	def LoadFile(filepath, escapeStrFunc=None) :
+		# returns the compiled template of filepath, parsed again only if
+		# the file or one of its includes has been modified
+		cached = MicroWebTemplate._cache.get(filepath, None)
+		if cached is not None :
+			mtimes, tmpl = cached
+			if mtimes == MicroWebTemplate._getMTimes([filepath] + tmpl._includes) and \
+			   tmpl._escapeStrFunc is escapeStrFunc :
+				return tmpl
+		with open(filepath, 'r') as file :
+			code = file.read()
+		tmpl = MicroWebTemplate(code, escapeStrFunc=escapeStrFunc, filepath=filepath)
+		tmpl.Compile()
+		if len(MicroWebTemplate._cache) >= MicroWebTemplate.MAX_CACHED_TEMPLATES :
+			MicroWebTemplate._cache.clear()
+		MicroWebTemplate._cache[filepath] = (MicroWebTemplate._getMTimes([filepath] + tmpl._includes), tmpl)
+		return tmpl
+
+	# ----------------------------------------------------------------------------
+
+	def Compile(self) :
+		if self._ops is None :
+			self._pos  = 0
+			self._line = 1
+			ops, token = self._compileBloc()
+			if token is not None :
+				raise Exception( '"%s" instruction is not valid here (line %s)'
+								 % (token[0], self._line) )
+			self._ops  = ops
+			self._code = None
+		return self._ops
+
+	# ----------------------------------------------------------------------------
+
 	def Validate(self, pyGlobalVars=None, pyLocalVars=None) :
 		try :
-			self._parseCode(pyGlobalVars, pyLocalVars, execute=False)
+			self.Compile()
 			return None
 		except Exception as ex :
 			return str(ex)
@@ -67,242 +109,203 @@ class MicroWebTemplate :
 
 	def Execute(self, pyGlobalVars=None, pyLocalVars=None) :
 		try :
-			self._parseCode(pyGlobalVars, pyLocalVars, execute=True)
-			return self._rendered
+			return ''.join(self.Generate(pyGlobalVars, pyLocalVars))
 		except Exception as ex :
 			raise Exception(str(ex))
 
+	# ----------------------------------------------------------------------------
+
+	def Generate(self, pyGlobalVars=None, pyLocalVars=None) :
+		# yields the rendered page piece by piece instead of building it as a whole
+		ops 		= self.Compile()
+		globalVars	= { }
+		localVars	= { }
+		if pyGlobalVars :
+			globalVars.update(pyGlobalVars)
+		if pyLocalVars :
+			localVars.update(pyLocalVars)
+		localVars['MESSAGE_TEXT']  = MicroWebTemplate.MESSAGE_TEXT
+		localVars['MESSAGE_STYLE'] = MicroWebTemplate.MESSAGE_STYLE
+		MicroWebTemplate.MESSAGE_TEXT  = ''
+		MicroWebTemplate.MESSAGE_STYLE = ''
+		yield from self._render(ops, globalVars, localVars)
+
     # ============================================================================
     # ===( Utils  )===============================================================
     # ============================================================================
-	
-	def _parseCode(self, pyGlobalVars, pyLocalVars, execute) :
-		if pyGlobalVars:
-			self._pyGlobalVars.update(pyGlobalVars) 
-		if pyLocalVars:
-			self._pyLocalVars.update(pyLocalVars)
-		self._pyLocalVars['MESSAGE_TEXT'] = MicroWebTemplate.MESSAGE_TEXT
-		self._pyLocalVars['MESSAGE_STYLE'] = MicroWebTemplate.MESSAGE_STYLE
-		self._rendered	   = ''
-		newTokenToProcess  = self._parseBloc(execute)
-		if newTokenToProcess is not None :
-			raise Exception( '"%s" instruction is not valid here (line %s)'
-							 % (newTokenToProcess, self._line) )
-		MicroWebTemplate.MESSAGE_TEXT  = ''
-		MicroWebTemplate.MESSAGE_STYLE = ''
 
-    # ----------------------------------------------------------------------------
-
-	def _parseBloc(self, execute) :
-		while self._pos <= self._endPos :
-			c = self._code[self._pos]
-			if c == MicroWebTemplate.TOKEN_OPEN[0] and \
-			    self._code[ self._pos : self._pos + MicroWebTemplate.TOKEN_OPEN_LEN ] == MicroWebTemplate.TOKEN_OPEN :
-				self._pos    += MicroWebTemplate.TOKEN_OPEN_LEN
-				tokenContent  = ''
-				x 			  = self._pos
-				while True :
-					if x > self._endPos :
-						raise Exception("%s is missing (line %s)" % (MicroWebTemplate.TOKEN_CLOSE, self._line))
-					c = self._code[x]
-					if c == MicroWebTemplate.TOKEN_CLOSE[0] and \
-					   self._code[ x : x + MicroWebTemplate.TOKEN_CLOSE_LEN ] == MicroWebTemplate.TOKEN_CLOSE :
-					   self._pos = x + MicroWebTemplate.TOKEN_CLOSE_LEN
-					   break
-					elif c == '\n' :
-					 	self._line += 1
-					tokenContent += c
-					x 			 += 1
-				newTokenToProcess = self._processToken(tokenContent, execute)
-				if newTokenToProcess is not None :
-					return newTokenToProcess
-				continue
-			elif c == '\n' :
-				self._line += 1
-			if execute :
-				self._rendered += c
-			self._pos += 1
-		return None
+	@staticmethod
+	def _getMTimes(filepaths) :
+		mtimes = [ ]
+		for filepath in filepaths :
+			try :
+				st = stat(filepath)
+				mtimes.append((st[8], st[6]))
+			except :
+				mtimes.append(None)
+		return mtimes
 
 	# ----------------------------------------------------------------------------
 
-	def _processToken(self, tokenContent, execute) :
-		tokenContent = tokenContent.strip()
-		parts 		 = tokenContent.split(' ', 1)
-		instructName = parts[0].strip()
-		instructBody = parts[1].strip() if len(parts) > 1 else None
-		if len(instructName) == 0 :
-			raise Exception( '"%s %s" : instruction is missing (line %s)'
-							 % (MicroWebTemplate.TOKEN_OPEN, MicroWebTemplate.TOKEN_CLOSE, self._line) )
-		newTokenToProcess = None
-		if instructName in self._instructions :
-			newTokenToProcess = self._instructions[instructName](instructBody, execute)
-		elif execute :
-			try :
-				s = str( eval( tokenContent,
-							   self._pyGlobalVars,
-							   self._pyLocalVars ) )
-				if (self._escapeStrFunc is not None) :
-					self._rendered += self._escapeStrFunc(s)
-				else :
-					self._rendered += s
-			except Exception as ex :
-				raise Exception('%s (line %s)' % (str(ex), self._line))
-		return newTokenToProcess
+	@staticmethod
+	def _compilePy(source, mode, line) :
+		try :
+			return compile(source, '<pyhtml>', mode)
+		except NameError :
+			# port built without compile(), eval and exec take the source then
+			return source
+		except Exception as ex :
+			raise Exception('%s (line %s)' % (str(ex), line))
 
 	# ----------------------------------------------------------------------------
 
-	def _processInstructionPYTHON(self, instructionBody, execute) :
-		if instructionBody is not None :
-			raise Exception( 'Instruction "%s" is invalid (line %s)'
-							 % (MicroWebTemplate.INSTRUCTION_PYTHON, self._line) )
-		pyCode = ''
-		while True :
-			if self._pos > self._endPos :
-				raise Exception( '"%s" instruction is missing (line %s)'
-								 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-			c = self._code[self._pos]
-			if c == MicroWebTemplate.TOKEN_OPEN[0] and \
-			   self._code[ self._pos : self._pos + MicroWebTemplate.TOKEN_OPEN_LEN ] == MicroWebTemplate.TOKEN_OPEN :
-				self._pos    += MicroWebTemplate.TOKEN_OPEN_LEN
-				tokenContent  = ''
-				x 			  = self._pos
-				while True :
-					if x > self._endPos :
-						raise Exception("%s is missing (line %s)" % (MicroWebTemplate.TOKEN_CLOSE, self._line))
-					c = self._code[x]
-					if c == MicroWebTemplate.TOKEN_CLOSE[0] and \
-					   self._code[ x : x + MicroWebTemplate.TOKEN_CLOSE_LEN ] == MicroWebTemplate.TOKEN_CLOSE :
-					   self._pos = x + MicroWebTemplate.TOKEN_CLOSE_LEN
-					   break
-					elif c == '\n' :
-					 	self._line += 1
-					tokenContent += c
-					x 			 += 1
-				tokenContent = tokenContent.strip()
-				if tokenContent == MicroWebTemplate.INSTRUCTION_END :
-					break
-				raise Exception( '"%s" is a bad instruction in a python bloc (line %s)'
-								 % (tokenContent, self._line) )				
-			elif c == '\n' :
-				self._line += 1
-			if execute :
-				pyCode += c
-			self._pos += 1
-		if execute :
-			lines  = pyCode.split('\n')
-			indent = '' 
-			for line in lines :
-				if len(line.strip()) > 0 :
-					for c in line :
-						if c == ' ' or c == '\t' :
-							indent += c
-						else :
-							break
-					break
-			pyCode = ''
-			for line in lines :
-				if line.find(indent) == 0 :
-					line = line[len(indent):]
-				pyCode += line + '\n'
-			try :
-				exec(pyCode, self._pyGlobalVars, self._pyLocalVars)
-			except Exception as ex :
-				raise Exception('%s (line %s)' % (str(ex), self._line))
-		return None
+	def _nextToken(self) :
+		# returns (text before the next token, token content or None at the end)
+		idx = self._code.find(MicroWebTemplate.TOKEN_OPEN, self._pos)
+		if idx < 0 :
+			text = self._code[self._pos:]
+			self._line += text.count('\n')
+			self._pos = len(self._code)
+			return (text, None)
+		text = self._code[self._pos:idx]
+		self._line += text.count('\n')
+		start = idx + MicroWebTemplate.TOKEN_OPEN_LEN
+		end   = self._code.find(MicroWebTemplate.TOKEN_CLOSE, start)
+		if end < 0 :
+			raise Exception("%s is missing (line %s)" % (MicroWebTemplate.TOKEN_CLOSE, self._line))
+		tokenContent = self._code[start:end]
+		self._line += tokenContent.count('\n')
+		self._pos = end + MicroWebTemplate.TOKEN_CLOSE_LEN
+		return (text, tokenContent)
 
 	# ----------------------------------------------------------------------------
 
-	def _processInstructionIF(self, instructionBody, execute) :
-		if instructionBody is not None :
-			if execute :
-				try :
-					if (' ' not in instructionBody) and \
-					   ('=' not in instructionBody) and \
-					   ('<' not in instructionBody) and \
-					   ('>' not in instructionBody) and \
-					   (instructionBody not in self._pyGlobalVars) and \
-					   (instructionBody not in self._pyLocalVars):
-						result = False
-					else:
-						result = bool(eval(instructionBody, self._pyGlobalVars, self._pyLocalVars))
-				except Exception as ex :
-					raise Exception('%s (line %s)' % (str(ex), self._line))
+	def _compileBloc(self) :
+		# returns (list of ops, (instruction, body) that ended the bloc or None)
+		ops = [ ]
+		while True :
+			text, tokenContent = self._nextToken()
+			if text :
+				ops.append((MicroWebTemplate._OP_TEXT, text))
+			if tokenContent is None :
+				return (ops, None)
+			tokenContent = tokenContent.strip()
+			parts 		 = tokenContent.split(' ', 1)
+			instructName = parts[0].strip()
+			instructBody = parts[1].strip() if len(parts) > 1 else None
+			if len(instructName) == 0 :
+				raise Exception( '"%s %s" : instruction is missing (line %s)'
+								 % (MicroWebTemplate.TOKEN_OPEN, MicroWebTemplate.TOKEN_CLOSE, self._line) )
+			if instructName == MicroWebTemplate.INSTRUCTION_PYTHON :
+				ops.append(self._compileInstructionPYTHON(instructBody))
+			elif instructName == MicroWebTemplate.INSTRUCTION_IF :
+				ops.append(self._compileInstructionIF(instructBody))
+			elif instructName == MicroWebTemplate.INSTRUCTION_FOR :
+				ops.append(self._compileInstructionFOR(instructBody))
+			elif instructName == MicroWebTemplate.INSTRUCTION_INCLUDE :
+				self._compileInstructionINCLUDE(instructBody)
+			elif instructName == MicroWebTemplate.INSTRUCTION_ELIF :
+				if instructBody is None :
+					raise Exception( '"%s" alone is an incomplete syntax (line %s)'
+									 % (MicroWebTemplate.INSTRUCTION_ELIF, self._line) )
+				return (ops, (instructName, instructBody))
+			elif instructName == MicroWebTemplate.INSTRUCTION_ELSE or \
+				 instructName == MicroWebTemplate.INSTRUCTION_END :
+				if instructBody is not None :
+					raise Exception( 'Instruction "%s" is invalid (line %s)'
+									 % (instructName, self._line) )
+				return (ops, (instructName, None))
 			else :
-				result = False
-			newTokenToProcess = self._parseBloc(execute and result)
-			if newTokenToProcess is not None :
-				if newTokenToProcess == MicroWebTemplate.INSTRUCTION_END :
-					return None
-				elif newTokenToProcess == MicroWebTemplate.INSTRUCTION_ELSE :
-					newTokenToProcess = self._parseBloc(execute and not result)
-					if newTokenToProcess is not None :
-						if newTokenToProcess == MicroWebTemplate.INSTRUCTION_END :
-							return None
-						raise Exception( '"%s" instruction waited (line %s)'
-										 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-					raise Exception( '"%s" instruction is missing (line %s)'
-									 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-				elif newTokenToProcess == MicroWebTemplate.INSTRUCTION_ELIF :
-					self._processInstructionIF(self._elifInstructionBody, execute and not result)
-					return None
-				raise Exception( '"%s" instruction waited (line %s)'
-								 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-			raise Exception( '"%s" instruction is missing (line %s)'
-							 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-		raise Exception( '"%s" alone is an incomplete syntax (line %s)'
-						 % (MicroWebTemplate.INSTRUCTION_IF, self._line) )
+				code = MicroWebTemplate._compilePy(tokenContent, 'eval', self._line)
+				ops.append((MicroWebTemplate._OP_EXPR, code, self._line))
 
 	# ----------------------------------------------------------------------------
 
-	def _processInstructionELIF(self, instructionBody, execute) :
-		if instructionBody is None :
-			raise Exception( '"%s" alone is an incomplete syntax (line %s)'
-							 % (MicroWebTemplate.INSTRUCTION_ELIF, self._line) )
-		self._elifInstructionBody = instructionBody
-		return MicroWebTemplate.INSTRUCTION_ELIF
+	def _compileBlocToEnd(self) :
+		ops, token = self._compileBloc()
+		if token is None :
+			raise Exception( '"%s" instruction is missing (line %s)'
+							 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
+		if token[0] != MicroWebTemplate.INSTRUCTION_END :
+			raise Exception( '"%s" instruction waited (line %s)'
+							 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
+		return ops
 
 	# ----------------------------------------------------------------------------
 
-	def _processInstructionELSE(self, instructionBody, execute) :
+	def _compileInstructionPYTHON(self, instructionBody) :
 		if instructionBody is not None :
 			raise Exception( 'Instruction "%s" is invalid (line %s)'
-							 % (MicroWebTemplate.INSTRUCTION_ELSE, self._line) )
-		return MicroWebTemplate.INSTRUCTION_ELSE
+							 % (MicroWebTemplate.INSTRUCTION_PYTHON, self._line) )
+		line = self._line
+		pyCode, tokenContent = self._nextToken()
+		if tokenContent is None :
+			raise Exception( '"%s" instruction is missing (line %s)'
+							 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
+		tokenContent = tokenContent.strip()
+		if tokenContent != MicroWebTemplate.INSTRUCTION_END :
+			raise Exception( '"%s" is a bad instruction in a python bloc (line %s)'
+							 % (tokenContent, self._line) )
+		lines  = pyCode.split('\n')
+		indent = ''
+		for l in lines :
+			if len(l.strip()) > 0 :
+				for c in l :
+					if c == ' ' or c == '\t' :
+						indent += c
+					else :
+						break
+				break
+		pyCode = ''
+		for l in lines :
+			if l.find(indent) == 0 :
+				l = l[len(indent):]
+			pyCode += l + '\n'
+		return (MicroWebTemplate._OP_PYTHON, MicroWebTemplate._compilePy(pyCode, 'exec', line), self._line)
+
+	# ----------------------------------------------------------------------------
+
+	def _compileInstructionIF(self, instructionBody) :
+		# -> (_OP_IF, [(condition, simple name, ops), ..., (None, False, else ops)], line)
+		if instructionBody is None :
+			raise Exception( '"%s" alone is an incomplete syntax (line %s)'
+							 % (MicroWebTemplate.INSTRUCTION_IF, self._line) )
+		line     = self._line
+		branches = [ ]
+		while True :
+			# a bare name which is not defined counts as False
+			simple = (' ' not in instructionBody) and \
+					 ('=' not in instructionBody) and \
+					 ('<' not in instructionBody) and \
+					 ('>' not in instructionBody)
+			cond = MicroWebTemplate._compilePy(instructionBody, 'eval', self._line)
+			ops, token = self._compileBloc()
+			branches.append((cond, instructionBody if simple else None, ops))
+			if token is None :
+				raise Exception( '"%s" instruction is missing (line %s)'
+								 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
+			if token[0] == MicroWebTemplate.INSTRUCTION_ELIF :
+				instructionBody = token[1]
+				continue
+			if token[0] == MicroWebTemplate.INSTRUCTION_ELSE :
+				branches.append((None, None, self._compileBlocToEnd()))
+			elif token[0] != MicroWebTemplate.INSTRUCTION_END :
+				raise Exception( '"%s" instruction waited (line %s)'
+								 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
+			return (MicroWebTemplate._OP_IF, branches, line)
 
 	# ----------------------------------------------------------------------------
 
-	def _processInstructionFOR(self, instructionBody, execute) :
+	def _compileInstructionFOR(self, instructionBody) :
 		if instructionBody is not None :
 			parts 	   = instructionBody.split(' ', 1)
 			identifier = parts[0].strip()
 			if self._reIdentifier.match(identifier) is not None and len(parts) > 1 :
 				parts = parts[1].strip().split(' ', 1)
 				if parts[0] == 'in' and len(parts) > 1 :
-					expression  	   = parts[1].strip()
-					newTokenToProcess  = None
-					beforePos   	   = self._pos
-					if execute :
-						try :
-							result = eval(expression, self._pyGlobalVars, self._pyLocalVars)
-						except :
-							raise Exception('%s (line %s)' % (str(expression), self._line))
-					if execute and len(result) > 0 :
-						for x in result :
-							self._pyLocalVars[identifier] = x
-							self._pos  					  = beforePos
-							newTokenToProcess	  		  = self._parseBloc(True)
-							if newTokenToProcess != MicroWebTemplate.INSTRUCTION_END :
-								break
-					else :
-						newTokenToProcess = self._parseBloc(False)
-					if newTokenToProcess is not None :
-						if newTokenToProcess == MicroWebTemplate.INSTRUCTION_END :
-							return None
-						raise Exception( '"%s" instruction waited (line %s)'
-										 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-					raise Exception( '"%s" instruction is missing (line %s)'
-										 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
+					line 	   = self._line
+					expression = MicroWebTemplate._compilePy(parts[1].strip(), 'eval', line)
+					return (MicroWebTemplate._OP_FOR, identifier, expression, self._compileBlocToEnd(), line)
 			raise Exception( '"%s %s" is an invalid syntax'
 							 % (MicroWebTemplate.INSTRUCTION_FOR, instructionBody) )
 		raise Exception( '"%s" alone is an incomplete syntax (line %s)'
@@ -310,26 +313,62 @@ class MicroWebTemplate :
 
 	# ----------------------------------------------------------------------------
 
-	def _processInstructionEND(self, instructionBody, execute) :
-		if instructionBody is not None :
-			raise Exception( 'Instruction "%s" is invalid (line %s)'
-							 % (MicroWebTemplate.INSTRUCTION_END, self._line) )
-		return MicroWebTemplate.INSTRUCTION_END
-
-	# ----------------------------------------------------------------------------
-
-	def _processInstructionINCLUDE(self, instructionBody, execute) :
+	def _compileInstructionINCLUDE(self, instructionBody) :
 		if not instructionBody :
 			raise Exception( '"%s" alone is an incomplete syntax (line %s)' % (MicroWebTemplate.INSTRUCTION_INCLUDE, self._line) )
 		filename = instructionBody.replace('"','').replace("'",'').strip()
-		idx = self._filepath.rindex('/')
+		idx = self._filepath.rfind('/')
 		if idx >= 0 :
 			filename = self._filepath[:idx+1] + filename
 		with open(filename, 'r') as file :
 			includeCode = file.read()
+		self._includes.append(filename)
+		self._code = self._code[:self._pos] + includeCode + self._code[self._pos:]
+
+	# ----------------------------------------------------------------------------
 
-			self._code = self._code[:self._pos] + includeCode + self._code[self._pos:]
-			self._endPos += len(includeCode)
+	def _render(self, ops, globalVars, localVars) :
+		for op in ops :
+			kind = op[0]
+			if kind == MicroWebTemplate._OP_TEXT :
+				yield op[1]
+			elif kind == MicroWebTemplate._OP_EXPR :
+				try :
+					s = str(eval(op[1], globalVars, localVars))
+				except Exception as ex :
+					raise Exception('%s (line %s)' % (str(ex), op[2]))
+				if self._escapeStrFunc is not None :
+					s = self._escapeStrFunc(s)
+				yield s
+			elif kind == MicroWebTemplate._OP_PYTHON :
+				try :
+					exec(op[1], globalVars, localVars)
+				except Exception as ex :
+					raise Exception('%s (line %s)' % (str(ex), op[2]))
+			elif kind == MicroWebTemplate._OP_IF :
+				for cond, name, body in op[1] :
+					if cond is not None :
+						try :
+							if name is not None and \
+							   name not in globalVars and \
+							   name not in localVars :
+								result = False
+							else :
+								result = bool(eval(cond, globalVars, localVars))
+						except Exception as ex :
+							raise Exception('%s (line %s)' % (str(ex), op[2]))
+						if not result :
+							continue
+					yield from self._render(body, globalVars, localVars)
+					break
+			elif kind == MicroWebTemplate._OP_FOR :
+				try :
+					result = eval(op[2], globalVars, localVars)
+				except :
+					raise Exception('%s (line %s)' % (str(op[2]), op[4]))
+				for x in result :
+					localVars[op[1]] = x
+					yield from self._render(op[3], globalVars, localVars)
 
     # ============================================================================
     # ============================================================================
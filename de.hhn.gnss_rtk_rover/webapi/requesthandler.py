@@ -10,10 +10,23 @@ import uasyncio
 import utime
 
 from gnss.message_types import PositionData, Accuracy, RealTimeMessage
+from gnss import realtime_binary
+from webapi.subscriber import Subscriber
 from pyubx2.ubxtypes_core import FIXTYPES
 from gnss.gnss_handler import GnssHandler
+from gnss.rtcm_stats import RtcmStats
+from gnss.rtcm_filter import RtcmFilter
+from utils.globals import TRACK_DIR
+from gnss.track import list_tracks, track_path, track_info
+from gnss.track_export import TrackExport
 from webapi.microWebSrv import MicroWebSrv
+from utils.latency import LatencyTrace, STAGE_ENCODE, STAGE_SENT
+from utils.heap_telemetry import HeapTelemetry
+from utils.metrics import Metrics
 from primitives.queue import Queue
+import utils.logging as logging
+
+_logger = logging.getLogger("requesthandler")
 
 
 class RequestHandler:
@@ -29,7 +42,7 @@ class RequestHandler:
     _rtcm_lock = None
     _last_pos = None
     _acc_interval = None
-    _send_position_task = None
+    _subscribers = {}
 
     # data cache to save on UART reads/writes
     _position_data = None
@@ -62,6 +75,14 @@ class RequestHandler:
                            ("/position", "GET", cls._getPosition),
                            ("/ntrip", "POST", cls._enableNTRIP),
                            ("/ntrip", "GET", cls._getNtripStatus),
+                           ("/ntrip/stats", "GET", cls._getNtripStats),
+                           ("/logs", "GET", cls._getLogs),
+                           ("/metrics", "GET", cls._getMetrics),
+                           ("/metrics/json", "GET", cls._getMetricsJSON),
+                           ("/tracks", "GET", cls._getTracks),
+                           ("/tracks/<id>.gpx", "GET", cls._getTrackGPX),
+                           ("/tracks/<id>.geojson", "GET", cls._getTrackGeoJSON),
+                           ("/tracks/<id>.csv", "GET", cls._getTrackCSV),
                            ("/satsystems", "GET", cls._getSatSystems),
                            ("/satsystems", "POST", cls._setSatSystems),
                            ("/event-stream/position", "GET", cls._getPositionSSE),
@@ -72,8 +93,11 @@ class RequestHandler:
                            ("/event-stream/elev", "GET", cls._getElev),
                            ("/event-stream/fix", "GET", cls._getFixType)]
 
+        Metrics.gauge("rover_websocket_clients", "Connected WebSocket clients", fn=lambda: len(cls._subscribers))
+
         srv = MicroWebSrv(routeHandlers=_route_handlers, webPath='/webapi/www/')
         srv.MaxWebSocketRecvLen = 256
+        srv.WebSocketProtocols = (realtime_binary.PROTOCOL,)
         srv.AcceptWebSocketCallback = cls.cb_accept_ws
         await srv.Start()
 
@@ -88,7 +112,6 @@ class RequestHandler:
 
     @classmethod
     async def _setUpdateRate(cls, http_client, http_response):
-        print("set update rate triggered")
         payload = await http_client.ReadRequestContentAsJSON()
         try:
             rate = payload["updateRate"]
@@ -181,6 +204,78 @@ class RequestHandler:
         except Exception as ex:
             await http_response.WriteResponseJSONError(400)
 
+    @classmethod
+    async def _getNtripStats(cls, http_client, http_response):
+        try:
+            stats = RtcmStats.as_dict()
+            stats["filtered"] = RtcmFilter.dropped
+            await http_response.WriteResponseJSONOk(stats)
+        except Exception as ex:
+            await http_response.WriteResponseJSONError(400)
+
+    @classmethod
+    async def _getLogs(cls, http_client, http_response):
+        sink = logging.getSink()
+        if sink is None:
+            await http_response.WriteResponseError(404)
+            return
+        await http_response.WriteResponseStream(sink.dump(), "text/plain",
+                                                headers={"Cache-Control": "no-cache"})
+
+    @classmethod
+    async def _getMetrics(cls, http_client, http_response):
+        await http_response.WriteResponseStream(Metrics.render(), "text/plain",
+                                                headers={"Cache-Control": "no-cache"})
+
+    @classmethod
+    async def _getMetricsJSON(cls, http_client, http_response):
+        try:
+            latency = LatencyTrace.as_dict()
+            if http_client.GetRequestQueryParams().get("reset"):
+                LatencyTrace.reset()
+            await http_response.WriteResponseJSONOk({"latency": latency, "heap": HeapTelemetry.as_dict()})
+        except Exception as ex:
+            await http_response.WriteResponseJSONError(400)
+
+    @classmethod
+    async def _getTracks(cls, http_client, http_response):
+        try:
+            tracks = []
+            for track_id in list_tracks(TRACK_DIR):
+                blocks, records = track_info(track_path(TRACK_DIR, track_id))
+                tracks.append({"id": track_id, "blocks": blocks, "records": records})
+            await http_response.WriteResponseJSONOk(tracks)
+        except Exception as ex:
+            await http_response.WriteResponseJSONError(400)
+
+    @classmethod
+    async def _getTrackGPX(cls, http_client, http_response, route_args):
+        await cls._exportTrack(http_response, route_args.get("id"), "gpx")
+
+    @classmethod
+    async def _getTrackGeoJSON(cls, http_client, http_response, route_args):
+        await cls._exportTrack(http_response, route_args.get("id"), "geojson")
+
+    @classmethod
+    async def _getTrackCSV(cls, http_client, http_response, route_args):
+        await cls._exportTrack(http_response, route_args.get("id"), "csv")
+
+    @classmethod
+    async def _exportTrack(cls, http_response, track_id, fmt: str):
+        if not isinstance(track_id, int):
+            await http_response.WriteResponseError(404)
+            return
+        try:
+            export = TrackExport(track_path(TRACK_DIR, track_id), track_id, fmt)
+        except OSError:
+            await http_response.WriteResponseError(404)
+            return
+        # a known record count gives a Content-Length, otherwise the export is chunked
+        await http_response.WriteResponseStream(export, export.content_type,
+                                                headers={"Content-Disposition":
+                                                         'attachment; filename="%05d.%s"' % (track_id, fmt)},
+                                                contentLength=export.content_length)
+
     @classmethod
     async def _getPosition(cls, http_client, http_response):
         try:
@@ -193,8 +288,8 @@ class RequestHandler:
     async def _getPositionSSE(cls, http_client, http_response):
         try:
             if utime.ticks_diff(utime.ticks_ms(), cls._last_pos) > 5000:
-                print("difference: " + str(utime.ticks_diff(utime.ticks_ms(), cls._last_pos)))
-                print("polling new position data")
+                if __debug__:
+                    _logger.debug("polling new position data")
                 cls._position_data = await GnssHandler.get_position()
                 cls._last_pos = utime.ticks_ms()
             position = ujson.dumps(cls._position_data)
@@ -208,8 +303,8 @@ class RequestHandler:
     async def _getTime(cls, http_client, http_response):
         try:
             if utime.ticks_diff(utime.ticks_ms(), cls._last_pos) > 5000:
-                print("difference: " + str(utime.ticks_diff(utime.ticks_ms(), cls._last_pos)))
-                print("polling new position data")
+                if __debug__:
+                    _logger.debug("polling new position data")
                 cls._position_data = await GnssHandler.get_position()
                 cls._last_pos = utime.ticks_ms()
             time = cls._position_data["time"]
@@ -270,39 +365,71 @@ class RequestHandler:
 
     @classmethod
     async def cb_receive_text(cls, webSocket, msg):
-        print("WS RECV TEXT : %s" % msg)
-        await webSocket.SendText("Reply for %s" % msg)
+        subscriber = cls._subscribers.get(webSocket)
+        try:
+            subscriber.configure(ujson.loads(msg))
+        except Exception:
+            await webSocket.SendText(ujson.dumps({"exception": "invalid subscription options"}))
+            return
+        await webSocket.SendText(ujson.dumps({"subscription": subscriber.options()}))
 
     @classmethod
     async def cb_receive_binary(cls, webSocket, data):
-        print("WS RECV DATA : %s" % data)
-        await uasyncio.sleep(1)
+        if __debug__:
+            _logger.debug("ws recv data: %s", data)
 
     @classmethod
     async def cb_closed(cls, webSocket):
-        print("WS CLOSED")
-        cls._send_position_task.cancel()
-        await uasyncio.sleep(1)
+        if __debug__:
+            _logger.debug("ws closed")
+        subscriber = cls._subscribers.pop(webSocket, None)
+        if subscriber is not None and subscriber.task is not None:
+            subscriber.task.cancel()
 
     @classmethod
-    async def cb_send_position(cls, websocket):
+    async def cb_send_position(cls, subscriber: Subscriber):
         position: PositionData
         accuracy: Accuracy
-        realtime_message: RealTimeMessage
+        values: dict
         rtcm: bool
+        websocket = subscriber.websocket
+        binary = websocket.Protocol == realtime_binary.PROTOCOL
+        buf = bytearray(realtime_binary.SIZE) if binary else None
+        seq = 0
         while not websocket.IsClosed():
+            wait = subscriber.wait_ms()
+            if wait > 0:  # rate limit before reading, so a slow client costs no UART traffic
+                await uasyncio.sleep_ms(wait)
+                continue
             position = await GnssHandler.get_position() # Store data in dict
+            epoch = LatencyTrace.epoch()
             accuracy = await GnssHandler.get_precision(False)
             rtcm = await GnssHandler.get_ntrip_status()
-            realtime_message = RealTimeMessage(position, accuracy, rtcm)
-            print(str(realtime_message.__dict__))
-            await websocket.SendText(str(ujson.dumps(realtime_message.__dict__)))  # Convert data to JSON and send
+            values = None
+            if not binary or subscriber.on_change:
+                values = RealTimeMessage(position, accuracy, rtcm).__dict__
+            if not subscriber.accept(position, values):
+                continue
+            if binary:  # compact fixed-layout frame, no JSON encoding
+                frame = realtime_binary.pack(buf, seq, position, accuracy, rtcm)
+                LatencyTrace.stamp(STAGE_ENCODE, epoch)
+                await websocket.SendBinary(frame)
+                LatencyTrace.stamp(STAGE_SENT, epoch)
+                seq += 1
+                continue
+            text = ujson.dumps(subscriber.select(values))  # Convert data to JSON and send
+            LatencyTrace.stamp(STAGE_ENCODE, epoch)
+            await websocket.SendText(text)
+            LatencyTrace.stamp(STAGE_SENT, epoch)
         gc.collect()
 
     @classmethod
     async def cb_accept_ws(cls, webSocket, httpClient):
-        print("WS ACCEPT")
+        if __debug__:
+            _logger.debug("ws accept")
         webSocket.RecvTextCallback = cls.cb_receive_text
         webSocket.RecvBinaryCallback = cls.cb_receive_binary
         webSocket.ClosedCallback = cls.cb_closed
-        cls._send_position_task = uasyncio.create_task(cls.cb_send_position(webSocket))
+        subscriber = Subscriber(webSocket)
+        cls._subscribers[webSocket] = subscriber
+        subscriber.task = uasyncio.create_task(cls.cb_send_position(subscriber))
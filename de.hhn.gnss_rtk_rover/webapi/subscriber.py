@@ -0,0 +1,166 @@
+"""
+Subscriber class.
+
+Per-websocket options of the realtime position feed. A client configures
+its subscription by sending a JSON text message, usually right after the
+connection is opened:
+
+    {"maxHz": 1, "onChange": true, "fields": ["lat", "lon"], "minMoveMm": 500}
+
+- maxHz: maximum number of updates per second, 0 = as fast as the receiver
+- onChange: only send if one of the selected fields changed, JSON messages
+  then hold the time and the fields changed since the last update (deltas)
+- fields: subset of the JSON message fields, all if missing or null
+- minMoveMm: only send if the position moved at least this far since the last update
+
+The time differs in every message and is not compared for onChange. The
+field subset and the deltas only apply to JSON messages, binary frames
+have a fixed layout. The first update after (re)configuring holds all
+selected fields.
+
+Created on 19 Oct 2026
+
+:author: vdueck
+"""
+import math
+import utime
+
+from gnss.message_types import PositionData
+from gnss.realtime_binary import nmea2deg7, str2fixed
+
+# mm per 1e-7 degree of latitude, rad per 1e-7 degree
+_MM_PER_DEG7 = 11.132
+_RAD_PER_DEG7 = 1.7453292519943295e-09
+
+
+class Subscriber:
+    """
+    Subscriber class.
+    """
+
+    FIELDS = ("time", "fixType", "lat", "lon", "elev", "hAcc", "vAcc", "rtcmEnabled")
+    PER_MESSAGE = ("time",)  # not compared for onChange
+
+    def __init__(self, websocket: object):
+        self.websocket = websocket
+        self.task = None
+        self.interval = 0
+        self.on_change = False
+        self.fields = None
+        self.min_move = 0
+        self._compared = ()
+        self._last_check = None
+        self._last_values = None
+        self._last_pos = None
+        self._delta = None
+
+    def configure(self, options: dict):
+        """
+        Apply the options sent by the client.
+        Unknown keys are ignored, invalid values raise.
+
+        :param dict options: decoded JSON options message
+        :raises: ValueError, TypeError
+        """
+        max_hz = float(options.get("maxHz", 0) or 0)
+        if max_hz < 0:
+            raise ValueError("maxHz")
+        fields = options.get("fields", None)
+        if fields is not None:
+            fields = tuple(f for f in fields if f in self.FIELDS)
+            if not fields:
+                raise ValueError("fields")
+        min_move = int(options.get("minMoveMm", 0) or 0)
+        if min_move < 0:
+            raise ValueError("minMoveMm")
+        self.interval = int(1000 / max_hz) if max_hz else 0
+        self.on_change = bool(options.get("onChange", False))
+        self.fields = fields
+        self.min_move = min_move
+        self._compared = tuple(f for f in (fields or self.FIELDS) if f not in self.PER_MESSAGE)
+        self._last_values = None
+        self._last_pos = None
+        self._delta = None
+
+    def options(self) -> dict:
+        """
+        :return: the effective options, in the format accepted by configure()
+        :rtype: dict
+        """
+        return {"maxHz": 1000 / self.interval if self.interval else 0,
+                "onChange": self.on_change,
+                "fields": self.fields,
+                "minMoveMm": self.min_move}
+
+    def wait_ms(self) -> int:
+        """
+        :return: ms to wait before the next update may be checked
+        :rtype: int
+        """
+        if not self.interval or self._last_check is None:
+            return 0
+        return self.interval - utime.ticks_diff(utime.ticks_ms(), self._last_check)
+
+    def select(self, values: dict) -> dict:
+        """
+        :param dict values: all fields of the realtime message
+        :return: the fields the client subscribed to, with onChange only the
+            per-message fields and the fields changed since the last update
+        :rtype: dict
+        """
+        if self._delta is not None:
+            selected = {f: values[f] for f in (self.fields or self.FIELDS) if f in self.PER_MESSAGE}
+            selected.update(self._delta)
+            return selected
+        if self.fields is None:
+            return values
+        return {f: values[f] for f in self.fields}
+
+    def accept(self, position: PositionData, values: dict) -> bool:
+        """
+        Decide whether an update is sent to this subscriber.
+        The reference for onChange and minMoveMm is the last update sent,
+        the fields changed since are kept for select().
+
+        :param PositionData position: latest position
+        :param dict values: all fields of the realtime message
+        :return: True if the update should be sent
+        :rtype: bool
+        """
+        self._last_check = utime.ticks_ms()
+        pos = None
+        if self.min_move:
+            pos = (nmea2deg7(position.lat, position.ns),
+                   nmea2deg7(position.lon, position.ew),
+                   str2fixed(position.elev, 3))
+            if self._last_pos is not None and self._distance_mm(self._last_pos, pos) < self.min_move:
+                return False
+        delta = None
+        if self.on_change and self._compared:
+            last = self._last_values
+            delta = {f: values[f] for f in self._compared if last is None or last[f] != values[f]}
+            if not delta:
+                return False
+            if last is None:
+                self._last_values = dict(delta)
+            else:
+                last.update(delta)
+        self._last_pos = pos
+        self._delta = delta
+        return True
+
+    @staticmethod
+    def _distance_mm(a: tuple, b: tuple) -> float:
+        """
+        Equirectangular approximation, good enough for the few metres
+        a movement threshold is about.
+
+        :param tuple a: (lat 1e-7 deg, lon 1e-7 deg, height mm)
+        :param tuple b: (lat 1e-7 deg, lon 1e-7 deg, height mm)
+        :return: 3D distance in mm
+        :rtype: float
+        """
+        north = (b[0] - a[0]) * _MM_PER_DEG7
+        east = (b[1] - a[1]) * _MM_PER_DEG7 * math.cos(a[0] * _RAD_PER_DEG7)
+        up = b[2] - a[2]
+        return math.sqrt(north * north + east * east + up * up)
@@ -0,0 +1,90 @@
+// Decoder for the compact binary realtime feed (gnss/realtime_binary.py).
+//
+//   var ws = RoverRealtime.connect("ws://" + window.location.hostname, function (msg) { ... },
+//                                  { maxHz: 1, onChange: true, minMoveMm: 500,
+//                                    onSubscribed: function (sub) { ... } });
+//
+// The optional subscription options are sent when the connection opens,
+// the server acknowledges them with a {"subscription": {...}} text message,
+// which is passed to onSubscribed, not to the message callback.
+//
+// Binary frames are passed to the callback decoded:
+//
+//   { seq, fixType, rtcmEnabled, timeMs, time: "hh:mm:ss.ss",
+//     lat, lon: degrees, negative for S and W, elev: metres, hAcc, vAcc: mm }
+//
+// The server falls back to JSON text frames if it does not accept the
+// subprotocol. These are passed as sent, the RealTimeMessage fields as in
+// the GGA sentence, not converted, as the hemisphere is not sent:
+//
+//   { time: "hhmmss.ss", fixType, lat: "ddmm.mmmmm", lon: "dddmm.mmmmm",
+//     elev: "metres", hAcc, vAcc: mm, rtcmEnabled, exception }
+//
+// or the subset selected with the fields option, with onChange only the
+// time and the changed fields. Check msg.seq to tell them apart.
+
+var RoverRealtime = (function () {
+
+    var PROTOCOL = "rover.bin.v1";
+    var VERSION  = 1;
+    var SIZE     = 32;
+    var FLAG_RTCM = 0x01;
+
+    function pad(n, len) {
+        var s = String(n);
+        while (s.length < len) s = "0" + s;
+        return s;
+    }
+
+    function decode(buffer) {
+        var v = new DataView(buffer);
+        if (v.byteLength < SIZE || v.getUint8(0) !== VERSION)
+            return null;
+        var ms = v.getUint32(8, true);
+        return {
+            seq:         v.getUint32(4, true),
+            fixType:     v.getUint8(1),
+            rtcmEnabled: (v.getUint8(2) & FLAG_RTCM) !== 0,
+            timeMs:      ms,
+            time:        pad(Math.floor(ms / 3600000), 2) + ":" +
+                         pad(Math.floor(ms / 60000) % 60, 2) + ":" +
+                         pad(((ms % 60000) / 1000).toFixed(2), 5),
+            lat:         v.getInt32(12, true) / 1e7,
+            lon:         v.getInt32(16, true) / 1e7,
+            elev:        v.getInt32(20, true) / 1000,
+            hAcc:        v.getUint32(24, true),
+            vAcc:        v.getUint32(28, true)
+        };
+    }
+
+    function connect(uri, onMessage, options) {
+        var ws = new WebSocket(uri, [PROTOCOL]);
+        var onSubscribed = null;
+        ws.binaryType = "arraybuffer";
+        if (options) {
+            var subscription = {};
+            for (var key in options) {
+                if (key === "onSubscribed") onSubscribed = options[key];
+                else subscription[key] = options[key];
+            }
+            ws.onopen = function () { ws.send(JSON.stringify(subscription)); };
+        }
+        ws.onmessage = function (evt) {
+            if (typeof evt.data === "string") {
+                var msg;
+                try { msg = JSON.parse(evt.data); } catch (e) { return; }
+                if (msg && msg.subscription !== undefined) {
+                    if (onSubscribed) onSubscribed(msg.subscription);
+                    return;
+                }
+                onMessage(msg);
+                return;
+            }
+            var msg = decode(evt.data);
+            if (msg) onMessage(msg);
+        };
+        return ws;
+    }
+
+    return { PROTOCOL: PROTOCOL, decode: decode, connect: connect };
+})();